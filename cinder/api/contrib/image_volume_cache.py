@@ -0,0 +1,120 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""The image-volume cache extension."""
+
+from oslo_log import log as logging
+import six
+from webob import exc
+
+from cinder.api import extensions
+from cinder.api.openstack import wsgi
+from cinder import exception
+from cinder.i18n import _
+from cinder import volume
+
+
+LOG = logging.getLogger(__name__)
+
+
+def authorize(context, action_name):
+    action = 'image_volume_cache:%s' % action_name
+    extensions.extension_authorizer('volume', action)(context)
+
+
+class ImageVolumeCacheController(wsgi.Controller):
+    """The image-volume cache API controller for the OpenStack API."""
+
+    def __init__(self):
+        self.volume_api = volume.API()
+        super(ImageVolumeCacheController, self).__init__()
+
+    @staticmethod
+    def _entry_view(entry):
+        return {
+            'host': entry['host'],
+            'image_id': entry['image_id'],
+            'image_updated_at': entry['image_updated_at'],
+            'volume_id': entry['volume_id'],
+            'size': entry['size'],
+            'last_used': entry['last_used'],
+        }
+
+    def index(self, req):
+        """Return the image-volume cache entries of all backends.
+
+        The entries can be filtered by image_id and host, a host without a
+        pool matches the entries of all its pools.
+        """
+        context = req.environ['cinder.context']
+        authorize(context, 'index')
+        entries = self.volume_api.get_image_cache_entries(
+            context, image_id=req.GET.get('image_id'),
+            host=req.GET.get('host'))
+        return {'image_volume_cache': [self._entry_view(entry)
+                                       for entry in entries]}
+
+    @wsgi.response(202)
+    def prewarm(self, req, body):
+        """Add images to the image-volume cache of backends or pools.
+
+        Expected format of the input parameter 'body':
+        {
+            "prewarm":
+            {
+                "image_ids": ["image-uuid-1", "image-uuid-2"],
+                "hosts": ["host@backend", "host@backend#pool"]
+            }
+        }
+        """
+        context = req.environ['cinder.context']
+        authorize(context, 'prewarm')
+        self.assert_valid_body(body, 'prewarm')
+        image_ids = body['prewarm'].get('image_ids')
+        hosts = body['prewarm'].get('hosts')
+        for name, value in (('image_ids', image_ids), ('hosts', hosts)):
+            if (not isinstance(value, list) or not value or
+                    not all(isinstance(item, six.string_types)
+                            for item in value)):
+                msg = _("%s must be a non-empty list of strings.") % name
+                raise exc.HTTPBadRequest(explanation=msg)
+
+        LOG.debug('Prewarming the image-volume cache of %(hosts)s with '
+                  'images %(image_ids)s.',
+                  {'hosts': hosts, 'image_ids': image_ids})
+        try:
+            for image_id in image_ids:
+                self.volume_api.prewarm_image_cache(context, image_id, hosts)
+        except exception.NotFound as error:
+            raise exc.HTTPNotFound(explanation=error.msg)
+        except exception.Invalid as error:
+            raise exc.HTTPBadRequest(explanation=error.msg)
+        return {'prewarm': {'image_ids': image_ids, 'hosts': hosts}}
+
+
+class Image_volume_cache(extensions.ExtensionDescriptor):
+    """Image-volume cache prewarming and reporting."""
+
+    name = "ImageVolumeCache"
+    alias = "os-image-volume-cache"
+    namespace = ("http://docs.openstack.org/volume/ext/"
+                 "image-volume-cache/api/v2")
+    updated = "2016-10-01T00:00:00+00:00"
+
+    def get_resources(self):
+        resources = []
+        res = extensions.ResourceExtension(
+            Image_volume_cache.alias,
+            ImageVolumeCacheController(),
+            collection_actions={'prewarm': 'POST'})
+        resources.append(res)
+        return resources
@@ -22,11 +22,18 @@
 """
 
 import abc
+import binascii
+import collections
+import errno
 import hashlib
 import json
 import os
+import stat
+import sys
+import time
 
 import eventlet
+from eventlet import tpool
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_service import loopingcall
@@ -47,11 +54,133 @@ chunkedbackup_service_opts = [
     cfg.StrOpt('backup_compression_algorithm',
                default='zlib',
                help='Compression algorithm (None to disable)'),
+    cfg.IntOpt('backup_compression_workers',
+               default=1,
+               min=1,
+               help='Number of worker threads used to hash and compress '
+                    'chunks in parallel while backing up a volume. When '
+                    'greater than 1 the work is done in native threads so '
+                    'that it can use more than one CPU core.'),
+    cfg.IntOpt('backup_writer_workers',
+               default=1,
+               min=1,
+               help='Number of chunk objects that may be written to the '
+                    'backup repository concurrently.'),
+    cfg.BoolOpt('backup_sparse_detection',
+                default=False,
+                help='Detect all-zero data while backing up a volume and '
+                     'record it as holes in the backup metadata instead of '
+                     'storing it in the backup repository. Unallocated '
+                     'regions of file based volumes are skipped without '
+                     'being read.'),
+    cfg.StrOpt('backup_sha256file_format',
+               default='json',
+               choices=['json', 'binary'],
+               help='Format of the sha256 file written with each backup. '
+                    'The binary format stores the raw digests and is much '
+                    'smaller and faster to load for big volumes, but it can '
+                    'only be read by backup services that support it.'),
+    cfg.IntOpt('backup_status_check_interval',
+               default=10,
+               min=0,
+               help='Interval, in seconds, between two checks of the status '
+                    'of a backup being created or restored, to find out '
+                    'whether it has been deleted and the operation has to '
+                    'be cancelled. 0 checks it for every chunk.'),
+    cfg.IntOpt('backup_restore_readahead',
+               default=1,
+               min=1,
+               help='Number of backup objects downloaded and decompressed '
+                    'concurrently while restoring a backup. The objects are '
+                    'still written to the volume in order.'),
 ]
 
 CONF = cfg.CONF
 CONF.register_opts(chunkedbackup_service_opts)
 
+# NOTE: os.SEEK_DATA is not available before Python 3.3, this is the value
+# used by Linux.
+SEEK_DATA = getattr(os, 'SEEK_DATA', 3)
+
+# Binary sha256 files start with this line, followed by a line holding the
+# JSON encoded header and by the raw digests.
+SHA256FILE_BINARY_MAGIC = b'cinder-backup-sha256\n'
+
+
+class Sha256List(object):
+    """Compact list of sha256 digests.
+
+    The digests are stored back to back in a bytearray instead of as a list
+    of hex strings, items are still returned as hex strings.
+    """
+
+    DIGEST_SIZE = hashlib.sha256().digest_size
+
+    def __init__(self, digests=b''):
+        self._digests = bytearray(digests)
+
+    @classmethod
+    def from_hex_list(cls, hex_list):
+        return cls(b''.join(binascii.unhexlify(sha) for sha in hex_list))
+
+    def __len__(self):
+        return len(self._digests) // self.DIGEST_SIZE
+
+    def __getitem__(self, index):
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError(index)
+        start = index * self.DIGEST_SIZE
+        digest = self._digests[start:start + self.DIGEST_SIZE]
+        return binascii.hexlify(digest).decode('ascii')
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def extend(self, digests):
+        """Append raw digests, as returned by get_digests()."""
+        self._digests.extend(digests)
+
+    def get_digests(self, start, count):
+        """Return count raw digests from index start as bytes."""
+        return bytes(self._digests[start * self.DIGEST_SIZE:
+                                   (start + count) * self.DIGEST_SIZE])
+
+    def to_hex_list(self):
+        hex_digests = binascii.hexlify(self._digests).decode('ascii')
+        hex_size = self.DIGEST_SIZE * 2
+        return [hex_digests[i:i + hex_size]
+                for i in range(0, len(hex_digests), hex_size)]
+
+    def to_bytes(self):
+        return bytes(self._digests)
+
+
+class BackupCancelChecker(object):
+    """Find out whether a backup has been deleted while it is in progress.
+
+    The backup is refreshed from the database at most once every interval
+    seconds, so that the chunk loops only pay a cheap local check.
+    """
+
+    def __init__(self, context, backup, interval):
+        self.context = context
+        self.backup = backup
+        self.interval = interval
+        self._last_check = None
+
+    def is_cancelled(self):
+        now = time.time()
+        if (self._last_check is None or
+                now - self._last_check >= self.interval):
+            self.backup = objects.Backup.get_by_id(self.context,
+                                                   self.backup.id)
+            self._last_check = now
+        return self.backup.status in (fields.BackupStatus.DELETING,
+                                      fields.BackupStatus.DELETED)
+
 
 @six.add_metaclass(abc.ABCMeta)
 class ChunkedBackupDriver(driver.BackupDriver):
@@ -67,7 +196,11 @@ class ChunkedBackupDriver(driver.BackupDriver):
     """
 
     DRIVER_VERSION = '1.0.0'
-    DRIVER_VERSION_MAPPING = {'1.0.0': '_restore_v1'}
+    # Backups recording all-zero extents as holes can only be restored by
+    # drivers that know about holes, so they are written with this version.
+    DRIVER_VERSION_HOLES = '1.1.0'
+    DRIVER_VERSION_MAPPING = {'1.0.0': '_restore_v1',
+                              '1.1.0': '_restore_v1'}
 
     def _get_compressor(self, algorithm):
         try:
@@ -100,6 +233,13 @@ class ChunkedBackupDriver(driver.BackupDriver):
         self.backup_compression_algorithm = CONF.backup_compression_algorithm
         self.compressor = \
             self._get_compressor(CONF.backup_compression_algorithm)
+        self.compression_workers = CONF.backup_compression_workers
+        self.writer_workers = CONF.backup_writer_workers
+        self.sparse_detection = CONF.backup_sparse_detection
+        self.sha256file_format = CONF.backup_sha256file_format
+        self.status_check_interval = CONF.backup_status_check_interval
+        self.restore_readahead = CONF.backup_restore_readahead
+        self._zero_buffer = b''
         self.support_force_delete = True
 
     # To create your own "chunked" backup driver, implement the following
@@ -199,7 +339,7 @@ class ChunkedBackupDriver(driver.BackupDriver):
         return filename
 
     def _write_metadata(self, backup, volume_id, container, object_list,
-                        volume_meta, extra_metadata=None):
+                        volume_meta, extra_metadata=None, hole_list=None):
         filename = self._metadata_filename(backup)
         LOG.debug('_write_metadata started, container name: %(container)s,'
                   ' metadata filename: %(filename)s.',
@@ -216,6 +356,9 @@ class ChunkedBackupDriver(driver.BackupDriver):
         metadata['volume_meta'] = volume_meta
         if extra_metadata:
             metadata['extra_metadata'] = extra_metadata
+        if hole_list:
+            metadata['version'] = self.DRIVER_VERSION_HOLES
+            metadata['holes'] = hole_list
         metadata_json = json.dumps(metadata, sort_keys=True, indent=2)
         if six.PY3:
             metadata_json = metadata_json.encode('utf-8')
@@ -236,12 +379,22 @@ class ChunkedBackupDriver(driver.BackupDriver):
         sha256file['backup_description'] = backup['display_description']
         sha256file['created_at'] = six.text_type(backup['created_at'])
         sha256file['chunk_size'] = self.sha_block_size_bytes
-        sha256file['sha256s'] = sha256_list
-        sha256file_json = json.dumps(sha256file, sort_keys=True, indent=2)
-        if six.PY3:
-            sha256file_json = sha256file_json.encode('utf-8')
-        with self.get_object_writer(container, filename) as writer:
-            writer.write(sha256file_json)
+        if self.sha256file_format == 'binary':
+            header_json = json.dumps(sha256file, sort_keys=True)
+            if six.PY3:
+                header_json = header_json.encode('utf-8')
+            with self.get_object_writer(container, filename) as writer:
+                writer.write(SHA256FILE_BINARY_MAGIC)
+                writer.write(header_json + b'\n')
+                writer.write(sha256_list.to_bytes())
+        else:
+            sha256file['sha256s'] = sha256_list.to_hex_list()
+            sha256file_json = json.dumps(sha256file, sort_keys=True,
+                                         indent=2)
+            if six.PY3:
+                sha256file_json = sha256file_json.encode('utf-8')
+            with self.get_object_writer(container, filename) as writer:
+                writer.write(sha256file_json)
         LOG.debug('_write_sha256file finished.')
 
     def _read_metadata(self, backup):
@@ -265,11 +418,27 @@ class ChunkedBackupDriver(driver.BackupDriver):
                   'sha256 filename: %(filename)s.',
                   {'container': container, 'filename': filename})
         with self.get_object_reader(container, filename) as reader:
-            sha256file_json = reader.read()
-        if six.PY3:
-            sha256file_json = sha256file_json.decode('utf-8')
-        sha256file = json.loads(sha256file_json)
-        LOG.debug('_read_sha256file finished (%s).', sha256file)
+            sha256file_data = reader.read()
+        if sha256file_data.startswith(SHA256FILE_BINARY_MAGIC):
+            header_end = sha256file_data.index(b'\n',
+                                               len(SHA256FILE_BINARY_MAGIC))
+            header_json = sha256file_data[len(SHA256FILE_BINARY_MAGIC):
+                                          header_end]
+            if six.PY3:
+                header_json = header_json.decode('utf-8')
+            sha256file = json.loads(header_json)
+            sha256file['sha256s'] = Sha256List(
+                sha256file_data[header_end + 1:])
+        else:
+            if six.PY3:
+                sha256file_data = sha256file_data.decode('utf-8')
+            sha256file = json.loads(sha256file_data)
+            sha256file['sha256s'] = Sha256List.from_hex_list(
+                sha256file['sha256s'])
+        LOG.debug('_read_sha256file finished (%(count)d sha256s, chunk '
+                  'size %(chunk_size)d).',
+                  {'count': len(sha256file['sha256s']),
+                   'chunk_size': sha256file['chunk_size']})
         return sha256file
 
     def _prepare_backup(self, backup):
@@ -298,9 +467,10 @@ class ChunkedBackupDriver(driver.BackupDriver):
                       'object_prefix': object_prefix,
                       'availability_zone': availability_zone,
                   })
-        object_meta = {'id': 1, 'list': [], 'prefix': object_prefix,
-                       'volume_meta': None}
-        object_sha256 = {'id': 1, 'sha256s': [], 'prefix': object_prefix}
+        object_meta = {'id': 1, 'list': [], 'holes': [],
+                       'prefix': object_prefix, 'volume_meta': None}
+        object_sha256 = {'id': 1, 'sha256s': Sha256List(),
+                         'prefix': object_prefix}
         extra_metadata = self.get_extra_metadata(backup, volume)
         if extra_metadata is not None:
             object_meta['extra_metadata'] = extra_metadata
@@ -308,37 +478,173 @@ class ChunkedBackupDriver(driver.BackupDriver):
         return (object_meta, object_sha256, extra_metadata, container,
                 volume_size_bytes)
 
-    def _backup_chunk(self, backup, container, data, data_offset,
-                      object_meta, extra_metadata):
-        """Backup data chunk based on the object metadata and offset."""
+    def _calculate_shas(self, data):
+        """Return the raw sha256 digests of the blocks in data."""
+        digests = []
+        off = 0
+        datalen = len(data)
+        while off < datalen:
+            chunk_end = min(off + self.sha_block_size_bytes, datalen)
+            digests.append(hashlib.sha256(data[off:chunk_end]).digest())
+            off += self.sha_block_size_bytes
+        return b''.join(digests)
+
+    def _find_changed_extents(self, digests, parent_digests, datalen):
+        """Return the (start, end) extents of data that differ from parent.
+
+        digests and parent_digests are the raw sha256 digests of the blocks
+        of the data, in the new and in the parent backup.
+        """
+        # Most chunks are unchanged in an incremental backup, find them
+        # with a single comparison.
+        if digests == parent_digests:
+            return []
+        size = Sha256List.DIGEST_SIZE
+        extents = []
+        extent_off = -1
+        for idx, off in enumerate(range(0, len(digests), size)):
+            if digests[off:off + size] != parent_digests[off:off + size]:
+                if extent_off == -1:
+                    # Start of new extent.
+                    extent_off = idx * self.sha_block_size_bytes
+            elif extent_off != -1:
+                # We've reached the end of extent.
+                extents.append((extent_off, idx * self.sha_block_size_bytes))
+                extent_off = -1
+        # The last extent extends to the end of data buffer.
+        if extent_off != -1:
+            extents.append((extent_off, datalen))
+        return extents
+
+    def _process_chunk(self, data, data_offset, parent_shalist, shaindex):
+        """Hash and compress a chunk of data read from the volume.
+
+        This is the CPU bound stage of the backup pipeline, it does not
+        touch the database nor the backup repository so that it can be run
+        in a native thread.
+
+        Returns the raw sha256 digests of the chunk, a list of
+        (offset, length, algorithm, output_data, md5) tuples describing the
+        objects that have to be written for it and the time spent. When
+        sparse detection is enabled all-zero segments are returned with
+        output_data set to None, they are recorded as holes.
+        """
+        start = time.time()
+        digests = self._calculate_shas(data)
+        if parent_shalist is None:
+            extents = [(0, len(data))]
+        else:
+            parent_digests = parent_shalist.get_digests(
+                shaindex, len(digests) // Sha256List.DIGEST_SIZE)
+            extents = self._find_changed_extents(digests, parent_digests,
+                                                 len(data))
+        segments = []
+        for extent_start, extent_end in extents:
+            segment = data[extent_start:extent_end]
+            if self.sparse_detection and self._is_zero_data(segment):
+                segments.append((data_offset + extent_start, len(segment),
+                                 None, None, None))
+                continue
+            algorithm, output_data = self._prepare_output_data(segment)
+            md5 = hashlib.md5(segment).hexdigest()
+            segments.append((data_offset + extent_start, len(segment),
+                             algorithm, output_data, md5))
+        return digests, segments, time.time() - start
+
+    def _get_zero_buffer(self, length):
+        """Return a buffer of at least length zero bytes."""
+        if len(self._zero_buffer) < length:
+            self._zero_buffer = b'\0' * length
+        return self._zero_buffer
+
+    def _is_zero_data(self, data):
+        if data[:1] != b'\0':
+            return False
+        zeros = self._get_zero_buffer(len(data))
+        if len(zeros) != len(data):
+            zeros = zeros[:len(data)]
+        return data == zeros
+
+    def _read_chunk(self, volume_file, offset):
+        """Read the next chunk of the volume at offset.
+
+        :returns: the data of the chunk, zeros which are not read from the
+                  volume if the chunk is a hole.
+        """
+        hole_length = 0
+        if self.sparse_detection:
+            hole_length = self._get_hole_chunk_length(volume_file, offset)
+        if not hole_length:
+            return volume_file.read(self.chunk_size_bytes)
+        # Unallocated chunk, no need to read it.
+        volume_file.seek(offset + hole_length)
+        data = self._get_zero_buffer(self.chunk_size_bytes)
+        if hole_length != len(data):
+            data = data[:hole_length]
+        return data
+
+    def _get_hole_chunk_length(self, volume_file, offset):
+        """Return the length of the chunk at offset if it is unallocated.
+
+        Only regular files are probed with SEEK_DATA, 0 is returned when the
+        chunk holds data or when this cannot be determined.
+        """
+        try:
+            fileno = volume_file.fileno()
+            file_stat = os.fstat(fileno)
+        except (AttributeError, IOError, OSError):
+            return 0
+        if not stat.S_ISREG(file_stat.st_mode):
+            return 0
+        file_size = file_stat.st_size
+        length = min(self.chunk_size_bytes, file_size - offset)
+        if length <= 0:
+            return 0
+        try:
+            next_data = os.lseek(fileno, offset, SEEK_DATA)
+        except OSError as e:
+            if e.errno != errno.ENXIO:
+                # SEEK_DATA is not supported by this file system.
+                return 0
+            # There is no data after offset.
+            next_data = file_size
+        finally:
+            # Keep the file object and the descriptor positions in sync.
+            volume_file.seek(offset)
+        return length if next_data >= offset + length else 0
+
+    def _add_hole(self, object_meta, data_offset, length):
+        """Record an all-zero extent in the object metadata."""
+        LOG.debug('Recording hole at offset %(offset)d, length %(length)d.',
+                  {'offset': data_offset, 'length': length})
+        object_meta['holes'].append({'offset': data_offset,
+                                     'length': length})
+
+    def _add_object(self, object_meta, data_offset, length, algorithm, md5):
+        """Record a new object in the object metadata and return its name."""
         object_prefix = object_meta['prefix']
-        object_list = object_meta['list']
-
         object_id = object_meta['id']
         object_name = '%s-%05d' % (object_prefix, object_id)
         obj = {}
         obj[object_name] = {}
         obj[object_name]['offset'] = data_offset
-        obj[object_name]['length'] = len(data)
-        LOG.debug('Backing up chunk of data from volume.')
-        algorithm, output_data = self._prepare_output_data(data)
+        obj[object_name]['length'] = length
         obj[object_name]['compression'] = algorithm
-        LOG.debug('About to put_object')
+        obj[object_name]['md5'] = md5
+        LOG.debug('backup MD5 for %(object_name)s: %(md5)s',
+                  {'object_name': object_name, 'md5': md5})
+        object_meta['list'].append(obj)
+        object_meta['id'] = object_id + 1
+        return object_name
+
+    def _write_object(self, container, object_name, output_data,
+                      extra_metadata):
+        """Write a single chunk object to the backup repository."""
+        LOG.debug('About to put_object %s', object_name)
         with self.get_object_writer(
                 container, object_name, extra_metadata=extra_metadata
         ) as writer:
             writer.write(output_data)
-        md5 = hashlib.md5(data).hexdigest()
-        obj[object_name]['md5'] = md5
-        LOG.debug('backup MD5 for %(object_name)s: %(md5)s',
-                  {'object_name': object_name, 'md5': md5})
-        object_list.append(obj)
-        object_id += 1
-        object_meta['list'] = object_list
-        object_meta['id'] = object_id
-
-        LOG.debug('Calling eventlet.sleep(0)')
-        eventlet.sleep(0)
 
     def _prepare_output_data(self, data):
         if self.compressor is None:
@@ -380,7 +686,8 @@ class ChunkedBackupDriver(driver.BackupDriver):
                              container,
                              object_list,
                              volume_meta,
-                             extra_metadata)
+                             extra_metadata,
+                             object_meta.get('holes'))
         backup.object_count = object_id
         backup.save()
         LOG.debug('backup %s finished.', backup['id'])
@@ -418,6 +725,44 @@ class ChunkedBackupDriver(driver.BackupDriver):
                                                extra_usage_info=
                                                object_meta)
 
+    def _chunk_sent(self, backup, object_meta, progress, total_volume_size):
+        """Account for a chunk sent and notify the progress if needed."""
+        progress['blocks_sent'] += self.data_block_num
+        progress['chunks'] += 1
+        if progress['chunks'] == self.data_block_num:
+            # Send the notification to Ceilometer when the chunk number
+            # reaches the data_block_num.  The backup percentage is put in
+            # the metadata as the extra information.
+            self._send_progress_notification(self.context, backup,
+                                             object_meta,
+                                             progress['blocks_sent'],
+                                             total_volume_size)
+            progress['chunks'] = 0
+
+    def _log_backup_stats(self, backup, stats, elapsed):
+        """Log the throughput of each stage of the backup pipeline."""
+        def _rate(nbytes, seconds):
+            return nbytes / units.Mi / seconds if seconds else 0.0
+
+        LOG.info(_LI('Backup %(backup_id)s: %(read_mb).2f MB read in '
+                     '%(elapsed).2f sec. Read: %(read_rate).2f MB/s, '
+                     'hash and compress (%(workers)d workers): '
+                     '%(process_rate).2f MB/s per worker, write '
+                     '(%(writers)d writers): %(write_rate).2f MB/s per '
+                     'writer, %(write_mb).2f MB written.'),
+                 {'backup_id': backup.id,
+                  'read_mb': float(stats['read_bytes']) / units.Mi,
+                  'elapsed': elapsed,
+                  'read_rate': _rate(float(stats['read_bytes']),
+                                     stats['read_time']),
+                  'workers': self.compression_workers,
+                  'process_rate': _rate(float(stats['read_bytes']),
+                                        stats['process_time']),
+                  'writers': self.writer_workers,
+                  'write_rate': _rate(float(stats['write_bytes']),
+                                      stats['write_time']),
+                  'write_mb': float(stats['write_bytes']) / units.Mi})
+
     def backup(self, backup, volume_file, backup_metadata=True):
         """Backup the given volume.
 
@@ -456,8 +801,7 @@ class ChunkedBackupDriver(driver.BackupDriver):
         (object_meta, object_sha256, extra_metadata, container,
          volume_size_bytes) = self._prepare_backup(backup)
 
-        counter = 0
-        total_block_sent_num = 0
+        progress = {'chunks': 0, 'blocks_sent': 0}
 
         # There are two mechanisms to send the progress notification.
         # 1. The notifications are periodically sent in a certain interval.
@@ -467,7 +811,7 @@ class ChunkedBackupDriver(driver.BackupDriver):
         def _notify_progress():
             self._send_progress_notification(self.context, backup,
                                              object_meta,
-                                             total_block_sent_num,
+                                             progress['blocks_sent'],
                                              volume_size_bytes)
         timer = loopingcall.FixedIntervalLoopingCall(
             _notify_progress)
@@ -475,88 +819,111 @@ class ChunkedBackupDriver(driver.BackupDriver):
             timer.start(interval=self.backup_timer_interval)
 
         sha256_list = object_sha256['sha256s']
+        parent_shalist = parent_backup_shalist if parent_backup else None
         shaindex = 0
         is_backup_canceled = False
-        while True:
-            # First of all, we check the status of this backup. If it
-            # has been changed to delete or has been deleted, we cancel the
-            # backup process to do forcing delete.
-            backup = objects.Backup.get_by_id(self.context, backup.id)
-            if backup.status in (fields.BackupStatus.DELETING,
-                                 fields.BackupStatus.DELETED):
-                is_backup_canceled = True
-                # To avoid the chunk left when deletion complete, need to
-                # clean up the object of chunk again.
-                self.delete(backup)
-                LOG.debug('Cancel the backup process of %s.', backup.id)
-                break
-            data_offset = volume_file.tell()
-            data = volume_file.read(self.chunk_size_bytes)
-            if data == b'':
-                break
-
-            # Calculate new shas with the datablock.
-            shalist = []
-            off = 0
-            datalen = len(data)
-            while off < datalen:
-                chunk_start = off
-                chunk_end = chunk_start + self.sha_block_size_bytes
-                if chunk_end > datalen:
-                    chunk_end = datalen
-                chunk = data[chunk_start:chunk_end]
-                sha = hashlib.sha256(chunk).hexdigest()
-                shalist.append(sha)
-                off += self.sha_block_size_bytes
-            sha256_list.extend(shalist)
-
-            # If parent_backup is not None, that means an incremental
-            # backup will be performed.
-            if parent_backup:
-                # Find the extent that needs to be backed up.
-                extent_off = -1
-                for idx, sha in enumerate(shalist):
-                    if sha != parent_backup_shalist[shaindex]:
-                        if extent_off == -1:
-                            # Start of new extent.
-                            extent_off = idx * self.sha_block_size_bytes
-                    else:
-                        if extent_off != -1:
-                            # We've reached the end of extent.
-                            extent_end = idx * self.sha_block_size_bytes
-                            segment = data[extent_off:extent_end]
-                            self._backup_chunk(backup, container, segment,
-                                               data_offset + extent_off,
-                                               object_meta,
-                                               extra_metadata)
-                            extent_off = -1
-                    shaindex += 1
-
-                # The last extent extends to the end of data buffer.
-                if extent_off != -1:
-                    extent_end = datalen
-                    segment = data[extent_off:extent_end]
-                    self._backup_chunk(backup, container, segment,
-                                       data_offset + extent_off,
-                                       object_meta, extra_metadata)
-                    extent_off = -1
-            else:  # Do a full backup.
-                self._backup_chunk(backup, container, data, data_offset,
-                                   object_meta, extra_metadata)
-
-            # Notifications
-            total_block_sent_num += self.data_block_num
-            counter += 1
-            if counter == self.data_block_num:
-                # Send the notification to Ceilometer when the chunk
-                # number reaches the data_block_num.  The backup percentage
-                # is put in the metadata as the extra information.
-                self._send_progress_notification(self.context, backup,
-                                                 object_meta,
-                                                 total_block_sent_num,
-                                                 volume_size_bytes)
-                # Reset the counter
-                counter = 0
+
+        # The backup runs as a pipeline: this greenthread reads the chunks
+        # from the volume, up to backup_compression_workers chunks are hashed
+        # and compressed concurrently and up to backup_writer_workers objects
+        # are written to the backup repository at the same time. Processed
+        # chunks are collected in the order they were read, so the object
+        # list and the sha256 list are the same as with a serial backup.
+        process_pool = eventlet.GreenPool(self.compression_workers)
+        write_pool = eventlet.GreenPool(self.writer_workers)
+        pending = collections.deque()
+        write_errors = []
+        stats = {'read_bytes': 0, 'read_time': 0.0, 'process_time': 0.0,
+                 'write_bytes': 0, 'write_time': 0.0}
+        backup_start = time.time()
+        cancel_checker = BackupCancelChecker(self.context, backup,
+                                             self.status_check_interval)
+
+        def _process(data, data_offset, shaindex):
+            if self.compression_workers > 1:
+                return tpool.execute(self._process_chunk, data, data_offset,
+                                     parent_shalist, shaindex)
+            return self._process_chunk(data, data_offset, parent_shalist,
+                                       shaindex)
+
+        def _write(object_name, output_data):
+            start = time.time()
+            try:
+                self._write_object(container, object_name, output_data,
+                                   extra_metadata)
+            except Exception:
+                write_errors.append(sys.exc_info())
+                return
+            stats['write_time'] += time.time() - start
+            stats['write_bytes'] += len(output_data)
+
+        def _collect_chunk():
+            digests, segments, elapsed = pending.popleft().wait()
+            stats['process_time'] += elapsed
+            sha256_list.extend(digests)
+            for data_offset, length, algorithm, output_data, md5 in segments:
+                if output_data is None:
+                    self._add_hole(object_meta, data_offset, length)
+                    continue
+                object_name = self._add_object(object_meta, data_offset,
+                                               length, algorithm, md5)
+                write_pool.spawn(_write, object_name, output_data)
+
+        def _check_write_errors():
+            if write_errors:
+                write_pool.waitall()
+                six.reraise(*write_errors[0])
+
+        try:
+            while True:
+                # First of all, we check the status of this backup. If it
+                # has been changed to delete or has been deleted, we cancel
+                # the backup process to do forcing delete.
+                is_cancelled = cancel_checker.is_cancelled()
+                backup = cancel_checker.backup
+                if is_cancelled:
+                    is_backup_canceled = True
+                    # Let the in flight writes finish, to avoid the chunk
+                    # left when deletion complete, need to clean up the
+                    # object of chunk again.
+                    process_pool.waitall()
+                    write_pool.waitall()
+                    self.delete(backup)
+                    LOG.debug('Cancel the backup process of %s.', backup.id)
+                    break
+                _check_write_errors()
+
+                start = time.time()
+                data_offset = volume_file.tell()
+                data = self._read_chunk(volume_file, data_offset)
+                stats['read_time'] += time.time() - start
+                if data == b'':
+                    break
+                stats['read_bytes'] += len(data)
+
+                pending.append(process_pool.spawn(_process, data,
+                                                  data_offset, shaindex))
+                shaindex += ((len(data) + self.sha_block_size_bytes - 1) //
+                             self.sha_block_size_bytes)
+                while len(pending) > self.compression_workers:
+                    _collect_chunk()
+
+                self._chunk_sent(backup, object_meta, progress,
+                                 volume_size_bytes)
+
+                LOG.debug('Calling eventlet.sleep(0)')
+                eventlet.sleep(0)
+
+            if not is_backup_canceled:
+                while pending:
+                    _collect_chunk()
+                write_pool.waitall()
+                _check_write_errors()
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                process_pool.waitall()
+                write_pool.waitall()
+                timer.stop()
 
         # Stop the timer.
         timer.stop()
@@ -564,6 +931,7 @@ class ChunkedBackupDriver(driver.BackupDriver):
         # but timer.stop().
         if is_backup_canceled:
             return
+        self._log_backup_stats(backup, stats, time.time() - backup_start)
         # All the data have been sent, the backup_percent reaches 100.
         self._send_progress_end(self.context, backup, object_meta)
 
@@ -580,8 +948,25 @@ class ChunkedBackupDriver(driver.BackupDriver):
 
         self._finalize_backup(backup, container, object_meta, object_sha256)
 
-    def _restore_v1(self, backup, volume_id, metadata, volume_file):
-        """Restore a v1 volume backup."""
+    def _send_restore_progress(self, context, backup, restored_bytes,
+                               total_bytes, elapsed):
+        restore_percent = (restored_bytes * 100 / total_bytes
+                           if total_bytes else 100)
+        restore_rate = (float(restored_bytes) / units.Mi / elapsed
+                        if elapsed else 0.0)
+        volume_utils.notify_about_backup_usage(
+            context, backup, "restoreprogress",
+            extra_usage_info={'restore_percent': restore_percent,
+                              'restored_bytes': restored_bytes,
+                              'restore_rate': restore_rate})
+
+    def _restore_v1(self, backup, volume_id, metadata, volume_file,
+                    cancel_checker=None):
+        """Restore a v1 volume backup.
+
+        If a cancel_checker is given, the restore is aborted with
+        BackupRestoreCancel when the backup being restored is deleted.
+        """
         backup_id = backup['id']
         LOG.debug('v1 volume backup restore of %s started.', backup_id)
         extra_metadata = metadata.get('extra_metadata')
@@ -601,50 +986,113 @@ class ChunkedBackupDriver(driver.BackupDriver):
                     'does not match object list stored in metadata.')
             raise exception.InvalidBackup(reason=err)
 
-        for metadata_object in metadata_objects:
-            object_name, obj = list(metadata_object.items())[0]
-            LOG.debug('restoring object. backup: %(backup_id)s, '
-                      'container: %(container)s, object name: '
-                      '%(object_name)s, volume: %(volume_id)s.',
-                      {
-                          'backup_id': backup_id,
-                          'container': container,
-                          'object_name': object_name,
-                          'volume_id': volume_id,
-                      })
+        # Holes are all-zero extents which were not stored in the backup
+        # repository, there is nothing to download for them.
+        for hole in metadata.get('holes', []):
+            LOG.debug('restoring hole at offset %(offset)d, length '
+                      '%(length)d, volume: %(volume_id)s.',
+                      {'offset': hole['offset'], 'length': hole['length'],
+                       'volume_id': volume_id})
+            volume_file.seek(hole['offset'])
+            remaining = hole['length']
+            while remaining > 0:
+                length = min(remaining, self.chunk_size_bytes)
+                zeros = self._get_zero_buffer(length)
+                if len(zeros) != length:
+                    zeros = zeros[:length]
+                volume_file.write(zeros)
+                remaining -= length
+            eventlet.sleep(0)
+        if metadata.get('holes'):
+            volume_file.flush()
 
+        # Up to backup_restore_readahead objects are downloaded and
+        # decompressed concurrently while they are written to the volume in
+        # the order of the metadata.
+        fetch_pool = eventlet.GreenPool(self.restore_readahead)
+        fetches = collections.deque()
+        pending_objects = collections.deque(
+            list(metadata_object.items())[0]
+            for metadata_object in metadata_objects)
+        total_bytes = sum(obj['length'] for _name, obj in pending_objects)
+        restored_bytes = 0
+        restore_start = time.time()
+        counter = 0
+
+        def _fetch_object(object_name, compression_algorithm):
             with self.get_object_reader(
                     container, object_name,
                     extra_metadata=extra_metadata) as reader:
                 body = reader.read()
-            compression_algorithm = metadata_object[object_name]['compression']
             decompressor = self._get_compressor(compression_algorithm)
-            volume_file.seek(obj['offset'])
-            if decompressor is not None:
-                LOG.debug('decompressing data using %s algorithm',
-                          compression_algorithm)
-                decompressed = decompressor.decompress(body)
-                volume_file.write(decompressed)
-            else:
-                volume_file.write(body)
-
-            # force flush every write to avoid long blocking write on close
-            volume_file.flush()
+            if decompressor is None:
+                return body
+            LOG.debug('decompressing data using %s algorithm',
+                      compression_algorithm)
+            if self.restore_readahead > 1:
+                return tpool.execute(decompressor.decompress, body)
+            return decompressor.decompress(body)
+
+        def _fill_window():
+            while pending_objects and len(fetches) < self.restore_readahead:
+                object_name, obj = pending_objects.popleft()
+                fetches.append((object_name, obj, fetch_pool.spawn(
+                    _fetch_object, object_name, obj['compression'])))
 
-            # Be tolerant to IO implementations that do not support fileno()
-            try:
-                fileno = volume_file.fileno()
-            except IOError:
-                LOG.info(_LI("volume_file does not support "
-                             "fileno() so skipping "
-                             "fsync()"))
-            else:
-                os.fsync(fileno)
-
-            # Restoring a backup to a volume can take some time. Yield so other
-            # threads can run, allowing for among other things the service
-            # status to be updated
-            eventlet.sleep(0)
+        try:
+            _fill_window()
+            while fetches:
+                if cancel_checker and cancel_checker.is_cancelled():
+                    raise exception.BackupRestoreCancel(
+                        back_id=cancel_checker.backup.id, vol_id=volume_id)
+                object_name, obj, fetch = fetches.popleft()
+                LOG.debug('restoring object. backup: %(backup_id)s, '
+                          'container: %(container)s, object name: '
+                          '%(object_name)s, volume: %(volume_id)s.',
+                          {
+                              'backup_id': backup_id,
+                              'container': container,
+                              'object_name': object_name,
+                              'volume_id': volume_id,
+                          })
+                data = fetch.wait()
+                _fill_window()
+                volume_file.seek(obj['offset'])
+                volume_file.write(data)
+
+                # force flush every write to avoid long blocking write on
+                # close
+                volume_file.flush()
+
+                # Be tolerant to IO implementations that do not support
+                # fileno()
+                try:
+                    fileno = volume_file.fileno()
+                except IOError:
+                    LOG.info(_LI("volume_file does not support "
+                                 "fileno() so skipping "
+                                 "fsync()"))
+                else:
+                    os.fsync(fileno)
+
+                restored_bytes += len(data)
+                counter += 1
+                if counter == self.data_block_num:
+                    self._send_restore_progress(self.context, backup,
+                                                restored_bytes, total_bytes,
+                                                time.time() - restore_start)
+                    counter = 0
+
+                # Restoring a backup to a volume can take some time. Yield so
+                # other threads can run, allowing for among other things the
+                # service status to be updated
+                eventlet.sleep(0)
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                fetch_pool.waitall()
+
+        self._send_restore_progress(self.context, backup, restored_bytes,
+                                    total_bytes, time.time() - restore_start)
         LOG.debug('v1 volume backup restore of %s finished.',
                   backup_id)
 
@@ -684,6 +1132,9 @@ class ChunkedBackupDriver(driver.BackupDriver):
             backup_list.append(prev_backup)
             current_backup = prev_backup
 
+        cancel_checker = BackupCancelChecker(self.context, backup,
+                                             self.status_check_interval)
+
         # Do a full restore first, then layer the incremental backups
         # on top of it in order.
         index = len(backup_list) - 1
@@ -691,7 +1142,8 @@ class ChunkedBackupDriver(driver.BackupDriver):
             backup1 = backup_list[index]
             index = index - 1
             metadata = self._read_metadata(backup1)
-            restore_func(backup1, volume_id, metadata, volume_file)
+            restore_func(backup1, volume_id, metadata, volume_file,
+                         cancel_checker)
 
             volume_meta = metadata.get('volume_meta', None)
             try:
@@ -232,14 +232,25 @@ class CephBackupDriver(driver.BackupDriver):
 
         return (old_format, features)
 
+    def _get_connection_pool(self):
+        return rbd_driver.get_connection_pool(
+            self._ceph_backup_user, None, self._ceph_backup_conf,
+            CONF.rados_connection_pool_size,
+            CONF.rados_connection_pool_idle_timeout)
+
     def _connect_to_rados(self, pool=None):
+        """Get a connection to the backup Ceph cluster."""
+        pool_to_open = utils.convert_str(pool or self._ceph_backup_pool)
+        return self._get_connection_pool().get(pool_to_open,
+                                               self._new_connection)
+
+    def _new_connection(self, pool):
         """Establish connection to the backup Ceph cluster."""
         client = self.rados.Rados(rados_id=self._ceph_backup_user,
                                   conffile=self._ceph_backup_conf)
         try:
             client.connect()
-            pool_to_open = utils.convert_str(pool or self._ceph_backup_pool)
-            ioctx = client.open_ioctx(pool_to_open)
+            ioctx = client.open_ioctx(pool)
             return client, ioctx
         except self.rados.Error:
             # shutdown cannot raise an exception
@@ -247,10 +258,8 @@ class CephBackupDriver(driver.BackupDriver):
             raise
 
     def _disconnect_from_rados(self, client, ioctx):
-        """Terminate connection with the backup Ceph cluster."""
-        # closing an ioctx cannot raise an exception
-        ioctx.close()
-        client.shutdown()
+        """Give back a connection with the backup Ceph cluster."""
+        self._get_connection_pool().put(client, ioctx)
 
     def _get_backup_base_name(self, volume_id, backup_id=None,
                               diff_format=False):
@@ -884,6 +893,8 @@ class CephBackupDriver(driver.BackupDriver):
 
         LOG.debug("Backup '%(backup_id)s' of volume %(volume_id)s finished.",
                   {'backup_id': backup_id, 'volume_id': volume_id})
+        LOG.debug("RADOS connection pool stats: %s",
+                  self._get_connection_pool().stats())
 
     def _full_restore(self, backup_id, volume_id, dest_file, dest_name,
                       length, src_snap=None):
@@ -1155,6 +1166,8 @@ class CephBackupDriver(driver.BackupDriver):
 
             LOG.debug('Restore to volume %s finished successfully.',
                       volume_id)
+            LOG.debug("RADOS connection pool stats: %s",
+                      self._get_connection_pool().stats())
         except exception.BackupOperationError as e:
             LOG.error(_LE('Restore to volume %(volume)s finished with error - '
                           '%(error)s.'), {'error': e, 'volume': volume_id})
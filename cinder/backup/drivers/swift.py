@@ -44,12 +44,12 @@
 """
 
 import hashlib
+import os
 import socket
 
 from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import timeutils
-import six
 from swiftclient import client as swift
 
 from cinder.backup import chunkeddriver
@@ -126,6 +126,60 @@ CONF = cfg.CONF
 CONF.register_opts(swiftbackup_service_opts)
 
 
+class BuffersReader(object):
+    """Read-only file object over a list of buffers.
+
+    The data is read from memoryviews of the buffers, so reads of a given
+    size return parts of the buffers without copying them.  It can be
+    rewound with seek() to upload the data again.
+    """
+
+    def __init__(self, buffers):
+        self._views = [memoryview(buf) for buf in buffers if len(buf)]
+        self._length = sum(len(view) for view in self._views)
+        self.seek(0)
+
+    def tell(self):
+        return self._pos
+
+    def seek(self, offset, whence=os.SEEK_SET):
+        if whence == os.SEEK_CUR:
+            offset += self._pos
+        elif whence == os.SEEK_END:
+            offset += self._length
+        self._pos = max(0, min(offset, self._length))
+        # Find the buffer and the offset in it of the new position.
+        self._index = 0
+        self._offset = self._pos
+        while (self._index < len(self._views) and
+                self._offset >= len(self._views[self._index])):
+            self._offset -= len(self._views[self._index])
+            self._index += 1
+        return self._pos
+
+    def read(self, size=-1):
+        """Read up to size bytes, or all the remaining ones if size < 0.
+
+        Returns at most the rest of the current buffer, as a memoryview,
+        when size is given.
+        """
+        if size is None or size < 0:
+            chunks = []
+            while self._index < len(self._views):
+                chunks.append(self.read(self._length).tobytes())
+            return b''.join(chunks)
+        if self._index >= len(self._views) or not size:
+            return b''
+        view = self._views[self._index]
+        data = view[self._offset:self._offset + size]
+        self._pos += len(data)
+        self._offset += len(data)
+        if self._offset >= len(view):
+            self._index += 1
+            self._offset = 0
+        return data
+
+
 class SwiftBackupDriver(chunkeddriver.ChunkedBackupDriver):
     """Provides backup, restore and delete of backup objects within Swift."""
 
@@ -224,11 +278,20 @@ class SwiftBackupDriver(chunkeddriver.ChunkedBackupDriver):
                                          cacert=CONF.backup_swift_ca_cert_file)
 
     class SwiftObjectWriter(object):
+        """Uploads the data written to it as a Swift object on close.
+
+        The written buffers are kept as they are and uploaded without being
+        copied, so they must not be modified until the writer is closed.
+        Their MD5 is computed as they are written.
+        """
+
         def __init__(self, container, object_name, conn):
             self.container = container
             self.object_name = object_name
             self.conn = conn
-            self.data = bytearray()
+            self.data = []
+            self.length = 0
+            self.md5 = hashlib.md5()
 
         def __enter__(self):
             return self
@@ -237,19 +300,23 @@ class SwiftBackupDriver(chunkeddriver.ChunkedBackupDriver):
             self.close()
 
         def write(self, data):
-            self.data += data
+            self.data.append(data)
+            self.length += len(data)
+            self.md5.update(data)
 
         def close(self):
-            reader = six.BytesIO(self.data)
+            reader = BuffersReader(self.data)
             try:
                 etag = self.conn.put_object(self.container, self.object_name,
                                             reader,
-                                            content_length=len(self.data))
+                                            content_length=self.length)
             except socket.error as err:
                 raise exception.SwiftConnectionFailed(reason=err)
+            finally:
+                self.data = []
             LOG.debug('swift MD5 for %(object_name)s: %(etag)s',
                       {'object_name': self.object_name, 'etag': etag, })
-            md5 = hashlib.md5(self.data).hexdigest()
+            md5 = self.md5.hexdigest()
             LOG.debug('backup MD5 for %(object_name)s: %(md5)s',
                       {'object_name': self.object_name, 'md5': md5})
             if etag != md5:
@@ -420,6 +420,11 @@ class BackupManager(manager.SchedulerDependentManager):
 
         try:
             self._run_restore(context, backup, volume)
+        except exception.BackupRestoreCancel:
+            with excutils.save_and_reraise_exception():
+                # The backup is being deleted, do not change its status.
+                self.db.volume_update(context, volume_id,
+                                      {'status': 'error_restoring'})
         except Exception:
             with excutils.save_and_reraise_exception():
                 self.db.volume_update(context, volume_id,
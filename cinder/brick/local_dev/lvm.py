@@ -17,9 +17,11 @@
 LVM class for performing LVM operations.
 """
 
+import functools
 import math
 import os
 import re
+import time
 
 from os_brick import executor
 from oslo_concurrency import processutils as putils
@@ -35,13 +37,30 @@ from cinder import utils
 LOG = logging.getLogger(__name__)
 
 
+def _changes_lvs(f):
+    """Decorate LVM methods changing the LVs of the VG.
+
+    The LV report is dropped once the change is done, and reports run
+    while it is in progress are not cached.
+    """
+    @functools.wraps(f)
+    def wrapper(self, *args, **kwargs):
+        self._lv_report_generation += 1
+        try:
+            return f(self, *args, **kwargs)
+        finally:
+            self._invalidate_lv_report()
+    return wrapper
+
+
 class LVM(executor.Executor):
     """LVM object to enable various LVM related operations."""
     LVM_CMD_PREFIX = ['env', 'LC_ALL=C']
 
     def __init__(self, vg_name, root_helper, create_vg=False,
                  physical_volumes=None, lvm_type='default',
-                 executor=putils.execute, lvm_conf=None):
+                 executor=putils.execute, lvm_conf=None,
+                 report_cache_ttl=0):
 
         """Initialize the LVM object.
 
@@ -55,6 +74,10 @@ class LVM(executor.Executor):
         :param physical_volumes: List of PVs to build VG on
         :param lvm_type: VG and Volume type (default, or thin)
         :param executor: Execute method to use, None uses common/processutils
+        :param report_cache_ttl: Seconds the LVs reported by the last
+                                 update_volume_group_info are reused by
+                                 get_volumes and get_volume, 0 to always
+                                 query LVM
 
         """
         super(LVM, self).__init__(execute=executor, root_helper=root_helper)
@@ -70,6 +93,13 @@ class LVM(executor.Executor):
         self._supports_snapshot_lv_activation = None
         self._supports_lvchange_ignoreskipactivation = None
         self.vg_provisioned_capacity = 0.0
+        self.report_cache_ttl = report_cache_ttl
+        # LVs of the VG reported by update_volume_group_info, and when.
+        self._lv_report = None
+        self._lv_report_time = 0
+        # Bumped by each change of the LVs, a report that ran across a
+        # change is not cached.
+        self._lv_report_generation = 0
 
         # Ensure LVM_SYSTEM_DIR has been added to LVM.LVM_CMD_PREFIX
         # before the first LVM command is executed, and use the directory
@@ -174,11 +204,7 @@ class LVM(executor.Executor):
             if out is not None:
                 out = out.strip()
                 data = out.split(':')
-                pool_size = float(data[0])
-                data_percent = float(data[1])
-                consumed_space = pool_size / 100 * data_percent
-                free_space = pool_size - consumed_space
-                free_space = round(free_space, 2)
+                free_space = self._thin_pool_free_space(data[0], data[1])
         except putils.ProcessExecutionError as err:
             LOG.exception(_LE('Error querying thin pool about data_percent'))
             LOG.error(_LE('Cmd     :%s'), err.cmd)
@@ -187,6 +213,12 @@ class LVM(executor.Executor):
 
         return free_space
 
+    @staticmethod
+    def _thin_pool_free_space(pool_size, data_percent):
+        pool_size = float(pool_size)
+        consumed_space = pool_size / 100 * float(data_percent)
+        return round(pool_size - consumed_space, 2)
+
     @staticmethod
     def get_lvm_version(root_helper):
         """Static method to get LVM version from system.
@@ -298,12 +330,26 @@ class LVM(executor.Executor):
 
         return lv_list
 
+    def _get_lv_report(self):
+        """Return the LVs of the last report if it is fresh enough."""
+        if (self._lv_report is not None and
+                time.time() - self._lv_report_time < self.report_cache_ttl):
+            return self._lv_report
+        return None
+
+    def _invalidate_lv_report(self):
+        self._lv_report = None
+        self._lv_report_generation += 1
+
     def get_volumes(self, lv_name=None):
         """Get all LV's associated with this instantiation (VG).
 
         :returns: List of Dictionaries with LV info
 
         """
+        lv_report = self._get_lv_report()
+        if lv_name is None and lv_report is not None:
+            return [dict(lv) for lv in lv_report]
         return self.get_lv_info(self._root_helper,
                                 self.vg_name,
                                 lv_name)
@@ -311,9 +357,15 @@ class LVM(executor.Executor):
     def get_volume(self, name):
         """Get reference object of volume specified by name.
 
+        LVs missing from the last report are looked up again, they may
+        have been created by another process since.
+
         :returns: dict representation of Logical Volume if exists
 
         """
+        for r in self._get_lv_report() or []:
+            if r['name'] == name:
+                return dict(r)
         ref_list = self.get_volumes(name)
         for r in ref_list:
             if r['name'] == name:
@@ -395,71 +447,101 @@ class LVM(executor.Executor):
 
         return vg_list
 
+    def _get_vg_report(self):
+        """Get the info of this VG and its LVs with a single lvs command.
+
+        :returns: Tuple of a dictionary with VG info and a list of
+                  dictionaries with LV info, with the data_percent of the LV
+        """
+        field_sep = ':'
+        cmd = LVM.LVM_CMD_PREFIX + ['lvs', '--noheadings', '--unit=g',
+                                    '-o', 'vg_name,vg_size,vg_free,lv_count,'
+                                    'vg_uuid,lv_name,lv_size,data_percent',
+                                    '--separator', field_sep, '--nosuffix',
+                                    self.vg_name]
+        try:
+            (out, _err) = self._execute(*cmd,
+                                        root_helper=self._root_helper,
+                                        run_as_root=True)
+        except putils.ProcessExecutionError as err:
+            with excutils.save_and_reraise_exception(reraise=True) as ctx:
+                if ("not found" in err.stderr or
+                        "Failed to find" in err.stderr):
+                    ctx.reraise = False
+                    out = None
+
+        vg = None
+        lv_list = []
+        for line in (out or '').splitlines():
+            fields = line.strip().split(field_sep)
+            if len(fields) != 8 or fields[0] != self.vg_name:
+                continue
+            vg = {'name': fields[0],
+                  'size': float(fields[1]),
+                  'available': float(fields[2]),
+                  'lv_count': int(fields[3]),
+                  'uuid': fields[4]}
+            lv_list.append({'vg': fields[0], 'name': fields[5],
+                            'size': fields[6], 'data_percent': fields[7]})
+
+        if vg is None:
+            # lvs reports nothing about a VG without LVs.
+            vg_list = self.get_all_volume_groups(self._root_helper,
+                                                 self.vg_name)
+            if len(vg_list) == 1:
+                vg = vg_list[0]
+        return vg, lv_list
+
     def update_volume_group_info(self):
         """Update VG info for this instantiation.
 
         Used to update member fields of object and
-        provide a dict of info for caller.
+        provide a dict of info for caller.  The LVs of the VG are
+        reported by the same command, and reused by get_volumes and
+        get_volume for report_cache_ttl seconds.
 
         :returns: Dictionaries of VG info
 
         """
-        vg_list = self.get_all_volume_groups(self._root_helper, self.vg_name)
+        generation = self._lv_report_generation
+        vg, lv_list = self._get_vg_report()
 
-        if len(vg_list) != 1:
+        if vg is None:
             LOG.error(_LE('Unable to find VG: %s'), self.vg_name)
             raise exception.VolumeGroupNotFound(vg_name=self.vg_name)
 
-        self.vg_size = float(vg_list[0]['size'])
-        self.vg_free_space = float(vg_list[0]['available'])
-        self.vg_lv_count = int(vg_list[0]['lv_count'])
-        self.vg_uuid = vg_list[0]['uuid']
+        self.vg_size = float(vg['size'])
+        self.vg_free_space = float(vg['available'])
+        self.vg_lv_count = int(vg['lv_count'])
+        self.vg_uuid = vg['uuid']
 
         total_vols_size = 0.0
         if self.vg_thin_pool is not None:
-            # NOTE(xyang): If providing only self.vg_name,
-            # get_lv_info will output info on the thin pool and all
-            # individual volumes.
-            # get_lv_info(self._root_helper, 'stack-vg')
-            # sudo lvs --noheadings --unit=g -o vg_name,name,size
-            # --nosuffix stack-vg
-            # stack-vg stack-pool               9.51
-            # stack-vg volume-13380d16-54c3-4979-9d22-172082dbc1a1  1.00
-            # stack-vg volume-629e13ab-7759-46a5-b155-ee1eb20ca892  1.00
-            # stack-vg volume-e3e6281c-51ee-464c-b1a7-db6c0854622c  1.00
-            #
-            # If providing both self.vg_name and self.vg_thin_pool,
-            # get_lv_info will output only info on the thin pool, but not
-            # individual volumes.
-            # get_lv_info(self._root_helper, 'stack-vg', 'stack-pool')
-            # sudo lvs --noheadings --unit=g -o vg_name,name,size
-            # --nosuffix stack-vg/stack-pool
-            # stack-vg stack-pool               9.51
-            #
-            # We need info on both the thin pool and the volumes,
-            # therefore we should provide only self.vg_name, but not
-            # self.vg_thin_pool here.
-            for lv in self.get_lv_info(self._root_helper,
-                                       self.vg_name):
+            # We need info on both the thin pool and the volumes, which
+            # are all reported for the VG.
+            for lv in lv_list:
                 lvsize = lv['size']
-                # get_lv_info runs "lvs" command with "--nosuffix".
-                # This removes "g" from "1.00g" and only outputs "1.00".
-                # Running "lvs" command without "--nosuffix" will output
-                # "1.00g" if "g" is the unit.
-                # Remove the unit if it is in lv['size'].
+                # The report is run with "--nosuffix", which removes "g"
+                # from "1.00g" and only outputs "1.00".  Remove the unit if
+                # it is in lv['size'] anyway.
                 if not lv['size'][-1].isdigit():
                     lvsize = lvsize[:-1]
                 if lv['name'] == self.vg_thin_pool:
                     self.vg_thin_pool_size = lvsize
-                    tpfs = self._get_thin_pool_free_space(self.vg_name,
-                                                          self.vg_thin_pool)
-                    self.vg_thin_pool_free_space = tpfs
+                    self.vg_thin_pool_free_space = (
+                        self._thin_pool_free_space(
+                            lvsize, lv['data_percent'] or 0))
                 else:
                     total_vols_size = total_vols_size + float(lvsize)
             total_vols_size = round(total_vols_size, 2)
 
         self.vg_provisioned_capacity = total_vols_size
 
+        if generation == self._lv_report_generation:
+            self._lv_report = [{'vg': lv['vg'], 'name': lv['name'],
+                                'size': lv['size']} for lv in lv_list]
+            self._lv_report_time = time.time()
+
     def _calculate_thin_pool_size(self):
         """Calculates the correct size for a thin pool.
 
@@ -480,6 +562,7 @@ class LVM(executor.Executor):
         # leave 5% free for metadata
         return "%sg" % (self.vg_free_space * 0.95)
 
+    @_changes_lvs
     def create_thin_pool(self, name=None, size_str=None):
         """Creates a thin provisioning pool for this VG.
 
@@ -521,6 +604,7 @@ class LVM(executor.Executor):
         self.vg_thin_pool = name
         return size_str
 
+    @_changes_lvs
     def create_volume(self, name, size_str, lv_type='default', mirror_count=0):
         """Creates a logical volume on the object's VG.
 
@@ -561,6 +645,7 @@ class LVM(executor.Executor):
             raise
 
     @utils.retry(putils.ProcessExecutionError)
+    @_changes_lvs
     def create_lv_snapshot(self, name, source_lv_name, lv_type='default'):
         """Creates a snapshot of a logical volume.
 
@@ -656,6 +741,7 @@ class LVM(executor.Executor):
             raise
 
     @utils.retry(putils.ProcessExecutionError)
+    @_changes_lvs
     def delete(self, name):
         """Delete logical volume or snapshot.
 
@@ -702,6 +788,7 @@ class LVM(executor.Executor):
             LOG.debug('Successfully deleted volume: %s after '
                       'udev settle.', name)
 
+    @_changes_lvs
     def revert(self, snapshot_name):
         """Revert an LV from snapshot.
 
@@ -724,6 +811,7 @@ class LVM(executor.Executor):
                 return True
         return False
 
+    @_changes_lvs
     def extend_volume(self, lv_name, new_size):
         """Extend the size of an existing volume."""
         # Volumes with snaps have attributes 'o' or 'O' and will be
@@ -768,6 +856,7 @@ class LVM(executor.Executor):
     def vg_mirror_size(self, mirror_count):
         return (self.vg_free_space / (mirror_count + 1))
 
+    @_changes_lvs
     def rename_volume(self, lv_name, new_name):
         """Change the name of an existing volume."""
 
@@ -80,6 +80,7 @@ from cinder import objects
 from cinder import rpc
 from cinder import utils
 from cinder import version
+from cinder import volume
 from cinder.volume import utils as vutils
 
 
@@ -415,6 +416,55 @@ class BackupCommands(object):
                          object_count))
 
 
+class ImageCacheCommands(object):
+    """Methods for managing the image-volume cache."""
+
+    @args('image_ids', nargs='+',
+          help='IDs of the images to add to the cache')
+    @args('--host', required=True, action='append',
+          help='Backend (host@backend) or pool (host@backend#pool) whose '
+               'cache is prewarmed, can be repeated')
+    def prewarm(self, image_ids, host):
+        """Add images to the image-volume cache of backends or pools.
+
+        The backends download the images in the background, the entries
+        appear in the cache list once done.
+        """
+        if not rpc.initialized():
+            rpc.init(CONF)
+        ctxt = context.get_admin_context()
+        volume_api = volume.API()
+        for image_id in image_ids:
+            try:
+                volume_api.prewarm_image_cache(ctxt, image_id, host)
+            except exception.CinderException as e:
+                print(_("Unable to prewarm image %(image_id)s: %(error)s") %
+                      {'image_id': image_id, 'error': e})
+                return 2
+
+    @args('--image', help='Only list the entries of this image ID')
+    @args('--host', help='Only list the entries of this backend or pool')
+    def list(self, image=None, host=None):
+        """List the image-volume cache entries by backend."""
+        ctxt = context.get_admin_context()
+        entries = db.image_volume_cache_get_all(ctxt, image_id=image,
+                                                host=host)
+
+        hdr = "%-40s\t%-36s\t%-36s\t%-6s\t%-20s"
+        print(hdr % (_('Host'),
+                     _('Image ID'),
+                     _('Volume ID'),
+                     _('Size'),
+                     _('Last Used')))
+        res = "%-40s\t%-36s\t%-36s\t%-6d\t%-20s"
+        for entry in entries:
+            print(res % (entry['host'],
+                         entry['image_id'],
+                         entry['volume_id'],
+                         entry['size'],
+                         entry['last_used']))
+
+
 class ServiceCommands(object):
     """Methods for managing services."""
     def list(self):
@@ -471,6 +521,7 @@ CATEGORIES = {
     'config': ConfigCommands,
     'db': DbCommands,
     'host': HostCommands,
+    'image_cache': ImageCacheCommands,
     'logs': GetLogCommands,
     'service': ServiceCommands,
     'shell': ShellCommands,
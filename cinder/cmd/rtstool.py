@@ -15,9 +15,13 @@
 #    See the License for the specific language governing permissions and
 #    limitations under the License.
 
+import inspect
+import json
 import os
 import sys
 
+import six
+
 # We always use rtslib-fb, but until version 2.1.52 it didn't have its own
 # namespace, so we must be backwards compatible.
 try:
@@ -170,6 +174,71 @@ def delete(iqn):
             break
 
 
+def _convert_create_args(args):
+    """Convert the arguments of a bulk create like the command line ones."""
+    if 'iser_enabled' in args:
+        args['iser_enabled'] = str(args['iser_enabled'])
+    if isinstance(args.get('portals_ips'), six.string_types):
+        args['portals_ips'] = [ip for ip in args['portals_ips'].split(',')
+                               if ip]
+    if 'portals_port' in args:
+        try:
+            args['portals_port'] = int(args['portals_port'])
+        except (TypeError, ValueError):
+            raise RtstoolError(_('Invalid portals_port: %s') %
+                               args['portals_port'])
+
+
+def bulk(operations_file):
+    """Run the create and add-initiator operations listed in a file.
+
+    The file, or stdin if operations_file is None, contains a JSON list of
+    operations, each a dict with the name of the operation under 'op' and
+    the arguments of its function, as strings like on the command line.
+    The portals_ips of a create can also be a list and its portals_port a
+    number:
+
+        [{"op": "create", "backing_device": "/dev/vg/volume-1",
+          "name": "iqn.2010-10.org.openstack:volume-1", "userid": "user",
+          "password": "pass", "iser_enabled": "False"},
+         {"op": "add-initiator",
+          "target_iqn": "iqn.2010-10.org.openstack:volume-1",
+          "initiator_iqn": "iqn.1993-08.org.debian:01:1234",
+          "userid": "user", "password": "pass"}]
+
+    The operations are run in order and the first failure stops the run.
+    Both operations do nothing if the target or ACL already exists, so the
+    same file can be run again after a failure.
+    """
+    try:
+        if operations_file:
+            with open(operations_file) as f:
+                operations = json.load(f)
+        else:
+            operations = json.load(sys.stdin)
+    except (IOError, ValueError) as exc:
+        raise RtstoolError(_('Could not read operations: %s') % exc)
+    if not isinstance(operations, list):
+        raise RtstoolError(_('Operations must be a JSON list.'))
+
+    functions = {'create': create, 'add-initiator': add_initiator}
+    for index, operation in enumerate(operations):
+        args = dict(operation)
+        name = args.pop('op', None)
+        if name not in functions:
+            raise RtstoolError(_('Operation %(index)d: unknown operation '
+                                 '%(op)s.') % {'index': index, 'op': name})
+        try:
+            if name == 'create':
+                _convert_create_args(args)
+            inspect.getcallargs(functions[name], **args)
+        except (RtstoolError, TypeError) as exc:
+            raise RtstoolError(_('Operation %(index)d: invalid arguments: '
+                                 '%(exc)s') % {'index': index, 'exc': exc})
+        functions[name](**args)
+    print(_('Ran %d operations.') % len(operations))
+
+
 def verify_rtslib():
     for member in ['BlockStorageObject', 'FabricModule', 'LUN',
                    'MappedLUN', 'NetworkPortal', 'NodeACL', 'root',
@@ -193,6 +262,7 @@ def usage():
     print(sys.argv[0] + " delete [iqn]")
     print(sys.argv[0] + " verify")
     print(sys.argv[0] + " save [path_to_file]")
+    print(sys.argv[0] + " bulk [path_to_operations_file]")
     sys.exit(1)
 
 
@@ -338,6 +408,14 @@ def main(argv=None):
         restore_from_file(configuration_file)
         return 0
 
+    elif argv[1] == 'bulk':
+        if len(argv) > 3:
+            usage()
+
+        operations_file = argv[2] if len(argv) > 2 else None
+        bulk(operations_file)
+        return 0
+
     else:
         usage()
 
@@ -167,6 +167,16 @@ def volume_data_get_for_host(context, host, count_only=False):
                                          count_only)
 
 
+def volume_get_all_ids_by_host(context, host):
+    """Get (id, host, project_id) of all volumes on a host and its pools."""
+    return IMPL.volume_get_all_ids_by_host(context, host)
+
+
+def volume_data_get_for_host_by_pool(context, host, statuses=None):
+    """Get (host, volume_count, gigabytes) of each pool of a host."""
+    return IMPL.volume_data_get_for_host_by_pool(context, host, statuses)
+
+
 def volume_data_get_for_project(context, project_id):
     """Get (volume_count, gigabytes) for project."""
     return IMPL.volume_data_get_for_project(context, project_id)
@@ -1115,6 +1125,17 @@ def image_volume_cache_get_all_for_host(context, host):
     return IMPL.image_volume_cache_get_all_for_host(context, host)
 
 
+def image_volume_cache_get_all(context, image_id=None, host=None):
+    """Query for all image volume cache entries.
+
+    :param image_id: only return the entries of this image
+    :param host: only return the entries of this host, a host without a pool
+                 matches all of its pools
+    """
+    return IMPL.image_volume_cache_get_all(context, image_id=image_id,
+                                           host=host)
+
+
 ###################
 
 
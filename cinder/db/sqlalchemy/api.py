@@ -1253,6 +1253,33 @@ def volume_data_get_for_host(context, host, count_only=False):
         return (result[0] or 0, result[1] or 0)
 
 
+@require_admin_context
+def volume_get_all_ids_by_host(context, host):
+    host_attr = models.Volume.host
+    conditions = [host_attr == host, host_attr.op('LIKE')(host + '#%')]
+    return model_query(context,
+                       models.Volume.id,
+                       models.Volume.host,
+                       models.Volume.project_id,
+                       read_deleted="no").filter(or_(*conditions)).all()
+
+
+@require_admin_context
+def volume_data_get_for_host_by_pool(context, host, statuses=None):
+    host_attr = models.Volume.host
+    conditions = [host_attr == host, host_attr.op('LIKE')(host + '#%')]
+    query = model_query(context,
+                        models.Volume.host,
+                        func.count(models.Volume.id),
+                        func.sum(models.Volume.size),
+                        read_deleted="no").filter(or_(*conditions))
+    if statuses:
+        query = query.filter(models.Volume.status.in_(statuses))
+    # NOTE(vish): convert None to 0
+    return [(pool_host, count, int(size or 0))
+            for pool_host, count, size in query.group_by(host_attr).all()]
+
+
 @require_admin_context
 def _volume_data_get_for_project(context, project_id, volume_type_id=None,
                                  session=None):
@@ -4399,6 +4426,22 @@ def image_volume_cache_get_all_for_host(context, host):
             all()
 
 
+@require_admin_context
+def image_volume_cache_get_all(context, image_id=None, host=None):
+    session = get_session()
+    with session.begin():
+        query = session.query(models.ImageVolumeCacheEntry)
+        if image_id:
+            query = query.filter_by(image_id=image_id)
+        if host:
+            host_attr = models.ImageVolumeCacheEntry.host
+            query = query.filter(or_(host_attr == host,
+                                     host_attr.op('LIKE')(host + '#%')))
+        return query.order_by(models.ImageVolumeCacheEntry.host,
+                              desc(models.ImageVolumeCacheEntry.last_used)).\
+            all()
+
+
 ###############################
 
 
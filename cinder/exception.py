@@ -623,6 +623,11 @@ class BackupRBDOperationFailed(BackupDriverException):
     message = _("Backup RBD operation failed")
 
 
+class BackupRestoreCancel(CinderException):
+    message = _("Canceled restore of backup %(back_id)s to volume "
+                "%(vol_id)s.")
+
+
 class EncryptedBackupOperationFailed(BackupDriverException):
     message = _("Backup operation of an encrypted volume failed.")
 
@@ -12,6 +12,10 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import contextlib
+import time
+
+from eventlet import semaphore
 from pytz import timezone
 import six
 
@@ -19,7 +23,9 @@ from oslo_config import cfg
 from oslo_log import log as logging
 from oslo_utils import timeutils
 
-from cinder.i18n import _LW
+from cinder import coordination
+from cinder import exception
+from cinder.i18n import _LI, _LW
 from cinder import rpc
 
 CONF = cfg.CONF
@@ -27,15 +33,185 @@ CONF = cfg.CONF
 LOG = logging.getLogger(__name__)
 
 
+class EvictionPolicy(object):
+    """Orders the entries of an image-volume cache for eviction.
+
+    The entry with the lowest priority is evicted first.
+    """
+
+    def priority(self, index, entry):
+        """Return the priority of an entry that was just added or used."""
+        raise NotImplementedError()
+
+    def evicted(self, index, priority):
+        """Called when an entry with the given priority was evicted."""
+        pass
+
+
+class LRUPolicy(EvictionPolicy):
+    """Evict the least recently used entry first."""
+
+    def priority(self, index, entry):
+        return (entry['last_used'],)
+
+
+class LFUPolicy(EvictionPolicy):
+    """Evict the least frequently used entry first.
+
+    Ties are broken by evicting the least recently used entry.
+    """
+
+    def priority(self, index, entry):
+        return (index.hits[entry['volume_id']], entry['last_used'])
+
+
+class GDSFPolicy(EvictionPolicy):
+    """Greedy-Dual-Size-Frequency eviction.
+
+    The priority of an entry is set on every use to the inflation value of
+    the cache plus its hit count divided by its size, so that small and
+    popular entries are kept longest.  The inflation value is raised to the
+    priority of each evicted entry, which ages the entries that are no
+    longer used.
+    """
+
+    def priority(self, index, entry):
+        return (index.inflation +
+                float(index.hits[entry['volume_id']]) / max(entry['size'], 1),
+                entry['last_used'])
+
+    def evicted(self, index, priority):
+        index.inflation = max(index.inflation, priority[0])
+
+
+EVICTION_POLICIES = {
+    'lru': LRUPolicy,
+    'lfu': LFUPolicy,
+    'gdsf': GDSFPolicy,
+}
+
+
+class _HostIndex(object):
+    """In-memory view of the cache entries of a host.
+
+    Keeps the running size and count of the entries along with the hit
+    counts and eviction priorities, which the database does not track.
+    """
+
+    def __init__(self, policy):
+        self.policy = policy
+        self.entries = {}
+        self.hits = {}
+        self.priorities = {}
+        self.size = 0
+        self.inflation = 0.0
+        self.loaded_at = None
+
+    def load(self, entries):
+        known = self.entries
+        self.entries = {}
+        self.size = 0
+        for entry in entries:
+            volume_id = entry['volume_id']
+            old = known.get(volume_id)
+            if old is None:
+                self.add(entry)
+            elif old['last_used'] == entry['last_used']:
+                self._set(entry, self.priorities[volume_id])
+            else:
+                # Used by another process since the last load.
+                self.hit(entry)
+        for volume_id in set(self.hits) - set(self.entries):
+            del self.hits[volume_id]
+            del self.priorities[volume_id]
+        self.loaded_at = time.time()
+
+    def _set(self, entry, priority):
+        old = self.entries.get(entry['volume_id'])
+        if old is not None:
+            self.size -= old['size']
+        self.entries[entry['volume_id']] = entry
+        self.priorities[entry['volume_id']] = priority
+        self.size += entry['size']
+
+    def add(self, entry):
+        self.hits.setdefault(entry['volume_id'], 1)
+        self._set(entry, self.policy.priority(self, entry))
+
+    def hit(self, entry):
+        volume_id = entry['volume_id']
+        self.hits[volume_id] = self.hits.get(volume_id, 0) + 1
+        self._set(entry, self.policy.priority(self, entry))
+
+    def remove(self, volume_id):
+        entry = self.entries.pop(volume_id, None)
+        if entry is not None:
+            self.size -= entry['size']
+            del self.hits[volume_id]
+            return self.priorities.pop(volume_id)
+
+    def evict(self, volume_id):
+        priority = self.remove(volume_id)
+        if priority is not None:
+            self.policy.evicted(self, priority)
+
+    def victim(self):
+        """Return the entry to evict next."""
+        volume_id = min(self.entries, key=self.priorities.get)
+        return self.entries[volume_id]
+
+
+class _CoalescedMisses(object):
+    """Cache misses of an image on a host waiting for its cache entry."""
+
+    def __init__(self):
+        self.lock = semaphore.Semaphore()
+        self.users = 0
+        # Set when the entry is created while the lock is held.
+        self.created = False
+        # Set when a holder of the lock did not create the entry, the
+        # following misses then proceed without waiting for each other.
+        self.uncreatable = False
+
+
 class ImageVolumeCache(object):
     def __init__(self, db, volume_api, max_cache_size_gb=0,
-                 max_cache_size_count=0):
+                 max_cache_size_count=0, eviction_policy=None,
+                 index_refresh_interval=None, coalesce_timeout=None):
         self.db = db
         self.volume_api = volume_api
         self.max_cache_size_gb = int(max_cache_size_gb)
         self.max_cache_size_count = int(max_cache_size_count)
+        eviction_policy = eviction_policy or 'lru'
+        if eviction_policy not in EVICTION_POLICIES:
+            raise exception.InvalidConfigurationValue(
+                option='image_volume_cache_eviction_policy',
+                value=eviction_policy)
+        self.eviction_policy = EVICTION_POLICIES[eviction_policy]()
+        # Seconds the in-memory index of a host is trusted before being
+        # reloaded from the database, 0 reloads it on every use.
+        self.index_refresh_interval = int(index_refresh_interval or 0)
+        self._indexes = {}
+        # Seconds a cache miss waits for another one of the same image to
+        # create the cache entry, 0 disables coalescing.
+        self.coalesce_timeout = int(coalesce_timeout or 0)
+        # (host, image_id) -> _CoalescedMisses
+        self._coalesce_locks = {}
         self.notifier = rpc.get_notifier('volume', CONF.host)
 
+    def _get_index(self, context, host, refresh=False):
+        """Return the index of a host and whether it was just loaded."""
+        index = self._indexes.get(host)
+        if index is None:
+            index = self._indexes[host] = _HostIndex(self.eviction_policy)
+        if (refresh or index.loaded_at is None or
+                time.time() - index.loaded_at >=
+                self.index_refresh_interval):
+            index.load(self.db.image_volume_cache_get_all_for_host(context,
+                                                                   host))
+            return index, True
+        return index, False
+
     def get_by_image_volume(self, context, volume_id):
         return self.db.image_volume_cache_get_by_volume_id(context, volume_id)
 
@@ -43,14 +219,35 @@ class ImageVolumeCache(object):
         LOG.debug('Evicting image cache entry: %(entry)s.',
                   {'entry': self._entry_to_str(cache_entry)})
         self.db.image_volume_cache_delete(context, cache_entry['volume_id'])
+        self._forget(cache_entry)
         self._notify_cache_eviction(context, cache_entry['image_id'],
                                     cache_entry['host'])
 
     def get_entry(self, context, volume_ref, image_id, image_meta):
+        cache_entry = self.find_entry(context, volume_ref['host'], image_id,
+                                      image_meta)
+
+        if cache_entry:
+            index = self._indexes.get(cache_entry['host'])
+            if index is not None:
+                index.hit(cache_entry)
+            self._notify_cache_hit(context, cache_entry['image_id'],
+                                   cache_entry['host'])
+        else:
+            self._notify_cache_miss(context, image_id,
+                                    volume_ref['host'])
+        return cache_entry
+
+    def find_entry(self, context, host, image_id, image_meta):
+        """Return the up to date cache entry of an image on a host.
+
+        Unlike get_entry, this is not counted as a cache hit or miss.
+        Out-dated entries are evicted.
+        """
         cache_entry = self.db.image_volume_cache_get_and_update_last_used(
             context,
             image_id,
-            volume_ref['host']
+            host
         )
 
         if cache_entry:
@@ -62,16 +259,65 @@ class ImageVolumeCache(object):
                           '%(entry)s.',
                           {'entry': self._entry_to_str(cache_entry)})
                 self._delete_image_volume(context, cache_entry)
+                self._forget(cache_entry)
                 cache_entry = None
-
-        if cache_entry:
-            self._notify_cache_hit(context, cache_entry['image_id'],
-                                   cache_entry['host'])
-        else:
-            self._notify_cache_miss(context, image_id,
-                                    volume_ref['host'])
         return cache_entry
 
+    @contextlib.contextmanager
+    def coalesce(self, host, image_id):
+        """Serialize the cache misses of an image on a host.
+
+        Yields whether the lock is held.  The first miss downloads the image
+        and creates the cache entry while holding the lock, the following
+        ones look the entry up again once they get the lock and release it
+        to clone the entry.  If the holder of the lock could not create the
+        entry, the following misses get the lock only to release it right
+        away and do not wait for each other.  The lock is held across
+        processes and hosts when the coordination backend is running.  Past
+        coalesce_timeout seconds, waiters proceed without the lock.
+        """
+        if not self.coalesce_timeout:
+            yield False
+            return
+
+        key = (host, image_id)
+        misses = self._coalesce_locks.setdefault(key, _CoalescedMisses())
+        misses.users += 1
+        distributed = None
+        try:
+            deadline = time.time() + self.coalesce_timeout
+            acquired = misses.lock.acquire(timeout=self.coalesce_timeout)
+            if acquired and misses.uncreatable:
+                misses.lock.release()
+                yield False
+                return
+            if acquired and coordination.COORDINATOR.started:
+                distributed = coordination.Lock(
+                    'image-volume-cache-{host}-{image_id}',
+                    {'host': host, 'image_id': image_id})
+                if not distributed.acquire(max(deadline - time.time(), 0)):
+                    distributed = None
+                    misses.lock.release()
+                    acquired = False
+            if not acquired:
+                LOG.info(_LI('Timed out waiting for another request to '
+                             'create the image-volume cache entry of image '
+                             '%(image_id)s on host %(host)s.'),
+                         {'image_id': image_id, 'host': host})
+            try:
+                yield acquired
+            finally:
+                if distributed is not None:
+                    distributed.release()
+                if acquired:
+                    if not misses.created:
+                        misses.uncreatable = True
+                    misses.lock.release()
+        finally:
+            misses.users -= 1
+            if not misses.users:
+                del self._coalesce_locks[key]
+
     def create_cache_entry(self, context, volume_ref, image_id, image_meta):
         """Create a new cache entry for an image.
 
@@ -101,10 +347,22 @@ class ImageVolumeCache(object):
             volume_ref['size']
         )
 
+        index = self._indexes.get(cache_entry['host'])
+        if index is not None:
+            index.add(cache_entry)
+        misses = self._coalesce_locks.get((cache_entry['host'], image_id))
+        if misses is not None:
+            misses.created = True
+
         LOG.debug('New image-volume cache entry created: %(entry)s.',
                   {'entry': self._entry_to_str(cache_entry)})
         return cache_entry
 
+    def _forget(self, cache_entry):
+        index = self._indexes.get(cache_entry['host'])
+        if index is not None:
+            index.remove(cache_entry['volume_id'])
+
     def ensure_space(self, context, space_required, host):
         """Makes room for a cache entry.
 
@@ -122,18 +380,9 @@ class ImageVolumeCache(object):
                 space_required > self.max_cache_size_gb):
             return False
 
-        # Assume the entries are ordered by most recently used to least used.
-        entries = self.db.image_volume_cache_get_all_for_host(context, host)
-
-        current_count = len(entries)
-
-        current_size = 0
-        for entry in entries:
-            current_size += entry['size']
-
-        # Add values for the entry we intend to create.
-        current_size += space_required
-        current_count += 1
+        index, loaded = self._get_index(context, host)
+        current_size = index.size + space_required
+        current_count = len(index.entries) + 1
 
         LOG.debug('Image-volume cache for host %(host)s current_size (GB) = '
                   '%(size_gb)s (max = %(max_gb)s), current count = %(count)s '
@@ -144,13 +393,19 @@ class ImageVolumeCache(object):
                    'count': current_count,
                    'max_count': self.max_cache_size_count})
 
-        while ((current_size > self.max_cache_size_gb
-               or current_count > self.max_cache_size_count)
-               and len(entries)):
-            entry = entries.pop()
+        if self._over_limits(current_size, current_count) and not loaded:
+            # Only evict entries that still exist.
+            index, loaded = self._get_index(context, host, refresh=True)
+            current_size = index.size + space_required
+            current_count = len(index.entries) + 1
+
+        while (self._over_limits(current_size, current_count) and
+               index.entries):
+            entry = index.victim()
             LOG.debug('Reclaiming image-volume cache space; removing cache '
                       'entry %(entry)s.', {'entry': self._entry_to_str(entry)})
             self._delete_image_volume(context, entry)
+            index.evict(entry['volume_id'])
             current_size -= entry['size']
             current_count -= 1
             LOG.debug('Image-volume cache for host %(host)s new size (GB) = '
@@ -171,6 +426,11 @@ class ImageVolumeCache(object):
 
         return True
 
+    def _over_limits(self, size, count):
+        return ((self.max_cache_size_gb and size > self.max_cache_size_gb) or
+                (self.max_cache_size_count and
+                 count > self.max_cache_size_count))
+
     def _notify_cache_hit(self, context, image_id, host):
         self._notify_cache_action(context, image_id, host, 'hit')
 
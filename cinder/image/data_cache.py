@@ -0,0 +1,298 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Host-local cache of downloaded image data.
+
+Images are stored in image_data_cache_dir under their id and checksum, so an
+image is downloaded once per host no matter how many volumes are created from
+it.  The data of an image is never used for another image, even if their
+checksums match.  Concurrent requests for the same image, from this or another
+process of the host, wait for the download in progress.  The least recently
+used files are evicted to stay within image_data_cache_max_size_gb.
+"""
+
+
+import functools
+import hashlib
+import os
+import shutil
+
+import eventlet
+from oslo_config import cfg
+from oslo_log import log as logging
+from oslo_utils import fileutils
+from oslo_utils import units
+import requests
+from six.moves import range
+
+from cinder import exception
+from cinder.i18n import _, _LI, _LW
+from cinder.image import glance
+from cinder import utils
+
+
+LOG = logging.getLogger(__name__)
+
+image_data_cache_opts = [
+    cfg.StrOpt('image_data_cache_dir',
+               default='$state_path/image-data-cache',
+               help='Directory used to cache downloaded image data on the '
+                    'host.'),
+    cfg.IntOpt('image_data_cache_max_size_gb',
+               default=0,
+               min=0,
+               help='Maximum size of the image data cached on the host, in '
+                    'GB. 0 => do not cache image data.'),
+    cfg.IntOpt('image_download_ranges',
+               default=4,
+               min=1,
+               help='Number of byte ranges of an image downloaded in '
+                    'parallel when the image is cached, glance_api_version '
+                    'is 2 and the glance API server supports range '
+                    'requests.'),
+    cfg.IntOpt('image_download_range_size_mb',
+               default=64,
+               min=1,
+               help='Size in MB of each byte range of a parallel image '
+                    'download.'),
+]
+
+CONF = cfg.CONF
+CONF.register_opts(image_data_cache_opts)
+CONF.import_opt('glance_api_version', 'cinder.common.config')
+CONF.import_opt('glance_api_insecure', 'cinder.common.config')
+CONF.import_opt('glance_ca_certificates_file', 'cinder.common.config')
+CONF.import_opt('glance_request_timeout', 'cinder.common.config')
+
+_CHUNK_SIZE = units.Mi
+
+# Files of downloads in progress, which are not cache entries yet.
+_PARTIAL_SUFFIX = '.part'
+
+_cache = None
+
+
+def get_cache():
+    """Return the image data cache of the host, or None if it is disabled."""
+    global _cache
+    if not CONF.image_data_cache_max_size_gb:
+        return None
+    if (_cache is None or _cache.cache_dir != CONF.image_data_cache_dir or
+            _cache.max_size != CONF.image_data_cache_max_size_gb * units.Gi):
+        _cache = ImageDataCache(CONF.image_data_cache_dir,
+                                CONF.image_data_cache_max_size_gb * units.Gi)
+    return _cache
+
+
+def _file_checksum(path):
+    checksum = hashlib.md5()
+    with open(path, 'rb') as f:
+        for chunk in iter(functools.partial(f.read, _CHUNK_SIZE), b''):
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+class ImageDataCache(object):
+    """Cache of image data, addressed by image id and checksum."""
+
+    def __init__(self, cache_dir, max_size):
+        self.cache_dir = cache_dir
+        self.max_size = max_size
+
+    def _path(self, name):
+        return os.path.join(self.cache_dir, name)
+
+    def fetch(self, context, image_service, image_id, image_meta, path):
+        """Copy the data of an image to path, downloading it if needed.
+
+        :returns: False if the image cannot be cached, in which case the
+                  caller has to download it.
+        """
+        checksum = image_meta.get('checksum')
+        size = image_meta.get('size')
+        if not checksum or not size or size > self.max_size:
+            return False
+        # The checksum is not trusted to identify the data, an image
+        # uploaded with the same checksum as another one must not be given
+        # the data of the other image.
+        name = '%s-%s' % (image_id, checksum)
+
+        @utils.synchronized('image-data-%s' % name, external=True)
+        def _open_entry():
+            entry = self._path(name)
+            if os.path.exists(entry):
+                LOG.debug("Image %(image_id)s data found in the cache.",
+                          {'image_id': image_id})
+                # The modification time orders the entries for eviction.
+                os.utime(entry, None)
+            else:
+                self._download(context, image_service, image_id, image_meta,
+                               entry)
+            # Open the entry while it is locked, it can be evicted as soon as
+            # the lock is released.
+            return open(entry, 'rb')
+
+        with _open_entry() as cached:
+            with open(path, 'wb') as image_file:
+                shutil.copyfileobj(cached, image_file, _CHUNK_SIZE)
+        return True
+
+    def _download(self, context, image_service, image_id, image_meta, entry):
+        fileutils.ensure_tree(self.cache_dir)
+        partial = entry + _PARTIAL_SUFFIX
+        with fileutils.remove_path_on_error(partial):
+            if not self._download_ranges(context, image_service, image_id,
+                                         image_meta['size'], partial):
+                with open(partial, 'wb') as image_file:
+                    image_service.download(context, image_id, image_file)
+
+            checksum = _file_checksum(partial)
+            if checksum != image_meta['checksum']:
+                reason = (_("Checksum %(checksum)s of the downloaded data "
+                            "does not match the image checksum "
+                            "%(expected)s.") %
+                          {'checksum': checksum,
+                           'expected': image_meta['checksum']})
+                raise exception.ImageUnacceptable(image_id=image_id,
+                                                  reason=reason)
+
+            self._ensure_space(image_meta['size'])
+            os.rename(partial, entry)
+        LOG.info(_LI("Image %(image_id)s data added to the cache."),
+                 {'image_id': image_id})
+
+    def _ensure_space(self, size):
+        @utils.synchronized('image-data-cache-%s' % self.cache_dir,
+                            external=True)
+        def _evict():
+            entries = []
+            total = size
+            for name in os.listdir(self.cache_dir):
+                if name.endswith(_PARTIAL_SUFFIX):
+                    continue
+                try:
+                    st = os.stat(os.path.join(self.cache_dir, name))
+                except OSError:
+                    # Evicted by another process.
+                    continue
+                entries.append((st.st_mtime, st.st_size, name))
+                total += st.st_size
+
+            for _mtime, entry_size, name in sorted(entries):
+                if total <= self.max_size:
+                    break
+                LOG.debug("Evicting %s from the image data cache.", name)
+                fileutils.delete_if_exists(os.path.join(self.cache_dir,
+                                                        name))
+                total -= entry_size
+        _evict()
+
+    @staticmethod
+    def _range_url(image_id):
+        """Return the URL of the image data on a glance API server.
+
+        Byte ranges are only requested from the configured glance API
+        servers, the locations of an image are controlled by its owner and
+        must never be sent the token of the user.
+        """
+        if CONF.glance_api_version != 2:
+            return None
+        netloc, use_ssl = next(glance.get_api_servers())
+        scheme = 'https' if use_ssl else 'http'
+        return '%s://%s/v2/images/%s/file' % (scheme, netloc, image_id)
+
+    def _download_ranges(self, context, image_service, image_id, size,
+                         partial):
+        """Download an image in parallel byte ranges if possible.
+
+        The first range is requested alone, the others are only requested
+        if the server answered it with the expected partial content.
+
+        :returns: False if the glance API server does not support it.
+        """
+        url = self._range_url(image_id)
+        if not url:
+            return False
+        headers = {}
+        if context.auth_token:
+            headers['X-Auth-Token'] = context.auth_token
+
+        range_size = CONF.image_download_range_size_mb * units.Mi
+        ranges = [(start, min(start + range_size, size) - 1)
+                  for start in range(0, size, range_size)]
+        with open(partial, 'wb') as image_file:
+            image_file.truncate(size)
+        try:
+            if not self._download_range(url, headers, partial, ranges[0],
+                                        size=size):
+                return False
+        except requests.RequestException as e:
+            LOG.warning(_LW("Unable to reach %(url)s: %(error)s"),
+                        {'url': url, 'error': e})
+            return False
+
+        pool = eventlet.GreenPool(CONF.image_download_ranges)
+        threads = [pool.spawn(self._download_range, url, headers, partial,
+                              byte_range)
+                   for byte_range in ranges[1:]]
+        # Nothing may write to partial once the caller falls back to a
+        # full download.
+        pool.waitall()
+        try:
+            for thread in threads:
+                thread.wait()
+        except (requests.RequestException,
+                exception.GlanceConnectionFailed) as e:
+            LOG.warning(_LW("Unable to download image %(image_id)s in "
+                            "ranges from %(url)s: %(error)s"),
+                        {'image_id': image_id, 'url': url, 'error': e})
+            return False
+        LOG.debug("Downloaded image %(image_id)s from %(url)s in "
+                  "%(ranges)d ranges.",
+                  {'image_id': image_id, 'url': url, 'ranges': len(ranges)})
+        return True
+
+    @staticmethod
+    def _download_range(url, headers, partial, byte_range, size=None):
+        """Download a byte range of an image into partial.
+
+        :param size: when given, the answer is checked to be a range of an
+                     image of this size and False is returned instead of
+                     raising if the server does not support ranges.
+        """
+        start, end = byte_range
+        verify = CONF.glance_ca_certificates_file or not \
+            CONF.glance_api_insecure
+        # Redirects are not followed, they would get the token sent to
+        # another server.
+        response = requests.get(
+            url, headers=dict(headers, Range='bytes=%d-%d' % (start, end)),
+            stream=True, allow_redirects=False, verify=verify,
+            timeout=CONF.glance_request_timeout)
+        partial_content = response.status_code == 206
+        if size is not None:
+            partial_content = partial_content and (
+                response.headers.get('Content-Range') ==
+                'bytes %d-%d/%d' % (start, end, size))
+        if not partial_content:
+            response.close()
+            if size is not None:
+                return False
+            raise exception.GlanceConnectionFailed(
+                reason=_("Range request to %(url)s returned "
+                         "%(status)s.") % {'url': url,
+                                           'status': response.status_code})
+        with open(partial, 'r+b') as image_file:
+            image_file.seek(start)
+            for chunk in response.iter_content(_CHUNK_SIZE):
+                image_file.write(chunk)
+        return True
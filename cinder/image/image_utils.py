@@ -24,11 +24,15 @@ we should look at maybe pushing this up to Oslo
 """
 
 
+import collections
 import contextlib
+import hashlib
 import math
 import os
 import re
+import stat
 import tempfile
+import threading
 
 from oslo_concurrency import processutils
 from oslo_config import cfg
@@ -36,9 +40,11 @@ from oslo_log import log as logging
 from oslo_utils import fileutils
 from oslo_utils import timeutils
 from oslo_utils import units
+import six
 
 from cinder import exception
 from cinder.i18n import _, _LI, _LW
+from cinder.image import data_cache
 from cinder.openstack.common import imageutils
 from cinder import utils
 from cinder.volume import throttling
@@ -49,19 +55,87 @@ LOG = logging.getLogger(__name__)
 image_helper_opts = [cfg.StrOpt('image_conversion_dir',
                                 default='$state_path/conversion',
                                 help='Directory used for temporary storage '
-                                'during image conversion'), ]
+                                'during image conversion'),
+                     cfg.BoolOpt('image_stream_to_volume',
+                                 default=False,
+                                 help='Write raw images to raw volumes while '
+                                 'they are downloaded instead of storing '
+                                 'them in image_conversion_dir first. The '
+                                 'image checksum is verified during the '
+                                 'download.'), ]
 
 CONF = cfg.CONF
 CONF.register_opts(image_helper_opts)
 
 
+# Parsed qemu-img info output of regular files, keyed by the path and the
+# device, inode, modification time and size of the file.
+_QEMU_IMG_INFO_CACHE_SIZE = 32
+_qemu_img_info_cache = collections.OrderedDict()
+
+# qemu-img info calls made by the flow running in the current (green)thread.
+_qemu_img_info_flow = threading.local()
+
+
+def _qemu_img_info_key(path):
+    if not isinstance(path, six.string_types):
+        return None
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if not stat.S_ISREG(st.st_mode):
+        # Writing to a device does not change the attributes of its node.
+        return None
+    return (path, st.st_dev, st.st_ino, st.st_mtime, st.st_size)
+
+
+def _invalidate_qemu_img_info(path):
+    """Forget the cached qemu-img info of a path that is being written."""
+    for key in [key for key in _qemu_img_info_cache if key[0] == path]:
+        del _qemu_img_info_cache[key]
+
+
+@contextlib.contextmanager
+def _count_qemu_img_info(flow):
+    """Count the qemu-img info calls made by a flow and log them."""
+    previous = getattr(_qemu_img_info_flow, 'counts', None)
+    counts = _qemu_img_info_flow.counts = {'calls': 0, 'cached': 0}
+    try:
+        yield counts
+    finally:
+        _qemu_img_info_flow.counts = previous
+        LOG.debug("%(flow)s made %(calls)d qemu-img info calls, "
+                  "%(cached)d of them answered from the cache.",
+                  dict(counts, flow=flow))
+
+
 def qemu_img_info(path, run_as_root=True):
-    """Return an object containing the parsed output from qemu-img info."""
-    cmd = ('env', 'LC_ALL=C', 'qemu-img', 'info', path)
-    if os.name == 'nt':
-        cmd = cmd[2:]
-    out, _err = utils.execute(*cmd, run_as_root=run_as_root)
-    return imageutils.QemuImgInfo(out)
+    """Return an object containing the parsed output from qemu-img info.
+
+    The result for a regular file is cached until the file changes.
+    """
+    key = _qemu_img_info_key(path)
+    info = _qemu_img_info_cache.pop(key, None) if key else None
+
+    counts = getattr(_qemu_img_info_flow, 'counts', None)
+    if counts is not None:
+        counts['calls'] += 1
+        if info is not None:
+            counts['cached'] += 1
+
+    if info is None:
+        cmd = ('env', 'LC_ALL=C', 'qemu-img', 'info', path)
+        if os.name == 'nt':
+            cmd = cmd[2:]
+        out, _err = utils.execute(*cmd, run_as_root=run_as_root)
+        info = imageutils.QemuImgInfo(out)
+
+    if key:
+        _qemu_img_info_cache[key] = info
+        if len(_qemu_img_info_cache) > _QEMU_IMG_INFO_CACHE_SIZE:
+            _qemu_img_info_cache.popitem(last=False)
+    return info
 
 
 def get_qemu_img_version():
@@ -119,6 +193,7 @@ def _convert_image(prefix, source, dest, out_format, run_as_root=True):
                         '-O', out_format, source, dest)
 
     start_time = timeutils.utcnow()
+    _invalidate_qemu_img_info(dest)
     utils.execute(*cmd, run_as_root=run_as_root)
     duration = timeutils.delta_seconds(start_time, timeutils.utcnow())
 
@@ -161,6 +236,7 @@ def convert_image(source, dest, out_format, run_as_root=True, throttle=None):
 def resize_image(source, size, run_as_root=False):
     """Changes the virtual size of the image."""
     cmd = ('qemu-img', 'resize', source, '%sG' % size)
+    _invalidate_qemu_img_info(source)
     utils.execute(*cmd, run_as_root=run_as_root)
 
 
@@ -170,20 +246,25 @@ def fetch(context, image_service, image_id, path, _user_id, _project_id):
     #             auth checking in glance, so we assume that access was
     #             checked before we got here.
     start_time = timeutils.utcnow()
+    _invalidate_qemu_img_info(path)
+    cache = data_cache.get_cache()
     with fileutils.remove_path_on_error(path):
-        with open(path, "wb") as image_file:
-            image_service.download(context, image_id, image_file)
+        if not (cache and cache.fetch(context, image_service, image_id,
+                                      image_service.show(context, image_id),
+                                      path)):
+            with open(path, "wb") as image_file:
+                image_service.download(context, image_id, image_file)
     duration = timeutils.delta_seconds(start_time, timeutils.utcnow())
 
     # NOTE(jdg): use a default of 1, mostly for unit test, but in
     # some incredible event this is 0 (cirros image?) don't barf
     if duration < 1:
         duration = 1
-    fsz_mb = os.stat(image_file.name).st_size / units.Mi
+    fsz_mb = os.stat(path).st_size / units.Mi
     mbps = (fsz_mb / duration)
     msg = ("Image fetch details: dest %(dest)s, size %(sz).2f MB, "
            "duration %(duration).2f sec")
-    LOG.debug(msg, {"dest": image_file.name,
+    LOG.debug(msg, {"dest": path,
                     "sz": fsz_mb,
                     "duration": duration})
     msg = _LI("Image download %(sz).2f MB at %(mbps).2f MB/s")
@@ -193,6 +274,13 @@ def fetch(context, image_service, image_id, path, _user_id, _project_id):
 def fetch_verify_image(context, image_service, image_id, dest,
                        user_id=None, project_id=None, size=None,
                        run_as_root=True):
+    with _count_qemu_img_info('Fetching image %s' % image_id):
+        _fetch_verify_image(context, image_service, image_id, dest,
+                            size=size, run_as_root=run_as_root)
+
+
+def _fetch_verify_image(context, image_service, image_id, dest, size=None,
+                        run_as_root=True):
     fetch(context, image_service, image_id, dest,
           None, None)
 
@@ -237,13 +325,123 @@ def fetch_to_raw(context, image_service,
                            run_as_root=run_as_root)
 
 
+def _can_stream_to_volume(context, image_service, image_id, image_meta,
+                          volume_format):
+    """Check if an image can be written to a volume while downloading it.
+
+    Only raw images can be streamed, qemu-img needs to seek in the other
+    formats.
+    """
+    if volume_format != 'raw' or not image_meta:
+        return False
+    if (image_meta.get('disk_format') != 'raw' or
+            image_meta.get('container_format') not in (None, 'bare')):
+        return False
+    # Images cached on the host are copied from the cache instead.
+    if not CONF.image_stream_to_volume or data_cache.get_cache():
+        return False
+    # An image that is already available locally is copied from there.
+    tmp_images = TemporaryImages.for_image_service(image_service)
+    return tmp_images.get(context, image_id) is None
+
+
+def _stream_to_volume(context, image_service, image_id, image_meta, dest,
+                      size=None, run_as_root=True):
+    """Write a raw image to a volume while it is downloaded.
+
+    :returns: False if the downloaded data is not a raw image after all, in
+              which case it has to go through the conversion path.
+    """
+    image_size = image_meta.get('size')
+    if size is not None and image_size and image_size > size * units.Gi:
+        params = {'image_size': math.ceil(image_size / float(units.Gi)),
+                  'volume_size': size}
+        reason = _("Size is %(image_size)dGB and doesn't fit in a "
+                   "volume of size %(volume_size)dGB.") % params
+        raise exception.ImageUnacceptable(image_id=image_id, reason=reason)
+
+    checksum = hashlib.md5()
+    written = 0
+    start_time = timeutils.utcnow()
+    image_chunks = image_service.download(context, image_id)
+    _invalidate_qemu_img_info(dest)
+    with utils.temporary_chown(dest):
+        with open(dest, 'wb') as volume_file:
+            for chunk in image_chunks:
+                checksum.update(chunk)
+                volume_file.write(chunk)
+                written += len(chunk)
+            volume_file.flush()
+            os.fsync(volume_file.fileno())
+    duration = max(1, timeutils.delta_seconds(start_time, timeutils.utcnow()))
+
+    if image_size and written != image_size:
+        reason = (_("Downloaded %(written)d bytes, expected %(size)d.") %
+                  {'written': written, 'size': image_size})
+        raise exception.ImageUnacceptable(image_id=image_id, reason=reason)
+    expected_checksum = image_meta.get('checksum')
+    if expected_checksum and checksum.hexdigest() != expected_checksum:
+        reason = (_("Checksum %(checksum)s of the downloaded data does not "
+                    "match the image checksum %(expected)s.") %
+                  {'checksum': checksum.hexdigest(),
+                   'expected': expected_checksum})
+        raise exception.ImageUnacceptable(image_id=image_id, reason=reason)
+
+    fsz_mb = written / float(units.Mi)
+    LOG.debug("Image streaming details: dest %(dest)s, size %(sz).2f MB, "
+              "duration %(duration).2f sec",
+              {"dest": dest, "sz": fsz_mb, "duration": duration})
+    LOG.info(_LI("Image download %(sz).2f MB at %(mbps).2f MB/s"),
+             {"sz": fsz_mb, "mbps": fsz_mb / duration})
+
+    # Glance does not check that the data of a raw image is really raw, make
+    # sure we did not just write an image with a header, possibly pointing
+    # to a backing file, to the volume.
+    try:
+        data = qemu_img_info(dest, run_as_root=run_as_root)
+    except processutils.ProcessExecutionError:
+        LOG.warning(_LW("Unable to check the format of image %(image_id)s "
+                        "written to %(dest)s, copying it again instead."),
+                    {'image_id': image_id, 'dest': dest})
+        return False
+    if data.file_format != 'raw':
+        LOG.warning(_LW("Image %(image_id)s is declared raw but contains "
+                        "%(fmt)s data, converting it instead."),
+                    {'image_id': image_id, 'fmt': data.file_format})
+        return False
+    if data.backing_file:
+        LOG.warning(_LW("Image %(image_id)s is declared raw but has the "
+                        "backing file %(backing_file)s, converting it "
+                        "instead."),
+                    {'image_id': image_id, 'backing_file': data.backing_file})
+        return False
+    return True
+
+
 def fetch_to_volume_format(context, image_service,
                            image_id, dest, volume_format, blocksize,
                            user_id=None, project_id=None, size=None,
                            run_as_root=True):
+    with _count_qemu_img_info('Copying image %s to volume' % image_id):
+        _fetch_to_volume_format(context, image_service, image_id, dest,
+                                volume_format, blocksize, user_id=user_id,
+                                project_id=project_id, size=size,
+                                run_as_root=run_as_root)
+
+
+def _fetch_to_volume_format(context, image_service,
+                            image_id, dest, volume_format, blocksize,
+                            user_id=None, project_id=None, size=None,
+                            run_as_root=True):
     qemu_img = True
     image_meta = image_service.show(context, image_id)
 
+    if (_can_stream_to_volume(context, image_service, image_id, image_meta,
+                              volume_format) and
+            _stream_to_volume(context, image_service, image_id, image_meta,
+                              dest, size=size, run_as_root=run_as_root)):
+        return
+
     # NOTE(avishay): I'm not crazy about creating temp files which may be
     # large and cause disk full errors which would confuse users.
     # Unfortunately it seems that you can't pipe to 'qemu-img convert' because
@@ -293,6 +491,7 @@ def fetch_to_volume_format(context, image_service,
                       'size: %(size)s', {'tmp': tmp, 'dest': dest,
                                          'size': image_meta['size']})
             image_size_m = math.ceil(image_meta['size'] / units.Mi)
+            _invalidate_qemu_img_info(dest)
             volume_utils.copy_volume(tmp, dest, image_size_m, blocksize)
             return
 
@@ -52,6 +52,8 @@ This module provides Manager, a base class for managers.
 """
 
 
+import copy
+
 from oslo_config import cfg
 from oslo_log import log as logging
 import oslo_messaging as messaging
@@ -67,9 +69,40 @@ from eventlet import greenpool
 
 
 CONF = cfg.CONF
+CONF.import_opt('capabilities_full_report_interval', 'cinder.service')
 LOG = logging.getLogger(__name__)
 
 
+def _get_capabilities_delta(old, new):
+    """Returns what changed between two capability reports.
+
+    Pools reported as a list are compared one by one, by pool name. Returns
+    None if the reports can't be compared that way.
+    """
+    old_pools = old.get('pools')
+    new_pools = new.get('pools')
+    by_pool = isinstance(new_pools, list)
+    if isinstance(old_pools, list) != by_pool:
+        return None
+
+    delta = {
+        'changed': dict((key, value) for key, value in new.items()
+                        if not (by_pool and key == 'pools') and
+                        (key not in old or old[key] != value)),
+        'removed': [key for key in old if key not in new],
+        'pools': {},
+        'removed_pools': [],
+    }
+    if by_pool:
+        old_pools = dict((pool['pool_name'], pool) for pool in old_pools)
+        new_pools = dict((pool['pool_name'], pool) for pool in new_pools)
+        delta['pools'] = dict((name, pool) for name, pool in new_pools.items()
+                              if old_pools.get(name) != pool)
+        delta['removed_pools'] = [name for name in old_pools
+                                  if name not in new_pools]
+    return delta
+
+
 class PeriodicTasks(periodic_task.PeriodicTasks):
     def __init__(self):
         super(PeriodicTasks, self).__init__(CONF)
@@ -152,6 +185,11 @@ class SchedulerDependentManager(Manager):
 
     def __init__(self, host=None, db_driver=None, service_name='undefined'):
         self.last_capabilities = None
+        # Last capabilities sent to the schedulers, and how many reports
+        # went out since the last full one.
+        self._sent_capabilities = None
+        self._capabilities_generation = 0
+        self._partial_reports = 0
         self.service_name = service_name
         self.scheduler_rpcapi = scheduler_rpcapi.SchedulerAPI()
         self._tp = greenpool.GreenPool()
@@ -162,15 +200,44 @@ class SchedulerDependentManager(Manager):
         self.last_capabilities = capabilities
 
     @periodic_task.periodic_task
-    def _publish_service_capabilities(self, context):
-        """Pass data back to the scheduler at a periodic interval."""
-        if self.last_capabilities:
-            LOG.debug('Notifying Schedulers of capabilities ...')
-            self.scheduler_rpcapi.update_service_capabilities(
-                context,
-                self.service_name,
-                self.host,
-                self.last_capabilities)
+    def _publish_service_capabilities(self, context, full=False):
+        """Pass data back to the scheduler at a periodic interval.
+
+        The full capabilities are sent every
+        capabilities_full_report_interval reports, or when full is True.
+        In between, only what changed since the previous report is sent,
+        possibly nothing but the generation.
+        """
+        if not self.last_capabilities:
+            return
+
+        capabilities = self.last_capabilities
+        delta = None
+        if (not full and self._sent_capabilities is not None and
+                self._partial_reports + 1 <
+                CONF.capabilities_full_report_interval):
+            delta = _get_capabilities_delta(self._sent_capabilities,
+                                            capabilities)
+
+        if delta is None:
+            self._partial_reports = 0
+        else:
+            # An empty delta is still sent as a heartbeat, the schedulers
+            # then re-apply the capabilities they have, dropping their
+            # estimates of the space consumed since the previous report.
+            self._partial_reports += 1
+
+        LOG.debug('Notifying Schedulers of capabilities ...')
+        self._capabilities_generation += 1
+        self.scheduler_rpcapi.update_service_capabilities(
+            context,
+            self.service_name,
+            self.host,
+            capabilities,
+            generation=self._capabilities_generation,
+            delta=delta)
+        # Drivers may update their stats dict in place.
+        self._sent_capabilities = copy.deepcopy(capabilities)
 
     def _add_to_threadpool(self, func, *args, **kwargs):
         self._tp.spawn_n(func, *args, **kwargs)
@@ -39,6 +39,7 @@ from cinder import coordination as cinder_coordination
 from cinder.db import api as cinder_db_api
 from cinder.db import base as cinder_db_base
 from cinder import exception as cinder_exception
+from cinder.image import data_cache as cinder_image_datacache
 from cinder.image import glance as cinder_image_glance
 from cinder.image import image_utils as cinder_image_imageutils
 import cinder.keymgr
@@ -274,6 +275,7 @@ def list_opts():
                 cinder_volume_drivers_windows_windows.windows_opts,
                 cinder_volume_drivers_san_hp_hpmsacommon.common_opts,
                 cinder_volume_drivers_san_hp_hpmsacommon.iscsi_opts,
+                cinder_image_datacache.image_data_cache_opts,
                 cinder_image_glance.glance_opts,
                 cinder_image_glance.glance_core_properties_opts,
                 cinder_volume_drivers_hpe_hpelefthandiscsi.hpelefthand_opts,
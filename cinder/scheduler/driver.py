@@ -87,11 +87,14 @@ class Scheduler(object):
 
         return self.host_manager.has_all_capabilities()
 
-    def update_service_capabilities(self, service_name, host, capabilities):
+    def update_service_capabilities(self, service_name, host, capabilities,
+                                    generation=None, delta=False):
         """Process a capability update from a service node."""
         self.host_manager.update_service_capabilities(service_name,
                                                       host,
-                                                      capabilities)
+                                                      capabilities,
+                                                      generation=generation,
+                                                      delta=delta)
 
     def host_passes_filters(self, context, volume_id, host, filter_properties):
         """Check if the specified host passes the filters."""
@@ -110,6 +113,11 @@ class Scheduler(object):
         """Must override schedule method for scheduler to work."""
         raise NotImplementedError(_("Must implement schedule_create_volume"))
 
+    def schedule_create_volumes(self, context, request_spec_list,
+                                filter_properties_list=None):
+        """Must override schedule method for scheduler to work."""
+        raise NotImplementedError(_("Must implement schedule_create_volumes"))
+
     def schedule_create_consistencygroup(self, context, group,
                                          request_spec_list,
                                          filter_properties_list):
@@ -13,6 +13,7 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import collections
 import operator
 import re
 
@@ -224,6 +225,11 @@ class EvalBoolOrOp(object):
 _parser = None
 _vars = {}
 
+# Parsed expressions, most recently used last. The Eval* trees only read
+# _vars when they are evaluated, so they can be reused across calls.
+_CACHE_SIZE = 256
+_cache = collections.OrderedDict()
+
 
 def _def_parser():
     # Enabling packrat parsing greatly speeds up the parsing.
@@ -281,17 +287,29 @@ def evaluate(expression, **kwargs):
     Supports both integer and floating point values, and automatic
     promotion where necessary.
     """
-    global _parser
-    if _parser is None:
-        _parser = _def_parser()
-
     global _vars
     _vars = kwargs
 
+    return _parse(expression).eval()
+
+
+def _parse(expression):
+    """Returns the parsed form of an expression, using an LRU cache."""
     try:
-        result = _parser.parseString(expression, parseAll=True)[0]
-    except pyparsing.ParseException as e:
-        raise exception.EvaluatorParseException(
-            _("ParseException: %s") % six.text_type(e))
+        result = _cache.pop(expression)
+    except KeyError:
+        global _parser
+        if _parser is None:
+            _parser = _def_parser()
+
+        try:
+            result = _parser.parseString(expression, parseAll=True)[0]
+        except pyparsing.ParseException as e:
+            raise exception.EvaluatorParseException(
+                _("ParseException: %s") % six.text_type(e))
+
+        if len(_cache) >= _CACHE_SIZE:
+            _cache.popitem(last=False)
 
-    return result.eval()
+    _cache[expression] = result
+    return result
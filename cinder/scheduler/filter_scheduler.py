@@ -20,8 +20,12 @@ You can customize this scheduler by specifying your own volume Filters and
 Weighing Functions.
 """
 
+import collections
+import copy
+
 from oslo_config import cfg
 from oslo_log import log as logging
+from oslo_serialization import jsonutils
 
 from cinder import exception
 from cinder.i18n import _, _LE, _LW
@@ -87,12 +91,120 @@ class FilterScheduler(driver.Scheduler):
         if not weighed_host:
             raise exception.NoValidHost(reason=_("No weighed hosts available"))
 
-        host = weighed_host.obj.host
+        self._create_volume_on_host(context, request_spec, filter_properties,
+                                    weighed_host.obj)
+
+    def schedule_create_volumes(self, context, request_spec_list,
+                                filter_properties_list=None):
+        """Place a batch of volumes.
+
+        Volumes whose request specs and filter properties match on what
+        affects placement are filtered and weighed once. Each
+        placement is then consumed from the chosen pool, which is checked
+        against the filters again, and the candidates are reweighed before
+        the next volume of the group is placed.
+
+        :returns: a list with, for each request spec, the host the volume
+                  was sent to or the exception that prevented it.
+        """
+        if filter_properties_list is None:
+            filter_properties_list = [None] * len(request_spec_list)
+        results = [None] * len(request_spec_list)
+
+        groups = collections.OrderedDict()
+        for index, request_spec in enumerate(request_spec_list):
+            filter_properties = filter_properties_list[index] or {}
+            key = self._placement_key(request_spec, filter_properties)
+            groups.setdefault(key, []).append(index)
+
+        for indexes in groups.values():
+            first_spec = request_spec_list[indexes[0]]
+            group_properties = copy.deepcopy(
+                filter_properties_list[indexes[0]] or {})
+            try:
+                weighed_hosts = self._get_weighted_candidates(
+                    context, first_spec, group_properties)
+                weighed_hosts = self._filter_cg_backend(weighed_hosts,
+                                                        first_spec)
+            except Exception as e:
+                for index in indexes:
+                    results[index] = e
+                continue
+
+            for index in indexes:
+                request_spec = request_spec_list[index]
+                filter_properties = filter_properties_list[index] or {}
+                if not weighed_hosts:
+                    results[index] = exception.NoValidHost(
+                        reason=_("No weighed hosts available"))
+                    continue
+
+                host_state = self._choose_top_host(weighed_hosts,
+                                                   request_spec).obj
+                try:
+                    self._populate_retry(filter_properties,
+                                         request_spec['volume_properties'])
+                    self._create_volume_on_host(context, request_spec,
+                                                filter_properties,
+                                                host_state)
+                    results[index] = host_state.host
+                except Exception as e:
+                    LOG.exception(_LE("Failed to create volume %(id)s on "
+                                      "%(host)s."),
+                                  {'id': request_spec['volume_id'],
+                                   'host': host_state.host})
+                    results[index] = e
+
+                weighed_hosts = self._reweigh_after_consume(
+                    weighed_hosts, host_state, group_properties)
+
+        return results
+
+    @staticmethod
+    def _placement_key(request_spec, filter_properties):
+        """Return what the placement of a volume depends on, as a string.
+
+        The per-volume fields of the request spec, like the volume object
+        and its id, name and timestamps, are left out.
+        """
+        volume_properties = request_spec.get('volume_properties') or {}
+        return jsonutils.dumps(
+            {'volume_type': request_spec.get('volume_type'),
+             'CG_backend': request_spec.get('CG_backend'),
+             'consistencygroup_id': request_spec.get('consistencygroup_id'),
+             'volume_properties': dict(
+                 (k, volume_properties.get(k))
+                 for k in ('size', 'availability_zone', 'multiattach',
+                           'user_id', 'project_id', 'metadata',
+                           'qos_specs')),
+             'scheduler_hints': filter_properties.get('scheduler_hints'),
+             'retry': filter_properties.get('retry')},
+            sort_keys=True)
+
+    def _reweigh_after_consume(self, weighed_hosts, host_state,
+                               filter_properties):
+        """Update the weighed hosts after a volume was placed on host_state.
+
+        Only host_state has changed, so it is the only host that has to be
+        filtered again. The weighers normalize across all hosts, so the
+        remaining ones are weighed again.
+        """
+        hosts = [weighed_host.obj for weighed_host in weighed_hosts]
+        if not self.host_manager.get_filtered_hosts([host_state],
+                                                    filter_properties):
+            hosts.remove(host_state)
+        if not hosts:
+            return []
+        return self.host_manager.get_weighed_hosts(hosts, filter_properties)
+
+    def _create_volume_on_host(self, context, request_spec,
+                               filter_properties, host_state):
+        host = host_state.host
         volume_id = request_spec['volume_id']
 
         updated_volume = driver.volume_update_db(context, volume_id, host)
         self._post_select_populate_filter_properties(filter_properties,
-                                                     weighed_host.obj)
+                                                     host_state)
 
         # context is not serializable
         filter_properties.pop('context', None)
@@ -410,9 +522,7 @@ class FilterScheduler(driver.Scheduler):
 
         return weighed_hosts
 
-    def _schedule(self, context, request_spec, filter_properties=None):
-        weighed_hosts = self._get_weighted_candidates(context, request_spec,
-                                                      filter_properties)
+    def _filter_cg_backend(self, weighed_hosts, request_spec):
         # When we get the weighed_hosts, we clear those hosts whose backend
         # is not same as consistencygroup's backend.
         CG_backend = request_spec.get('CG_backend')
@@ -423,6 +533,12 @@ class FilterScheduler(driver.Scheduler):
                 backend = utils.extract_host(host.obj.host)
                 if backend != CG_backend:
                     weighed_hosts.remove(host)
+        return weighed_hosts
+
+    def _schedule(self, context, request_spec, filter_properties=None):
+        weighed_hosts = self._get_weighted_candidates(context, request_spec,
+                                                      filter_properties)
+        weighed_hosts = self._filter_cg_backend(weighed_hosts, request_spec)
         if not weighed_hosts:
             LOG.warning(_LW('No weighed hosts found for volume '
                             'with properties: %s'),
@@ -445,7 +561,8 @@ class FilterScheduler(driver.Scheduler):
         host_state = top_host.obj
         LOG.debug("Choosing %s", host_state.host)
         volume_properties = request_spec['volume_properties']
-        host_state.consume_from_volume(volume_properties)
+        host_state.consume_from_volume(volume_properties,
+                                       request_spec.get('volume_id'))
         return top_host
 
     def _choose_top_host_group(self, weighed_hosts, request_spec_list):
@@ -27,6 +27,19 @@ class AffinityFilter(filters.BaseHostFilter):
     def __init__(self):
         self.volume_api = volume.API()
 
+    def _get_host_volumes(self, context, host_state, affinity_uuids):
+        """Return the volumes in affinity_uuids that live on host_state."""
+        if host_state.volumes is not None:
+            # Like volume_api.get_all(), only consider the volumes of the
+            # requesting project.
+            return [uuid for uuid in affinity_uuids
+                    if uuid in host_state.volumes and
+                    host_state.volumes[uuid] == context.project_id]
+        return self.volume_api.get_all(
+            context, filters={'host': host_state.host,
+                              'id': affinity_uuids,
+                              'deleted': False})
+
 
 class DifferentBackendFilter(AffinityFilter):
     """Schedule volume on a different back-end from a set of volumes."""
@@ -56,10 +69,8 @@ class DifferentBackendFilter(AffinityFilter):
             return False
 
         if affinity_uuids:
-            return not self.volume_api.get_all(
-                context, filters={'host': host_state.host,
-                                  'id': affinity_uuids,
-                                  'deleted': False})
+            return not self._get_host_volumes(context, host_state,
+                                              affinity_uuids)
 
         # With no different_host key
         return True
@@ -93,10 +104,8 @@ class SameBackendFilter(AffinityFilter):
             return False
 
         if affinity_uuids:
-            return self.volume_api.get_all(
-                context, filters={'host': host_state.host,
-                                  'id': affinity_uuids,
-                                  'deleted': False})
+            return bool(self._get_host_volumes(context, host_state,
+                                               affinity_uuids))
 
         # With no same_host key
         return True
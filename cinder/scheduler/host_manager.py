@@ -24,10 +24,11 @@ from oslo_log import log as logging
 from oslo_utils import timeutils
 
 from cinder import context as cinder_context
+from cinder import db
 from cinder import exception
 from cinder import objects
 from cinder import utils
-from cinder.i18n import _LI, _LW
+from cinder.i18n import _LE, _LI, _LW
 from cinder.scheduler import filters
 from cinder.scheduler import weights
 from cinder.volume import utils as vol_utils
@@ -46,7 +47,25 @@ host_manager_opts = [
                 default=[
                     'CapacityWeigher'
                 ],
-                help='Which weigher class names to use for weighing hosts.')
+                help='Which weigher class names to use for weighing hosts.'),
+    cfg.BoolOpt('scheduler_use_volume_index',
+                default=False,
+                help='Keep an in-memory index of the volumes on each pool, '
+                     'rebuilt from the database when a volume service '
+                     'reports its capabilities and updated as volumes are '
+                     'scheduled. Weighers and filters that count or look up '
+                     'volumes per back end use it instead of querying the '
+                     'database for every candidate pool.'),
+    cfg.IntOpt('scheduler_service_cache_ttl',
+               default=0,
+               min=0,
+               help='Number of seconds the scheduler reuses the list of '
+                    'volume services and their last heartbeats instead of '
+                    'querying the database on every request. A capability '
+                    'report from a service that is missing from the list, '
+                    'or that looks down in it, refreshes the list. Keep '
+                    'this well below service_down_time. Set to 0 to query '
+                    'on every request.'),
 ]
 
 CONF = cfg.CONF
@@ -115,6 +134,10 @@ class HostState(object):
         # PoolState for all pools
         self.pools = {}
 
+        # Volumes on this pool as {<volume id>: <project id>}, or None
+        # when the scheduler is not indexing volumes for this back end.
+        self.volumes = None
+
         self.updated = None
 
     def update_capabilities(self, capabilities=None, service=None):
@@ -127,6 +150,12 @@ class HostState(object):
             service = {}
         self.service = ReadOnlyDict(service)
 
+    def update_service(self, service):
+        """Update the service record of a host and of its pools."""
+        self.service = ReadOnlyDict(service)
+        for pool in self.pools.values():
+            pool.service = self.service
+
     def update_from_volume_capability(self, capability, service=None):
         """Update information about a host from its volume_node info.
 
@@ -264,7 +293,7 @@ class HostState(object):
         self.storage_protocol = capability.get('storage_protocol', None)
         self.updated = capability['timestamp']
 
-    def consume_from_volume(self, volume):
+    def consume_from_volume(self, volume, volume_id=None):
         """Incrementally update host state from a volume."""
         volume_gb = volume['size']
         self.allocated_capacity_gb += volume_gb
@@ -277,6 +306,8 @@ class HostState(object):
             pass
         else:
             self.free_capacity_gb -= volume_gb
+        if self.volumes is not None and volume_id:
+            self.volumes[volume_id] = volume.get('project_id')
         self.updated = timeutils.utcnow()
 
     def __repr__(self):
@@ -347,6 +378,19 @@ class HostManager(object):
         self.weight_classes = self.weight_handler.get_all_classes()
 
         self._no_capabilities_hosts = set()  # Hosts having no capabilities
+        # { <host>: (<generation>, <capabilities as reported>) }
+        self._capability_reports = {}
+        # { <host>: <service_states entry last applied to its HostState> }
+        self._applied_capabilities = {}
+        # Enabled volume services, when they were fetched, and how often
+        # the cache was used.
+        self._services = None
+        self._services_updated_at = None
+        self.service_cache_hits = 0
+        self.service_cache_misses = 0
+        # { <volume host>: {<volume id>: <project id>} }
+        self._volume_index = {}
+        self._indexed_hosts = set()  # Hosts whose volumes are indexed
         self._update_host_state_map(cinder_context.get_admin_context())
 
     def _choose_host_filters(self, filter_cls_names):
@@ -420,16 +464,35 @@ class HostManager(object):
                                                        hosts,
                                                        weight_properties)
 
-    def update_service_capabilities(self, service_name, host, capabilities):
-        """Update the per-service capabilities based on this notification."""
+    def update_service_capabilities(self, service_name, host, capabilities,
+                                    generation=None, delta=False):
+        """Update the per-service capabilities based on this notification.
+
+        A delta notification only carries what changed since the report
+        with the previous generation, and is applied on top of it. Deltas
+        that don't follow the last report we have are dropped until the
+        service sends full capabilities again.
+        """
         if service_name != 'volume':
             LOG.debug('Ignoring %(service_name)s service update '
                       'from %(host)s',
                       {'service_name': service_name, 'host': host})
             return
 
+        if delta:
+            capabilities = self._apply_capabilities_delta(host, capabilities,
+                                                          generation)
+            if capabilities is None:
+                return
+        elif generation is not None:
+            self._capability_reports[host] = (generation, capabilities)
+        else:
+            self._capability_reports.pop(host, None)
+
         # Copy the capabilities, so we don't modify the original dict
         capab_copy = dict(capabilities)
+        if isinstance(capab_copy.get('pools'), list):
+            capab_copy['pools'] = [dict(pool) for pool in capab_copy['pools']]
         capab_copy["timestamp"] = timeutils.utcnow()  # Reported time
         self.service_states[host] = capab_copy
 
@@ -440,19 +503,115 @@ class HostManager(object):
 
         self._no_capabilities_hosts.discard(host)
 
+        if self._services is not None:
+            service = self._services.get(host)
+            if service is None or not utils.service_is_up(service):
+                # The service is new, or was restarted, since we fetched
+                # the list.
+                self._services = None
+
+        if CONF.scheduler_use_volume_index:
+            self._update_volume_index(host)
+
+    def _apply_capabilities_delta(self, host, delta, generation):
+        """Rebuild the full capabilities of a host from a delta report."""
+        base_generation, base = self._capability_reports.get(host,
+                                                             (None, None))
+        if base_generation is None or base_generation + 1 != generation:
+            LOG.info(_LI("Ignoring capability update %(generation)s from "
+                         "%(host)s, waiting for a full update."),
+                     {'generation': generation, 'host': host})
+            return None
+
+        capabilities = dict(base)
+        for key in delta.get('removed', []):
+            capabilities.pop(key, None)
+        capabilities.update(delta.get('changed', {}))
+
+        changed_pools = delta.get('pools', {})
+        removed_pools = delta.get('removed_pools', [])
+        if changed_pools or removed_pools:
+            pools = collections.OrderedDict(
+                (pool['pool_name'], pool)
+                for pool in capabilities.get('pools') or [])
+            for pool_name in removed_pools:
+                pools.pop(pool_name, None)
+            pools.update(changed_pools)
+            capabilities['pools'] = list(pools.values())
+
+        self._capability_reports[host] = (generation, capabilities)
+        return capabilities
+
+    def _update_volume_index(self, host):
+        """Rebuild the volume index of a back end from the database."""
+        context = cinder_context.get_admin_context()
+        try:
+            volumes = db.volume_get_all_ids_by_host(context, host)
+        except Exception:
+            LOG.exception(_LE("Failed to index the volumes of host %s."),
+                          host)
+            return
+
+        index = collections.defaultdict(dict)
+        for volume_id, volume_host, project_id in volumes:
+            index[volume_host][volume_id] = project_id
+        self._remove_volume_index(host)
+        self._volume_index.update(index)
+        self._indexed_hosts.add(host)
+
+    def _remove_volume_index(self, host):
+        for volume_host in list(self._volume_index):
+            if vol_utils.extract_host(volume_host) == host:
+                del self._volume_index[volume_host]
+        self._indexed_hosts.discard(host)
+
+    def _attach_volume_index(self, host, host_state):
+        """Point the pools of a back end at their volume index entries."""
+        indexed = host in self._indexed_hosts
+        for pool in host_state.pools.values():
+            if indexed:
+                pool.volumes = self._volume_index.setdefault(pool.host, {})
+            else:
+                pool.volumes = None
+
     def has_all_capabilities(self):
         return len(self._no_capabilities_hosts) == 0
 
-    def _update_host_state_map(self, context):
+    def _get_volume_services(self, context):
+        """Returns the enabled volume services, cached for a short while."""
+        ttl = CONF.scheduler_service_cache_ttl
+        if (ttl and self._services is not None and
+                not timeutils.is_older_than(self._services_updated_at, ttl)):
+            self.service_cache_hits += 1
+            return self._services.values()
 
-        # Get resource usage across the available volume nodes:
+        self.service_cache_misses += 1
         topic = CONF.volume_topic
         volume_services = objects.ServiceList.get_all_by_topic(context,
                                                                topic,
                                                                disabled=False)
+        if ttl:
+            self._services = collections.OrderedDict(
+                (service.host, service) for service in volume_services)
+            self._services_updated_at = timeutils.utcnow()
+            LOG.debug("Refreshed volume service cache (hits: %(hits)d, "
+                      "misses: %(misses)d).",
+                      {'hits': self.service_cache_hits,
+                       'misses': self.service_cache_misses})
+        return volume_services.objects
+
+    def get_service_cache_stats(self):
+        """Returns the hit and miss counts of the volume service cache."""
+        return {'hits': self.service_cache_hits,
+                'misses': self.service_cache_misses}
+
+    def _update_host_state_map(self, context):
+
+        # Get resource usage across the available volume nodes:
+        volume_services = self._get_volume_services(context)
         active_hosts = set()
         no_capabilities_hosts = set()
-        for service in volume_services.objects:
+        for service in volume_services:
             host = service.host
             if not utils.service_is_up(service):
                 LOG.warning(_LW("volume service is down. (host: %s)"), host)
@@ -469,10 +628,17 @@ class HostManager(object):
                                                  service=
                                                  dict(service))
                 self.host_state_map[host] = host_state
-            # update capabilities and attributes in host_state
-            host_state.update_from_volume_capability(capabilities,
-                                                     service=
-                                                     dict(service))
+            if self._applied_capabilities.get(host) is capabilities:
+                # Nothing was reported since the last update, only the
+                # service record may have changed.
+                host_state.update_service(dict(service))
+            else:
+                # update capabilities and attributes in host_state
+                host_state.update_from_volume_capability(capabilities,
+                                                         service=
+                                                         dict(service))
+                self._applied_capabilities[host] = capabilities
+            self._attach_volume_index(host, host_state)
             active_hosts.add(host)
 
         self._no_capabilities_hosts = no_capabilities_hosts
@@ -483,6 +649,8 @@ class HostManager(object):
             LOG.info(_LI("Removing non-active host: %(host)s from "
                          "scheduler cache."), {'host': host})
             del self.host_state_map[host]
+            self._applied_capabilities.pop(host, None)
+            self._remove_volume_index(host)
 
     def get_all_host_states(self, context):
         """Returns a dict of all the hosts the HostManager knows about.
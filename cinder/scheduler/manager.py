@@ -56,7 +56,7 @@ LOG = logging.getLogger(__name__)
 class SchedulerManager(manager.Manager):
     """Chooses a host to create volumes."""
 
-    RPC_API_VERSION = '1.11'
+    RPC_API_VERSION = '1.13'
 
     target = messaging.Target(version=RPC_API_VERSION)
 
@@ -80,13 +80,16 @@ class SchedulerManager(manager.Manager):
         self.driver.reset()
 
     def update_service_capabilities(self, context, service_name=None,
-                                    host=None, capabilities=None, **kwargs):
+                                    host=None, capabilities=None,
+                                    generation=None, delta=False, **kwargs):
         """Process a capability update from a service node."""
         if capabilities is None:
             capabilities = {}
         self.driver.update_service_capabilities(service_name,
                                                 host,
-                                                capabilities)
+                                                capabilities,
+                                                generation=generation,
+                                                delta=delta)
 
     def _wait_for_scheduler(self):
         # NOTE(dulek): We're waiting for scheduler to announce that it's ready
@@ -147,6 +150,31 @@ class SchedulerManager(manager.Manager):
         with flow_utils.DynamicLogListener(flow_engine, logger=LOG):
             flow_engine.run()
 
+    def create_volumes(self, context, topic, request_spec_list,
+                       filter_properties_list=None):
+        """Schedule a batch of volumes and return where each one went.
+
+        Volumes that could not be scheduled are set to error, as
+        create_volume() does, and get a host of None in the result.
+        """
+
+        self._wait_for_scheduler()
+
+        results = self.driver.schedule_create_volumes(context,
+                                                      request_spec_list,
+                                                      filter_properties_list)
+        placements = []
+        for request_spec, result in zip(request_spec_list, results):
+            host = result
+            if isinstance(result, Exception):
+                host = None
+                self._set_volume_state_and_notify(
+                    'create_volume', {'volume_state': {'status': 'error'}},
+                    context, result, request_spec)
+            placements.append({'volume_id': request_spec['volume_id'],
+                               'host': host})
+        return placements
+
     def request_service_capabilities(self, context):
         volume_rpcapi.VolumeAPI().publish_service_capabilities(context)
 
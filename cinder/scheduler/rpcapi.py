@@ -44,9 +44,12 @@ class SchedulerAPI(rpc.RPCAPI):
         1.10 - Adds support for sending objects over RPC in retype()
         1.11 - Adds support for sending objects over RPC in
                migrate_volume_to_host()
+        1.12 - Add create_volumes method
+        1.13 - Add generation and delta arguments to
+               update_service_capabilities()
     """
 
-    RPC_API_VERSION = '1.11'
+    RPC_API_VERSION = '1.13'
     TOPIC = CONF.scheduler_topic
     BINARY = 'cinder-scheduler'
 
@@ -84,6 +87,16 @@ class SchedulerAPI(rpc.RPCAPI):
         cctxt = self.client.prepare(version=version)
         return cctxt.cast(ctxt, 'create_volume', **msg_args)
 
+    def create_volumes(self, ctxt, topic, request_spec_list,
+                       filter_properties_list=None):
+        cctxt = self.client.prepare(version='1.12')
+        request_spec_p_list = [jsonutils.to_primitive(request_spec)
+                               for request_spec in request_spec_list]
+        return cctxt.call(ctxt, 'create_volumes',
+                          topic=topic,
+                          request_spec_list=request_spec_p_list,
+                          filter_properties_list=filter_properties_list)
+
     def migrate_volume_to_host(self, ctxt, topic, volume_id, host,
                                force_host_copy=False, request_spec=None,
                                filter_properties=None, volume=None):
@@ -134,9 +147,18 @@ class SchedulerAPI(rpc.RPCAPI):
 
     def update_service_capabilities(self, ctxt,
                                     service_name, host,
-                                    capabilities):
+                                    capabilities, generation=None,
+                                    delta=None):
+        msg_args = {'service_name': service_name, 'host': host,
+                    'capabilities': capabilities}
+        version = '1.0'
+        if generation is not None and self.client.can_send_version('1.13'):
+            version = '1.13'
+            msg_args['generation'] = generation
+            if delta is not None:
+                msg_args['capabilities'] = delta
+                msg_args['delta'] = True
+
         # FIXME(flaper87): What to do with fanout?
-        cctxt = self.client.prepare(fanout=True, version='1.0')
-        cctxt.cast(ctxt, 'update_service_capabilities',
-                   service_name=service_name, host=host,
-                   capabilities=capabilities)
+        cctxt = self.client.prepare(fanout=True, version=version)
+        cctxt.cast(ctxt, 'update_service_capabilities', **msg_args)
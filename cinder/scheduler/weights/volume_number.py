@@ -53,6 +53,8 @@ class VolumeNumberWeigher(weights.BaseHostWeigher):
 
         We want spreading to be the default.
         """
+        if host_state.volumes is not None:
+            return len(host_state.volumes)
         context = weight_properties['context']
         volume_number = db.volume_data_get_for_host(context=context,
                                                     host=host_state.host,
@@ -60,6 +60,14 @@ service_opts = [
                help='Range, in seconds, to randomly delay when starting the'
                     ' periodic task scheduler to reduce stampeding.'
                     ' (Disable by setting to 0)'),
+    cfg.IntOpt('capabilities_full_report_interval',
+               default=10,
+               min=1,
+               help='Send the full capabilities of a service to the '
+                    'schedulers once every this many periodic reports. The '
+                    'reports in between only carry the capabilities and '
+                    'pools that changed, and are skipped if nothing did. '
+                    'Set to 1 to always send full reports.'),
     cfg.StrOpt('osapi_volume_listen',
                default="0.0.0.0",
                help='IP address on which OpenStack Volume API listens'),
@@ -0,0 +1,99 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+import datetime
+
+import mock
+from oslo_serialization import jsonutils
+import webob
+
+from cinder.api.contrib import image_volume_cache
+from cinder import context
+from cinder import exception
+from cinder import test
+from cinder.tests.unit.api import fakes
+
+
+class ImageVolumeCacheAPITest(test.TestCase):
+
+    def setUp(self):
+        super(ImageVolumeCacheAPITest, self).setUp()
+        self.controller = image_volume_cache.ImageVolumeCacheController()
+        self.ctxt = context.RequestContext('admin', 'fake', True)
+
+    def _request(self, path, method='GET', body=None, ctxt=None):
+        req = fakes.HTTPRequest.blank('/v2/fake/os-image-volume-cache' + path)
+        req.method = method
+        req.environ['cinder.context'] = ctxt or self.ctxt
+        if body is not None:
+            req.body = jsonutils.dump_as_bytes(body)
+        return req
+
+    @mock.patch('cinder.db.image_volume_cache_get_all')
+    def test_index(self, mock_get_all):
+        now = datetime.datetime(2016, 10, 1)
+        entry = {'id': 1, 'host': 'host1@lvm#pool', 'image_id': 'image-1',
+                 'image_updated_at': now, 'volume_id': 'volume-1',
+                 'size': 1, 'last_used': now}
+        mock_get_all.return_value = [entry]
+
+        res = self.controller.index(self._request('?image_id=image-1'))
+
+        del entry['id']
+        self.assertEqual({'image_volume_cache': [entry]}, res)
+        mock_get_all.assert_called_once_with(self.ctxt, image_id='image-1',
+                                             host=None)
+
+    def test_index_not_admin(self):
+        ctxt = context.RequestContext('user', 'fake', False)
+        self.assertRaises(exception.PolicyNotAuthorized,
+                          self.controller.index, self._request('', ctxt=ctxt))
+
+    @mock.patch('cinder.volume.api.API.prewarm_image_cache')
+    def test_prewarm(self, mock_prewarm):
+        body = {'prewarm': {'image_ids': ['image-1', 'image-2'],
+                            'hosts': ['host1@lvm#pool']}}
+
+        res = self.controller.prewarm(self._request('/prewarm', 'POST',
+                                                    body), body)
+
+        self.assertEqual(body, res)
+        mock_prewarm.assert_has_calls([
+            mock.call(self.ctxt, 'image-1', ['host1@lvm#pool']),
+            mock.call(self.ctxt, 'image-2', ['host1@lvm#pool'])])
+
+    @mock.patch('cinder.volume.api.API.prewarm_image_cache')
+    def test_prewarm_invalid_body(self, mock_prewarm):
+        for body in ({'prewarm': {'image_ids': ['image-1']}},
+                     {'prewarm': {'image_ids': [], 'hosts': ['host1']}},
+                     {'prewarm': {'image_ids': 'image-1',
+                                  'hosts': ['host1']}},
+                     {'prewarm': {'image_ids': [1], 'hosts': ['host1']}},
+                     {'images': {}}):
+            self.assertRaises(webob.exc.HTTPBadRequest,
+                              self.controller.prewarm,
+                              self._request('/prewarm', 'POST', body), body)
+        self.assertFalse(mock_prewarm.called)
+
+    @mock.patch('cinder.volume.api.API.prewarm_image_cache')
+    def test_prewarm_errors(self, mock_prewarm):
+        body = {'prewarm': {'image_ids': ['image-1'], 'hosts': ['host1']}}
+        for error, expected in (
+                (exception.ImageNotFound(image_id='image-1'),
+                 webob.exc.HTTPNotFound),
+                (exception.ServiceNotFound(service_id='host1'),
+                 webob.exc.HTTPNotFound),
+                (exception.InvalidInput(reason='down'),
+                 webob.exc.HTTPBadRequest)):
+            mock_prewarm.side_effect = error
+            self.assertRaises(expected, self.controller.prewarm,
+                              self._request('/prewarm', 'POST', body), body)
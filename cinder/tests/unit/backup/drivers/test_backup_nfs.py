@@ -17,6 +17,7 @@ Tests for Backup NFS driver.
 
 """
 import bz2
+import errno
 import filecmp
 import hashlib
 import os
@@ -29,6 +30,7 @@ from os_brick.remotefs import remotefs as remotefs_brick
 from oslo_config import cfg
 import six
 
+from cinder.backup import chunkeddriver
 from cinder.backup.drivers import nfs
 from cinder import context
 from cinder import db
@@ -553,6 +555,271 @@ class BackupNFSSwiftBasedTestCase(test.TestCase):
             self.assertTrue(filecmp.cmp(self.volume_file.name,
                             restored_file.name))
 
+    def test_backup_restore_parallel_workers(self):
+        volume_id = fake.volume_id
+
+        self._create_backup_db_entry(volume_id=volume_id)
+        self.flags(backup_compression_algorithm='zlib')
+        self.flags(backup_file_size=(1024 * 3))
+        self.flags(backup_sha_block_size_bytes=1024)
+        self.flags(backup_compression_workers=4)
+        self.flags(backup_writer_workers=3)
+        service = nfs.NFSBackupDriver(self.ctxt)
+        self.volume_file.seek(0)
+        backup = objects.Backup.get_by_id(self.ctxt, fake.backup_id)
+        service.backup(backup, self.volume_file)
+
+        # Objects and shas have to be recorded in the order of the volume.
+        backup = objects.Backup.get_by_id(self.ctxt, fake.backup_id)
+        metadata = service._read_metadata(backup)
+        offsets = [list(obj.values())[0]['offset']
+                   for obj in metadata['objects']]
+        self.assertEqual(list(range(0, 32 * 1024, 3 * 1024)), offsets)
+        names = [list(obj.keys())[0] for obj in metadata['objects']]
+        self.assertEqual(sorted(names), names)
+        self.volume_file.seek(0)
+        expected_shas = [hashlib.sha256(self.volume_file.read(1024)).
+                         hexdigest() for _i in range(32)]
+        self.assertEqual(expected_shas,
+                         list(service._read_sha256file(backup)['sha256s']))
+
+        with tempfile.NamedTemporaryFile() as restored_file:
+            service.restore(backup, volume_id, restored_file)
+            self.assertTrue(filecmp.cmp(self.volume_file.name,
+                            restored_file.name))
+
+    def test_restore_readahead(self):
+        volume_id = fake.volume_id
+
+        self._create_backup_db_entry(volume_id=volume_id)
+        self.flags(backup_compression_algorithm='zlib')
+        self.flags(backup_file_size=1024)
+        self.flags(backup_sha_block_size_bytes=1024)
+        self.flags(backup_restore_readahead=4)
+        self.flags(backup_object_number_per_notification=8)
+        service = nfs.NFSBackupDriver(self.ctxt)
+        self.volume_file.seek(0)
+        backup = objects.Backup.get_by_id(self.ctxt, fake.backup_id)
+        service.backup(backup, self.volume_file)
+
+        with tempfile.NamedTemporaryFile() as restored_file, \
+                mock.patch.object(service,
+                                  '_send_restore_progress') as mock_progress:
+            backup = objects.Backup.get_by_id(self.ctxt, fake.backup_id)
+            service.restore(backup, volume_id, restored_file)
+            self.assertTrue(filecmp.cmp(self.volume_file.name,
+                            restored_file.name))
+        # One notification every 8 objects and one at the end.
+        self.assertEqual(5, mock_progress.call_count)
+        restored_bytes, total_bytes = mock_progress.call_args[0][2:4]
+        self.assertEqual(32 * 1024, restored_bytes)
+        self.assertEqual(32 * 1024, total_bytes)
+
+    def test_backup_restore_delta_binary_sha256file(self):
+        volume_id = fake.volume_id
+
+        self.flags(backup_file_size=(8 * 1024))
+        self.flags(backup_sha_block_size_bytes=1024)
+        # The parent sha256 file is in JSON, the incremental one in binary.
+        self._create_backup_db_entry(volume_id=volume_id,
+                                     container='full-container',
+                                     backup_id=fake.backup_id)
+        service = nfs.NFSBackupDriver(self.ctxt)
+        self.volume_file.seek(0)
+        backup = objects.Backup.get_by_id(self.ctxt, fake.backup_id)
+        service.backup(backup, self.volume_file)
+
+        self.volume_file.seek(16 * 1024)
+        self.volume_file.write(os.urandom(1024))
+        self.volume_file.seek(20 * 1024)
+        self.volume_file.write(os.urandom(1024))
+        self.flags(backup_sha256file_format='binary')
+        self._create_backup_db_entry(volume_id=volume_id,
+                                     container='delta-container',
+                                     backup_id=fake.backup2_id,
+                                     parent_id=fake.backup_id)
+        service = nfs.NFSBackupDriver(self.ctxt)
+        self.volume_file.seek(0)
+        deltabackup = objects.Backup.get_by_id(self.ctxt, fake.backup2_id)
+        service.backup(deltabackup, self.volume_file)
+
+        deltabackup = objects.Backup.get_by_id(self.ctxt, fake.backup2_id)
+        with service.get_object_reader(
+                deltabackup['container'],
+                service._sha256_filename(deltabackup)) as reader:
+            self.assertTrue(reader.read().startswith(
+                chunkeddriver.SHA256FILE_BINARY_MAGIC))
+        content1 = service._read_sha256file(backup)
+        content2 = service._read_sha256file(deltabackup)
+        self.assertEqual(1024, content2['chunk_size'])
+        self.assertEqual(32, len(content2['sha256s']))
+        changed = [i for i in range(32)
+                   if content1['sha256s'][i] != content2['sha256s'][i]]
+        self.assertEqual([16, 20], changed)
+        metadata = service._read_metadata(deltabackup)
+        self.assertEqual([16 * 1024, 20 * 1024],
+                         [list(obj.values())[0]['offset']
+                          for obj in metadata['objects']])
+
+        with tempfile.NamedTemporaryFile() as restored_file:
+            service.restore(deltabackup, volume_id, restored_file)
+            self.assertTrue(filecmp.cmp(self.volume_file.name,
+                            restored_file.name))
+
+    def test_backup_cancel_polls_status_by_interval(self):
+        volume_id = fake.volume_id
+
+        self._create_backup_db_entry(volume_id=volume_id)
+        self.flags(backup_file_size=1024)
+        self.flags(backup_sha_block_size_bytes=1024)
+        service = nfs.NFSBackupDriver(self.ctxt)
+        self.volume_file.seek(0)
+        backup = objects.Backup.get_by_id(self.ctxt, fake.backup_id)
+
+        with mock.patch.object(objects.Backup, 'get_by_id',
+                               return_value=backup) as mock_get:
+            service.backup(backup, self.volume_file)
+        # 32 chunks but the status is only read once in the interval.
+        self.assertEqual(1, mock_get.call_count)
+
+    def test_backup_cancel(self):
+        volume_id = fake.volume_id
+
+        self._create_backup_db_entry(volume_id=volume_id)
+        self.flags(backup_file_size=1024)
+        self.flags(backup_sha_block_size_bytes=1024)
+        self.flags(backup_status_check_interval=0)
+        service = nfs.NFSBackupDriver(self.ctxt)
+        self.volume_file.seek(0)
+        backup = objects.Backup.get_by_id(self.ctxt, fake.backup_id)
+        real_write_object = service._write_object
+
+        def _write_object(*args):
+            real_write_object(*args)
+            db.backup_update(self.ctxt, fake.backup_id,
+                             {'status': 'deleting'})
+
+        with mock.patch.object(service, '_write_object',
+                               side_effect=_write_object), \
+                mock.patch.object(service, 'delete') as mock_delete:
+            service.backup(backup, self.volume_file)
+        self.assertTrue(mock_delete.called)
+        self.assertLess(self.volume_file.tell(), 32 * 1024)
+
+    def test_restore_cancel(self):
+        volume_id = fake.volume_id
+
+        self._create_backup_db_entry(volume_id=volume_id)
+        self.flags(backup_file_size=1024)
+        self.flags(backup_sha_block_size_bytes=1024)
+        service = nfs.NFSBackupDriver(self.ctxt)
+        self.volume_file.seek(0)
+        backup = objects.Backup.get_by_id(self.ctxt, fake.backup_id)
+        service.backup(backup, self.volume_file)
+
+        db.backup_update(self.ctxt, fake.backup_id, {'status': 'deleting'})
+        backup = objects.Backup.get_by_id(self.ctxt, fake.backup_id)
+        with tempfile.NamedTemporaryFile() as restored_file:
+            self.assertRaises(exception.BackupRestoreCancel,
+                              service.restore, backup, volume_id,
+                              restored_file)
+
+    def test_sha256_list(self):
+        digests = [hashlib.sha256(six.b(str(i))).digest() for i in range(3)]
+        hex_list = [hashlib.sha256(six.b(str(i))).hexdigest()
+                    for i in range(3)]
+        sha256_list = chunkeddriver.Sha256List.from_hex_list(hex_list)
+
+        self.assertEqual(3, len(sha256_list))
+        self.assertEqual(hex_list, list(sha256_list))
+        self.assertEqual(hex_list, sha256_list.to_hex_list())
+        self.assertEqual(hex_list[-1], sha256_list[-1])
+        self.assertRaises(IndexError, sha256_list.__getitem__, 3)
+        self.assertEqual(b''.join(digests[1:]),
+                         sha256_list.get_digests(1, 2))
+        sha256_list.extend(digests[0])
+        self.assertEqual(hex_list + hex_list[:1], list(sha256_list))
+
+    def test_backup_restore_sparse_detection(self):
+        volume_id = fake.volume_id
+
+        self._create_backup_db_entry(volume_id=volume_id)
+        self.flags(backup_sparse_detection=True)
+        self.flags(backup_file_size=(1024 * 4))
+        self.flags(backup_sha_block_size_bytes=1024)
+        self.volume_file.seek(8 * 1024)
+        self.volume_file.write(b'\0' * 8 * 1024)
+        self.volume_file.flush()
+        service = nfs.NFSBackupDriver(self.ctxt)
+        self.volume_file.seek(0)
+        backup = objects.Backup.get_by_id(self.ctxt, fake.backup_id)
+        service.backup(backup, self.volume_file)
+
+        backup = objects.Backup.get_by_id(self.ctxt, fake.backup_id)
+        metadata = service._read_metadata(backup)
+        self.assertEqual(service.DRIVER_VERSION_HOLES, metadata['version'])
+        self.assertEqual([{'offset': 8 * 1024, 'length': 4 * 1024},
+                          {'offset': 12 * 1024, 'length': 4 * 1024}],
+                         metadata['holes'])
+        self.assertEqual(6, len(metadata['objects']))
+        self.assertEqual(32, len(service._read_sha256file(backup)['sha256s']))
+
+        with tempfile.NamedTemporaryFile() as restored_file:
+            restored_file.write(os.urandom(32 * 1024))
+            restored_file.flush()
+            service.restore(backup, volume_id, restored_file)
+            self.assertTrue(filecmp.cmp(self.volume_file.name,
+                            restored_file.name))
+
+    def test_get_hole_chunk_length(self):
+        self.flags(backup_file_size=(1024 * 4))
+        service = nfs.NFSBackupDriver(self.ctxt)
+        self.volume_file.flush()
+        real_lseek = os.lseek
+
+        def _fake_lseek(next_data):
+            def _lseek(fd, pos, how):
+                if how != chunkeddriver.SEEK_DATA:
+                    return real_lseek(fd, pos, how)
+                if isinstance(next_data, Exception):
+                    raise next_data
+                return next_data
+            return _lseek
+
+        with mock.patch.object(os, 'lseek', _fake_lseek(4 * 1024)):
+            self.assertEqual(4 * 1024,
+                             service._get_hole_chunk_length(self.volume_file,
+                                                            0))
+            self.assertEqual(0,
+                             service._get_hole_chunk_length(self.volume_file,
+                                                            4 * 1024))
+        with mock.patch.object(os, 'lseek',
+                               _fake_lseek(OSError(errno.ENXIO, 'ENXIO'))):
+            self.assertEqual(4 * 1024,
+                             service._get_hole_chunk_length(self.volume_file,
+                                                            28 * 1024))
+        with mock.patch.object(os, 'lseek',
+                               _fake_lseek(OSError(errno.EINVAL, 'EINVAL'))):
+            self.assertEqual(0,
+                             service._get_hole_chunk_length(self.volume_file,
+                                                            0))
+
+    def test_read_chunk(self):
+        self.flags(backup_sparse_detection=True)
+        self.flags(backup_file_size=(1024 * 4))
+        service = nfs.NFSBackupDriver(self.ctxt)
+        self.volume_file.seek(0)
+        data = self.volume_file.read(4 * 1024)
+        self.volume_file.seek(0)
+
+        with mock.patch.object(service, '_get_hole_chunk_length',
+                               side_effect=[0, 2 * 1024]):
+            self.assertEqual(data,
+                             service._read_chunk(self.volume_file, 0))
+            self.assertEqual(b'\0' * 2 * 1024,
+                             service._read_chunk(self.volume_file, 4 * 1024))
+        self.assertEqual(6 * 1024, self.volume_file.tell())
+
     def test_restore_delta(self):
         volume_id = fake.volume_id
 
@@ -12,6 +12,8 @@
 #    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
 #    License for the specific language governing permissions and limitations
 #    under the License.
+import time
+
 import mock
 from mox3 import mox
 from oslo_concurrency import processutils
@@ -91,6 +93,26 @@ class BrickLvmTestCase(test.TestCase):
                     "lWyauW-dKpG-Rz7E-xtKY-jeju-QsYU-SLG7Z2\n"
             data += "  fake-vg-3:10.00:10.00:0:"\
                     "mXzbuX-dKpG-Rz7E-xtKY-jeju-QsYU-SLG8Z3\n"
+        elif ('env, LC_ALL=C, lvs, --noheadings, --unit=g, -o, '
+              'vg_name,vg_size,vg_free,lv_count,vg_uuid,lv_name,lv_size,'
+              'data_percent, --separator, :, --nosuffix' in cmd_string):
+            if 'test-prov-cap-vg-unit' in cmd_string:
+                vg = ("  test-prov-cap-vg-unit:10.00:10.00:3:"
+                      "mXzbuX-dKpG-Rz7E-xtKY-jeju-QsYU-SLG8Z4:")
+                data = vg + "test-prov-cap-pool-unit:9.50g:20.00\n"
+                data += vg + "fake-volume-1:1.00g:\n"
+                data += vg + "fake-volume-2:2.00g:\n"
+            elif 'test-prov-cap-vg-no-unit' in cmd_string:
+                vg = ("  test-prov-cap-vg-no-unit:10.00:10.00:3:"
+                      "mXzbuX-dKpG-Rz7E-xtKY-jeju-QsYU-SLG8Z4:")
+                data = vg + "test-prov-cap-pool-no-unit:9.50:20.00\n"
+                data += vg + "fake-volume-1:1.00:\n"
+                data += vg + "fake-volume-2:2.00:\n"
+            elif 'fake-vg' in cmd_string:
+                vg = ("  fake-vg:10.00:10.00:2:"
+                      "kVxztV-dKpG-Rz7E-xtKY-jeju-QsYU-SLG6Z1:")
+                data = vg + "fake-1:1.00:\n"
+                data += vg + "fake-2:1.00:\n"
         elif ('env, LC_ALL=C, lvs, --noheadings, '
               '--unit=g, -o, vg_name,name,size, --nosuffix, '
               'fake-vg/lv-nothere' in cmd_string):
@@ -309,6 +331,101 @@ class BrickLvmTestCase(test.TestCase):
         self.assertEqual(7.6, self.vg.vg_thin_pool_free_space)
         self.assertEqual(3.0, self.vg.vg_provisioned_capacity)
 
+    def test_update_volume_group_info(self):
+        self.vg.update_volume_group_info()
+
+        self.assertEqual(10.0, self.vg.vg_size)
+        self.assertEqual(10.0, self.vg.vg_free_space)
+        self.assertEqual(2, self.vg.vg_lv_count)
+        self.assertEqual('kVxztV-dKpG-Rz7E-xtKY-jeju-QsYU-SLG6Z1',
+                         self.vg.vg_uuid)
+
+    def test_update_volume_group_info_no_lvs(self):
+        self.vg.vg_name = 'fake-vg-2'
+        self.mock_object(self.vg, 'get_all_volume_groups', mock.Mock(
+            return_value=[{'name': 'fake-vg-2', 'size': 10.0,
+                           'available': 10.0, 'lv_count': 0,
+                           'uuid': 'fake-uuid'}]))
+
+        self.vg.update_volume_group_info()
+
+        self.assertEqual(0, self.vg.vg_lv_count)
+        self.assertEqual('fake-uuid', self.vg.vg_uuid)
+
+    def test_update_volume_group_info_vg_not_found(self):
+        self.vg.vg_name = 'fake-vg-2'
+        self.mock_object(self.vg, 'get_all_volume_groups',
+                         mock.Mock(return_value=[]))
+
+        self.assertRaises(exception.VolumeGroupNotFound,
+                          self.vg.update_volume_group_info)
+
+    def test_lv_report_cache(self):
+        self.vg.report_cache_ttl = 60
+        self.vg.update_volume_group_info()
+        self.mock_object(self.vg, 'get_lv_info')
+
+        self.assertEqual(['fake-1', 'fake-2'],
+                         [lv['name'] for lv in self.vg.get_volumes()])
+        self.assertEqual({'vg': 'fake-vg', 'name': 'fake-1', 'size': '1.00'},
+                         self.vg.get_volume('fake-1'))
+        self.assertFalse(self.vg.get_lv_info.called)
+
+        # LVs missing from the report are looked up.
+        self.vg.get_lv_info.return_value = []
+        self.assertIsNone(self.vg.get_volume('fake-3'))
+        self.vg.get_lv_info.assert_called_once_with('sudo', 'fake-vg',
+                                                    'fake-3')
+
+    def test_lv_report_cache_expired(self):
+        self.vg.report_cache_ttl = 60
+        self.vg.update_volume_group_info()
+        self.vg._lv_report_time -= 60
+
+        self.mock_object(self.vg, 'get_lv_info',
+                         mock.Mock(return_value=[]))
+        self.assertEqual([], self.vg.get_volumes())
+
+    def test_lv_report_cache_disabled(self):
+        self.vg.update_volume_group_info()
+
+        self.mock_object(self.vg, 'get_lv_info',
+                         mock.Mock(return_value=[]))
+        self.assertEqual([], self.vg.get_volumes())
+
+    def test_lv_report_cache_invalidated(self):
+        self.vg.report_cache_ttl = 60
+        self.mock_object(self.vg, '_execute')
+        for change in (lambda: self.vg.create_volume('fake-3', '1g'),
+                       lambda: self.vg.delete('fake-1'),
+                       lambda: self.vg.rename_volume('fake-1', 'fake-3'),
+                       lambda: self.vg.revert('fake-1')):
+            self.vg._lv_report = [{'vg': 'fake-vg', 'name': 'fake-1',
+                                   'size': '1.00'}]
+            self.vg._lv_report_time = time.time()
+            change()
+            self.assertIsNone(self.vg._get_lv_report())
+
+    def test_lv_report_cache_changed_during_report(self):
+        self.vg.report_cache_ttl = 60
+        get_vg_report = self.vg._get_vg_report
+
+        def _get_vg_report():
+            # The LVs are changed while the report runs.
+            report = get_vg_report()
+            with mock.patch.object(self.vg, '_execute'):
+                self.vg.rename_volume('fake-1', 'fake-3')
+            return report
+
+        with mock.patch.object(self.vg, '_get_vg_report',
+                               side_effect=_get_vg_report):
+            self.vg.update_volume_group_info()
+        self.assertIsNone(self.vg._get_lv_report())
+
+        # A report run after the change is cached.
+        self.vg.update_volume_group_info()
+        self.assertIsNotNone(self.vg._get_lv_report())
+
     def test_thin_pool_free_space(self):
         # The size of fake-vg-pool is 9g and the allocated data sums up to
         # 12% so the calculated free space should be 7.92
@@ -13,11 +13,14 @@
 #    under the License.
 
 from datetime import timedelta
+
+import eventlet
 import mock
 
 from oslo_utils import timeutils
 
 from cinder import context as ctxt
+from cinder import exception
 from cinder.image import cache as image_cache
 from cinder import test
 
@@ -29,24 +32,33 @@ class ImageVolumeCacheTestCase(test.TestCase):
         self.mock_db = mock.Mock()
         self.mock_volume_api = mock.Mock()
         self.context = ctxt.get_admin_context()
+        self.entry_count = 0
 
-    def _build_cache(self, max_gb=0, max_count=0):
+    def _build_cache(self, max_gb=0, max_count=0, eviction_policy=None,
+                     index_refresh_interval=None, coalesce_timeout=None):
         cache = image_cache.ImageVolumeCache(self.mock_db,
                                              self.mock_volume_api,
                                              max_gb,
-                                             max_count)
+                                             max_count,
+                                             eviction_policy,
+                                             index_refresh_interval,
+                                             coalesce_timeout)
         cache.notifier = self.notifier
         return cache
 
     def _build_entry(self, size=10):
+        # Entries are built from the most to the least recently used, the
+        # order in which the database returns them.
+        self.entry_count += 1
+        now = timeutils.utcnow(with_timezone=True)
         entry = {
-            'id': 1,
+            'id': self.entry_count,
             'host': 'test@foo#bar',
             'image_id': 'c7a8b8d4-e519-46c7-a0df-ddf1b9b9fff2',
-            'image_updated_at': timeutils.utcnow(with_timezone=True),
-            'volume_id': '70a599e0-31e7-49b7-b260-868f441e862b',
+            'image_updated_at': now,
+            'volume_id': '70a599e0-31e7-49b7-b260-%012d' % self.entry_count,
             'size': size,
-            'last_used': timeutils.utcnow(with_timezone=True)
+            'last_used': now - timedelta(minutes=self.entry_count)
         }
         return entry
 
@@ -180,6 +192,35 @@ class ImageVolumeCacheTestCase(test.TestCase):
         self.assertEqual(entry['image_id'], msg['payload']['image_id'])
         self.assertEqual(1, len(self.notifier.notifications))
 
+    def test_find_entry(self):
+        cache = self._build_cache()
+        entry = self._build_entry()
+        image_meta = {'updated_at': entry['image_updated_at']}
+        (self.mock_db.
+         image_volume_cache_get_and_update_last_used.return_value) = entry
+
+        found_entry = cache.find_entry(self.context, entry['host'],
+                                       entry['image_id'], image_meta)
+
+        self.assertEqual(entry, found_entry)
+        self.assertEqual([], self.notifier.notifications)
+
+    def test_find_entry_needs_update(self):
+        cache = self._build_cache()
+        entry = self._build_entry()
+        image_meta = {
+            'updated_at': entry['image_updated_at'] + timedelta(hours=2)
+        }
+        (self.mock_db.
+         image_volume_cache_get_and_update_last_used.return_value) = entry
+
+        found_entry = cache.find_entry(self.context, entry['host'],
+                                       entry['image_id'], image_meta)
+
+        self.assertIsNone(found_entry)
+        self.assertTrue(self.mock_volume_api.delete.called)
+        self.assertEqual([], self.notifier.notifications)
+
     def test_create_cache_entry(self):
         cache = self._build_cache()
         entry = self._build_entry()
@@ -294,3 +335,246 @@ class ImageVolumeCacheTestCase(test.TestCase):
         has_space = cache.ensure_space(self.context, 50, host)
         self.assertFalse(has_space)
         mock_delete.assert_not_called()
+
+    def test_ensure_space_only_gb_limited(self):
+        cache = self._build_cache(max_gb=30)
+        mock_delete = mock.patch.object(cache, '_delete_image_volume').start()
+        entry1 = self._build_entry(size=10)
+        entry2 = self._build_entry(size=10)
+        self.mock_db.image_volume_cache_get_all_for_host.return_value = [
+            entry1, entry2]
+
+        has_space = cache.ensure_space(self.context, 15, entry1['host'])
+        self.assertTrue(has_space)
+        mock_delete.assert_called_once_with(self.context, entry2)
+
+    def test_invalid_eviction_policy(self):
+        self.assertRaises(exception.InvalidConfigurationValue,
+                          self._build_cache, eviction_policy='random')
+
+    def _use(self, cache, entry, times=1):
+        used = dict(entry, last_used=timeutils.utcnow(with_timezone=True))
+        (self.mock_db.
+         image_volume_cache_get_and_update_last_used.return_value) = used
+        image_meta = {'updated_at': entry['image_updated_at']}
+        for _i in range(times):
+            cache.get_entry(self.context, entry, entry['image_id'],
+                            image_meta)
+        return used
+
+    @mock.patch('time.time')
+    def test_ensure_space_uses_index(self, mock_time):
+        mock_time.return_value = 1000
+        cache = self._build_cache(max_gb=30, max_count=10,
+                                  index_refresh_interval=60)
+        mock_delete = mock.patch.object(cache, '_delete_image_volume').start()
+        entry1 = self._build_entry(size=10)
+        entry2 = self._build_entry(size=10)
+        get_all = self.mock_db.image_volume_cache_get_all_for_host
+        get_all.return_value = [entry1, entry2]
+        host = entry1['host']
+
+        self.assertTrue(cache.ensure_space(self.context, 5, host))
+        self.assertTrue(cache.ensure_space(self.context, 10, host))
+        self.assertEqual(1, get_all.call_count)
+
+        entry3 = dict(self._build_entry(size=5),
+                      last_used=timeutils.utcnow(with_timezone=True))
+        self.mock_db.image_volume_cache_create.return_value = entry3
+        cache.create_cache_entry(self.context, entry3, entry3['image_id'],
+                                 {'updated_at': entry3['image_updated_at']})
+
+        # The index is full, it is reloaded before evicting anything.
+        get_all.return_value = [entry1, entry2, entry3]
+        self.assertTrue(cache.ensure_space(self.context, 10, host))
+        self.assertEqual(2, get_all.call_count)
+        mock_delete.assert_called_once_with(self.context, entry2)
+
+        mock_time.return_value = 1061
+        self.assertTrue(cache.ensure_space(self.context, 5, host))
+        self.assertEqual(3, get_all.call_count)
+
+    def test_evict_updates_index(self):
+        cache = self._build_cache(max_gb=20, max_count=10,
+                                  index_refresh_interval=60)
+        entry = self._build_entry(size=10)
+        get_all = self.mock_db.image_volume_cache_get_all_for_host
+        get_all.return_value = [entry]
+        self.assertTrue(cache.ensure_space(self.context, 5, entry['host']))
+
+        cache.evict(self.context, entry)
+
+        self.assertTrue(cache.ensure_space(self.context, 20, entry['host']))
+        self.assertEqual(1, get_all.call_count)
+
+    def test_ensure_space_lru(self):
+        cache = self._build_cache(max_count=3, index_refresh_interval=60)
+        mock_delete = mock.patch.object(cache, '_delete_image_volume').start()
+        entry1 = self._build_entry()
+        entry2 = self._build_entry()
+        self.mock_db.image_volume_cache_get_all_for_host.return_value = [
+            entry1, entry2]
+        cache.ensure_space(self.context, 10, entry1['host'])
+        used = self._use(cache, entry2)
+
+        cache.max_cache_size_count = 2
+        self.mock_db.image_volume_cache_get_all_for_host.return_value = [
+            used, entry1]
+        self.assertTrue(cache.ensure_space(self.context, 10, entry1['host']))
+        mock_delete.assert_called_once_with(self.context, entry1)
+
+    def test_ensure_space_lfu(self):
+        cache = self._build_cache(max_count=4, eviction_policy='lfu',
+                                  index_refresh_interval=60)
+        mock_delete = mock.patch.object(cache, '_delete_image_volume').start()
+        entry1 = self._build_entry()
+        entry2 = self._build_entry()
+        entry3 = self._build_entry()
+        self.mock_db.image_volume_cache_get_all_for_host.return_value = [
+            entry1, entry2, entry3]
+        cache.ensure_space(self.context, 10, entry1['host'])
+        used3 = self._use(cache, entry3, times=3)
+        used2 = self._use(cache, entry2, times=2)
+
+        cache.max_cache_size_count = 3
+        self.mock_db.image_volume_cache_get_all_for_host.return_value = [
+            used2, used3, entry1]
+        self.assertTrue(cache.ensure_space(self.context, 10, entry1['host']))
+        mock_delete.assert_called_once_with(self.context, entry1)
+
+        # entry1 is gone, entry2 is now the least frequently used.
+        self.mock_db.image_volume_cache_get_all_for_host.return_value = [
+            used2, used3]
+        cache.max_cache_size_count = 2
+        self.assertTrue(cache.ensure_space(self.context, 10, entry1['host']))
+        mock_delete.assert_called_with(self.context, used2)
+
+    def test_ensure_space_gdsf(self):
+        cache = self._build_cache(max_gb=40, eviction_policy='gdsf',
+                                  index_refresh_interval=60)
+        mock_delete = mock.patch.object(cache, '_delete_image_volume').start()
+        small = self._build_entry(size=5)
+        large = self._build_entry(size=20)
+        self.mock_db.image_volume_cache_get_all_for_host.return_value = [
+            small, large]
+        cache.ensure_space(self.context, 10, small['host'])
+        used_large = self._use(cache, large)
+
+        # The large entry was used most recently but has fewer hits per GB.
+        self.mock_db.image_volume_cache_get_all_for_host.return_value = [
+            used_large, small]
+        self.assertTrue(cache.ensure_space(self.context, 20, small['host']))
+        mock_delete.assert_called_once_with(self.context, used_large)
+
+    def test_coalesce_disabled(self):
+        cache = self._build_cache(coalesce_timeout=0)
+        with cache.coalesce('test@foo#bar', 'image-1') as locked:
+            self.assertFalse(locked)
+            with cache.coalesce('test@foo#bar', 'image-1'):
+                pass
+        self.assertEqual({}, cache._coalesce_locks)
+
+    def test_coalesce(self):
+        cache = self._build_cache(coalesce_timeout=60)
+        events = []
+
+        def miss(name, image_id):
+            with cache.coalesce('test@foo#bar', image_id) as locked:
+                self.assertTrue(locked)
+                events.append((name, 'start'))
+                eventlet.sleep(0.01)
+                if name == 'first':
+                    self._create_entry(cache, image_id)
+                events.append((name, 'end'))
+
+        threads = [eventlet.spawn(miss, 'first', 'image-1'),
+                   eventlet.spawn(miss, 'second', 'image-1'),
+                   eventlet.spawn(miss, 'other', 'image-2')]
+        for thread in threads:
+            thread.wait()
+
+        image_1_events = [event for event in events if event[0] != 'other']
+        self.assertEqual([('first', 'start'), ('first', 'end'),
+                          ('second', 'start'), ('second', 'end')],
+                         image_1_events)
+        # A different image is not serialized with image-1.
+        self.assertLess(events.index(('other', 'start')),
+                        events.index(('first', 'end')))
+        self.assertEqual({}, cache._coalesce_locks)
+
+    def _create_entry(self, cache, image_id):
+        entry = self._build_entry()
+        self.mock_db.image_volume_cache_create.return_value = entry
+        cache.create_cache_entry(self.context,
+                                 {'id': entry['volume_id'],
+                                  'host': entry['host'],
+                                  'size': entry['size']},
+                                 image_id,
+                                 {'updated_at': entry['image_updated_at']})
+
+    def test_coalesce_uncreatable(self):
+        cache = self._build_cache(coalesce_timeout=60)
+        events = []
+
+        def miss(name):
+            with cache.coalesce('test@foo#bar', 'image-1') as locked:
+                events.append((name, locked, 'start'))
+                eventlet.sleep(0.01)
+                events.append((name, locked, 'end'))
+
+        threads = [eventlet.spawn(miss, name)
+                   for name in ('first', 'second', 'third')]
+        for thread in threads:
+            thread.wait()
+
+        # The first miss did not create the entry, the others do not wait
+        # for each other.
+        self.assertEqual([('first', True, 'start'), ('first', True, 'end'),
+                          ('second', False, 'start'),
+                          ('third', False, 'start'),
+                          ('second', False, 'end'),
+                          ('third', False, 'end')],
+                         events)
+        self.assertEqual({}, cache._coalesce_locks)
+
+    def test_coalesce_timeout(self):
+        cache = self._build_cache(coalesce_timeout=60)
+        key = ('test@foo#bar', 'image-1')
+        with cache.coalesce(*key):
+            with mock.patch.object(cache._coalesce_locks[key].lock, 'acquire',
+                                   return_value=False) as mock_acquire:
+                with cache.coalesce(*key) as locked:
+                    self.assertFalse(locked)
+                mock_acquire.assert_called_once_with(timeout=60)
+            self.assertEqual(1, cache._coalesce_locks[key].users)
+        self.assertEqual({}, cache._coalesce_locks)
+
+    @mock.patch('cinder.coordination.Lock')
+    @mock.patch('cinder.coordination.COORDINATOR')
+    def test_coalesce_distributed(self, mock_coordinator, mock_lock):
+        mock_coordinator.started = True
+        mock_lock.return_value.acquire.return_value = True
+        cache = self._build_cache(coalesce_timeout=60)
+
+        with cache.coalesce('test@foo#bar', 'image-1'):
+            mock_lock.assert_called_once_with(
+                'image-volume-cache-{host}-{image_id}',
+                {'host': 'test@foo#bar', 'image_id': 'image-1'})
+            self.assertFalse(mock_lock.return_value.release.called)
+        mock_lock.return_value.release.assert_called_once_with()
+
+    @mock.patch('cinder.coordination.Lock')
+    @mock.patch('cinder.coordination.COORDINATOR')
+    def test_coalesce_distributed_timeout(self, mock_coordinator, mock_lock):
+        mock_coordinator.started = True
+        mock_lock.return_value.acquire.return_value = False
+        cache = self._build_cache(coalesce_timeout=60)
+        key = ('test@foo#bar', 'image-1')
+
+        with cache.coalesce(*key) as locked:
+            self.assertFalse(locked)
+            # The local lock is not held either.
+            self.assertTrue(cache._coalesce_locks[key].lock.acquire(
+                blocking=False))
+            cache._coalesce_locks[key].lock.release()
+        self.assertFalse(mock_lock.return_value.release.called)
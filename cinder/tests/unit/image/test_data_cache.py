@@ -0,0 +1,234 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tests for the host-local image data cache."""
+
+import hashlib
+import os
+import re
+import tempfile
+
+import eventlet
+import mock
+from oslo_utils import units
+from six.moves import BaseHTTPServer
+
+from cinder import exception
+from cinder.image import data_cache
+from cinder import test
+
+
+class FakeImageServerHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    """Serves the image data of the server, optionally by range."""
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        byte_range = self.headers.get('Range')
+        self.server.requests.append((self.path, byte_range,
+                                     self.headers.get('X-Auth-Token')))
+        data = self.server.data
+        if byte_range and self.server.ranges:
+            start, end = map(int, re.match(r'bytes=(\d+)-(\d+)',
+                                           byte_range).groups())
+            if start in self.server.failing_ranges:
+                self.send_response(503)
+                self.end_headers()
+                return
+            data = data[start:end + 1]
+            self.send_response(206)
+            self.send_header('Content-Range', 'bytes %d-%d/%d' %
+                             (start, end, len(self.server.data)))
+        else:
+            self.send_response(200)
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+class ImageDataCacheTestCase(test.TestCase):
+
+    def setUp(self):
+        super(ImageDataCacheTestCase, self).setUp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.flags(image_data_cache_dir=self.cache_dir,
+                   image_data_cache_max_size_gb=1)
+        self.cache = data_cache.get_cache()
+        self.context = mock.Mock(auth_token='token')
+        self.data = b'image data' * 1000
+        self.image_meta = {'id': 'image-1',
+                           'size': len(self.data),
+                           'checksum': hashlib.md5(self.data).hexdigest()}
+        self.image_service = mock.Mock()
+        self.image_service.get_location.return_value = (None, None)
+        self.image_service.download.side_effect = self._download
+
+    def _download(self, context, image_id, data=None):
+        data.write(self.data)
+
+    def _fetch(self, image_meta=None):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        image_meta = image_meta or self.image_meta
+        fetched = self.cache.fetch(self.context, self.image_service,
+                                   image_meta['id'], image_meta, path)
+        with open(path, 'rb') as f:
+            return fetched, f.read()
+
+    def _start_image_server(self, ranges=True):
+        server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0),
+                                           FakeImageServerHandler)
+        server.data = self.data
+        server.ranges = ranges
+        server.failing_ranges = []
+        server.requests = []
+        thread = eventlet.spawn(server.serve_forever, 0.01)
+        self.addCleanup(thread.wait)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def _start_glance(self, ranges=True):
+        server = self._start_image_server(ranges)
+        self.flags(glance_api_version=2,
+                   glance_api_servers=['127.0.0.1:%d' % server.server_port])
+        return server
+
+    def test_get_cache_disabled(self):
+        self.flags(image_data_cache_max_size_gb=0)
+        self.assertIsNone(data_cache.get_cache())
+
+    def test_get_cache(self):
+        self.assertIs(self.cache, data_cache.get_cache())
+        self.assertEqual(units.Gi, self.cache.max_size)
+
+    def test_fetch(self):
+        self.assertEqual((True, self.data), self._fetch())
+        self.assertEqual((True, self.data), self._fetch())
+        self.assertEqual(1, self.image_service.download.call_count)
+        self.assertEqual(['image-1-%s' % self.image_meta['checksum']],
+                         os.listdir(self.cache_dir))
+
+    def test_fetch_same_checksum(self):
+        self._fetch()
+        self._fetch(dict(self.image_meta, id='image-2'))
+        self.assertEqual(2, self.image_service.download.call_count)
+
+    def test_fetch_not_cacheable(self):
+        for image_meta in (dict(self.image_meta, checksum=None),
+                           dict(self.image_meta, size=2 * units.Gi)):
+            self.assertEqual((False, b''), self._fetch(image_meta))
+        self.assertFalse(self.image_service.download.called)
+
+    def test_fetch_checksum_mismatch(self):
+        image_meta = dict(self.image_meta, checksum='bad')
+        self.assertRaises(exception.ImageUnacceptable, self._fetch,
+                          image_meta)
+        self.assertEqual([], os.listdir(self.cache_dir))
+
+    def test_fetch_concurrent(self):
+        def slow_download(context, image_id, data=None):
+            eventlet.sleep(0.1)
+            data.write(self.data)
+
+        self.image_service.download.side_effect = slow_download
+        threads = [eventlet.spawn(self._fetch) for _i in range(5)]
+        for thread in threads:
+            self.assertEqual((True, self.data), thread.wait())
+        self.assertEqual(1, self.image_service.download.call_count)
+
+    def test_evict_lru(self):
+        def entry(image_meta):
+            return '%(id)s-%(checksum)s' % image_meta
+
+        self.cache.max_size = 2 * len(self.data)
+        images = []
+        for i in range(3):
+            data = self.data[:-1] + bytes(bytearray([i]))
+            images.append(dict(self.image_meta, id='image-%d' % i,
+                               checksum=hashlib.md5(data).hexdigest()))
+            self.image_service.download.side_effect = (
+                lambda context, image_id, f, data=data: f.write(data))
+            self._fetch(images[i])
+            # Make sure the modification times differ.
+            os.utime(os.path.join(self.cache_dir, entry(images[i])), (i, i))
+            if i == 1:
+                # Using the first image makes the second one the oldest.
+                self._fetch(images[0])
+                os.utime(os.path.join(self.cache_dir, entry(images[0])),
+                         (2, 2))
+
+        self.assertEqual(sorted([entry(images[0]), entry(images[2])]),
+                         sorted(os.listdir(self.cache_dir)))
+
+    def test_download_ranges(self):
+        self.flags(image_download_range_size_mb=1, image_download_ranges=3)
+        self.data = os.urandom(3 * units.Mi + 10)
+        self.image_meta.update(size=len(self.data),
+                               checksum=hashlib.md5(self.data).hexdigest())
+        server = self._start_glance()
+
+        self.assertEqual((True, self.data), self._fetch())
+
+        self.assertFalse(self.image_service.download.called)
+        path = '/v2/images/image-1/file'
+        self.assertEqual((path, 'bytes=0-1048575', 'token'),
+                         server.requests[0])
+        self.assertEqual([(path, 'bytes=1048576-2097151', 'token'),
+                          (path, 'bytes=2097152-3145727', 'token'),
+                          (path, 'bytes=3145728-3145737', 'token')],
+                         sorted(server.requests[1:]))
+
+    def test_download_ranges_failure(self):
+        self.flags(image_download_range_size_mb=1, image_download_ranges=3)
+        self.data = os.urandom(3 * units.Mi + 10)
+        self.image_meta.update(size=len(self.data),
+                               checksum=hashlib.md5(self.data).hexdigest())
+        server = self._start_glance()
+        server.failing_ranges = [units.Mi]
+
+        # The image is downloaded again without ranges.
+        self.assertEqual((True, self.data), self._fetch())
+
+        self.assertEqual(1, self.image_service.download.call_count)
+        self.assertEqual(4, len(server.requests))
+
+    def test_download_ranges_not_supported(self):
+        server = self._start_glance(ranges=False)
+
+        self.assertEqual((True, self.data), self._fetch())
+
+        self.assertEqual(1, self.image_service.download.call_count)
+        self.assertEqual(1, len(server.requests))
+
+    def test_download_ranges_glance_v1(self):
+        server = self._start_glance()
+        self.flags(glance_api_version=1)
+
+        self.assertEqual((True, self.data), self._fetch())
+
+        self.assertEqual(1, self.image_service.download.call_count)
+        self.assertEqual([], server.requests)
+
+    def test_download_ranges_not_from_locations(self):
+        glance = self._start_glance()
+        store = self._start_image_server()
+        url = 'http://127.0.0.1:%d/image-1' % store.server_port
+        self.image_service.get_location.return_value = (url, [{'url': url}])
+        self.flags(allowed_direct_url_schemes=['http'])
+
+        self.assertEqual((True, self.data), self._fetch())
+
+        self.assertEqual([], store.requests)
+        self.assertEqual(1, len(glance.requests))
@@ -17,11 +17,13 @@ Tests For Filter Scheduler.
 """
 
 import mock
+from oslo_utils import timeutils
 
 from cinder import context
 from cinder import exception
 from cinder.scheduler import filter_scheduler
 from cinder.scheduler import host_manager
+from cinder.tests.unit import fake_volume
 from cinder.tests.unit.scheduler import fakes
 from cinder.tests.unit.scheduler import test_scheduler
 from cinder.volume import utils
@@ -192,6 +194,125 @@ class FilterSchedulerTestCase(test_scheduler.SchedulerTestCase):
         self.assertIsNotNone(weighed_host.obj)
         self.assertTrue(_mock_service_get_all_by_topic.called)
 
+    @mock.patch('cinder.scheduler.driver.volume_update_db')
+    @mock.patch('cinder.db.service_get_all_by_topic')
+    def test_schedule_create_volumes(self, _mock_service_get_all_by_topic,
+                                     _mock_volume_update_db):
+        fake_context = context.RequestContext('user', 'project',
+                                              is_admin=True)
+        fakes.mock_host_manager_db_calls(_mock_service_get_all_by_topic)
+
+        def _request_spec(volume_id, size):
+            return {'volume_id': volume_id,
+                    'volume_type': {'name': 'LVM_iSCSI'},
+                    'volume_properties': {'project_id': 1,
+                                          'size': size}}
+
+        sizes = [300, 300, 300, 50, 300, 300]
+        request_spec_list = [_request_spec('fake-id%d' % i, size)
+                             for i, size in enumerate(sizes)]
+
+        def _fake_scheduler():
+            sched = fakes.FakeFilterScheduler()
+            sched.host_manager = fakes.FakeHostManager()
+            sched.volume_rpcapi = mock.Mock()
+            # Capabilities must be older than the consumed host states.
+            for capabilities in sched.host_manager.service_states.values():
+                capabilities['timestamp'] = timeutils.utcnow()
+            return sched
+
+        # Placing the volumes one by one gives the reference placements.
+        sched = _fake_scheduler()
+        expected = []
+        for request_spec in request_spec_list:
+            weighed_host = sched._schedule(fake_context,
+                                           dict(request_spec), {})
+            expected.append(weighed_host.obj.host)
+
+        sched = _fake_scheduler()
+        with mock.patch.object(sched.host_manager, 'get_all_host_states',
+                               wraps=sched.host_manager.get_all_host_states
+                               ) as mock_get_all_host_states:
+            results = sched.schedule_create_volumes(fake_context,
+                                                    request_spec_list,
+                                                    [{}] * len(sizes))
+
+        self.assertEqual(expected, results)
+        # The pipeline ran once per distinct request spec.
+        self.assertEqual(2, mock_get_all_host_states.call_count)
+        self.assertEqual(len(sizes), _mock_volume_update_db.call_count)
+        self.assertEqual(len(sizes),
+                         sched.volume_rpcapi.create_volume.call_count)
+
+    @mock.patch('cinder.scheduler.driver.volume_update_db')
+    @mock.patch('cinder.db.service_get_all_by_topic')
+    def test_schedule_create_volumes_cast_specs(
+            self, _mock_service_get_all_by_topic, _mock_volume_update_db):
+        sched = fakes.FakeFilterScheduler()
+        sched.host_manager = fakes.FakeHostManager()
+        sched.volume_rpcapi = mock.Mock()
+        fake_context = context.RequestContext('user', 'project',
+                                              is_admin=True)
+        fakes.mock_host_manager_db_calls(_mock_service_get_all_by_topic)
+
+        def _request_spec(i):
+            # Shaped like the specs VolumeCastTask sends.
+            volume_id = '00000000-0000-0000-0000-%012d' % i
+            return {'image_id': None, 'snapshot_id': None,
+                    'source_volid': None, 'source_replicaid': None,
+                    'consistencygroup_id': None, 'cgsnapshot_id': None,
+                    'volume_id': volume_id,
+                    'volume': fake_volume.fake_volume_obj(
+                        fake_context, id=volume_id,
+                        display_name='vol%d' % i),
+                    'volume_type': {'name': 'LVM_iSCSI'},
+                    'volume_properties': {
+                        'id': volume_id, 'display_name': 'vol%d' % i,
+                        'created_at': '2016-01-0%dT00:00:00' % (i + 1),
+                        'project_id': 1, 'user_id': 'user', 'size': 1,
+                        'availability_zone': 'zone1', 'metadata': {}}}
+
+        with mock.patch.object(sched, '_get_weighted_candidates',
+                               wraps=sched._get_weighted_candidates
+                               ) as mock_get_weighted_candidates:
+            results = sched.schedule_create_volumes(
+                fake_context, [_request_spec(0), _request_spec(1)],
+                [{'scheduler_hints': {'hint': 'value'}},
+                 {'scheduler_hints': {'hint': 'value'}}])
+
+        self.assertEqual(1, mock_get_weighted_candidates.call_count)
+        self.assertEqual(2, _mock_volume_update_db.call_count)
+        self.assertNotIsInstance(results[0], Exception)
+        self.assertNotIsInstance(results[1], Exception)
+
+    @mock.patch('cinder.scheduler.driver.volume_update_db')
+    @mock.patch('cinder.db.service_get_all_by_topic')
+    def test_schedule_create_volumes_no_valid_host(
+            self, _mock_service_get_all_by_topic, _mock_volume_update_db):
+        sched = fakes.FakeFilterScheduler()
+        sched.host_manager = fakes.FakeHostManager()
+        sched.volume_rpcapi = mock.Mock()
+        fake_context = context.RequestContext('user', 'project',
+                                              is_admin=True)
+        fakes.mock_host_manager_db_calls(_mock_service_get_all_by_topic)
+
+        # Only host1 fits one volume of this size in zone1, and then it no
+        # longer passes the CapacityFilter.
+        request_spec_list = [{'volume_id': 'fake-id%d' % i,
+                              'volume_type': {'name': 'LVM_iSCSI'},
+                              'volume_properties': {
+                                  'project_id': 1,
+                                  'size': 600,
+                                  'availability_zone': 'zone1'}}
+                             for i in range(2)]
+        results = sched.schedule_create_volumes(fake_context,
+                                                request_spec_list)
+
+        self.assertEqual('host1#lvm1', results[0])
+        self.assertIsInstance(results[1], exception.NoValidHost)
+        _mock_volume_update_db.assert_called_once_with(
+            fake_context, 'fake-id0', 'host1#lvm1')
+
     @mock.patch('cinder.db.service_get_all_by_topic')
     def test_create_volume_clear_host_different_with_cg(self,
                                                         _mock_service_get_all):
@@ -723,6 +723,44 @@ class AffinityFilterTestCase(HostFiltersTestCase):
 
         self.assertFalse(filt_cls.host_passes(host, filter_properties))
 
+    @mock.patch('cinder.volume.api.API.get_all')
+    def test_different_filter_volume_index(self, mock_get_all):
+        filt_cls = self.class_map['DifferentBackendFilter']()
+        host1 = fakes.FakeHostState('host1',
+                                    {'volumes': {fake.volume_id:
+                                                 fake.project_id}})
+        host2 = fakes.FakeHostState('host2', {'volumes': {}})
+
+        filter_properties = {'context': self.context.elevated(),
+                             'scheduler_hints': {
+            'different_host': [fake.volume_id], }}
+
+        self.assertFalse(filt_cls.host_passes(host1, filter_properties))
+        self.assertTrue(filt_cls.host_passes(host2, filter_properties))
+        self.assertFalse(mock_get_all.called)
+
+    @mock.patch('cinder.volume.api.API.get_all')
+    def test_same_filter_volume_index(self, mock_get_all):
+        filt_cls = self.class_map['SameBackendFilter']()
+        host1 = fakes.FakeHostState('host1',
+                                    {'volumes': {fake.volume_id:
+                                                 fake.project_id,
+                                                 fake.volume2_id:
+                                                 fake.project2_id}})
+        host2 = fakes.FakeHostState('host2', {'volumes': {}})
+
+        filter_properties = {'context': self.context.elevated(),
+                             'scheduler_hints': {
+            'same_host': [fake.volume_id], }}
+
+        self.assertTrue(filt_cls.host_passes(host1, filter_properties))
+        self.assertFalse(filt_cls.host_passes(host2, filter_properties))
+
+        # Volumes of other projects are not visible to the hint.
+        filter_properties['scheduler_hints']['same_host'] = [fake.volume2_id]
+        self.assertFalse(filt_cls.host_passes(host1, filter_properties))
+        self.assertFalse(mock_get_all.called)
+
 
 class DriverFilterTestCase(HostFiltersTestCase):
     def test_passing_function(self):
@@ -120,6 +120,206 @@ class HostManagerTestCase(test.TestCase):
                     'host3': host3_volume_capabs}
         self.assertDictMatch(expected, service_states)
 
+    def test_update_service_capabilities_delta(self):
+        full = {'volume_backend_name': 'lvm', 'driver_version': '1.0',
+                'pools': [{'pool_name': 'pool1', 'free_capacity_gb': 10},
+                          {'pool_name': 'pool2', 'free_capacity_gb': 20}]}
+        self.host_manager.update_service_capabilities('volume', 'host1',
+                                                      full, generation=1)
+
+        delta = {'changed': {'driver_version': '1.1'},
+                 'removed': [],
+                 'pools': {'pool2': {'pool_name': 'pool2',
+                                     'free_capacity_gb': 15},
+                           'pool3': {'pool_name': 'pool3',
+                                     'free_capacity_gb': 30}},
+                 'removed_pools': ['pool1']}
+        self.host_manager.update_service_capabilities('volume', 'host1',
+                                                      delta, generation=2,
+                                                      delta=True)
+
+        capabilities = self.host_manager.service_states['host1']
+        self.assertEqual('1.1', capabilities['driver_version'])
+        self.assertEqual('lvm', capabilities['volume_backend_name'])
+        self.assertEqual(
+            {'pool2': 15, 'pool3': 30},
+            dict((pool['pool_name'], pool['free_capacity_gb'])
+                 for pool in capabilities['pools']))
+        # The reported capabilities are not modified by the host states.
+        self.assertEqual([{'pool_name': 'pool1', 'free_capacity_gb': 10},
+                          {'pool_name': 'pool2', 'free_capacity_gb': 20}],
+                         full['pools'])
+
+    def test_update_service_capabilities_delta_out_of_order(self):
+        full = {'volume_backend_name': 'lvm', 'free_capacity_gb': 10}
+        delta = {'changed': {'free_capacity_gb': 5}}
+
+        # Nothing to apply the delta to.
+        self.host_manager.update_service_capabilities('volume', 'host1',
+                                                      delta, generation=2,
+                                                      delta=True)
+        self.assertNotIn('host1', self.host_manager.service_states)
+
+        self.host_manager.update_service_capabilities('volume', 'host1',
+                                                      full, generation=1)
+        # A report was missed, keep the last full one.
+        self.host_manager.update_service_capabilities('volume', 'host1',
+                                                      delta, generation=3,
+                                                      delta=True)
+        self.assertEqual(
+            10, self.host_manager.service_states['host1']['free_capacity_gb'])
+
+        # A full report resyncs the host.
+        self.host_manager.update_service_capabilities('volume', 'host1',
+                                                      full, generation=3)
+        self.host_manager.update_service_capabilities('volume', 'host1',
+                                                      delta, generation=4,
+                                                      delta=True)
+        self.assertEqual(
+            5, self.host_manager.service_states['host1']['free_capacity_gb'])
+
+    @mock.patch('cinder.db.service_get_all_by_topic')
+    @mock.patch('cinder.utils.service_is_up')
+    def test_update_host_state_map_unchanged(self, _mock_service_is_up,
+                                             _mock_service_get_all_by_topic):
+        context = 'fake_context'
+        _mock_service_is_up.return_value = True
+        _mock_service_get_all_by_topic.return_value = [
+            dict(id=1, host='host1', topic='volume', disabled=False,
+                 availability_zone='zone1', updated_at=timeutils.utcnow()),
+        ]
+        self.host_manager.update_service_capabilities(
+            'volume', 'host1', dict(volume_backend_name='AAA',
+                                    total_capacity_gb=512,
+                                    free_capacity_gb=200,
+                                    reserved_percentage=0))
+
+        with mock.patch.object(host_manager.HostState,
+                               'update_from_volume_capability',
+                               autospec=True,
+                               side_effect=host_manager.HostState.
+                               update_from_volume_capability) as mock_update:
+            self.host_manager.get_all_host_states(context)
+            self.assertEqual(1, mock_update.call_count)
+
+            # The service record is refreshed without rebuilding the pools.
+            _mock_service_get_all_by_topic.return_value[0][
+                'availability_zone'] = 'zone2'
+            pool = list(self.host_manager.get_all_host_states(context))[0]
+            self.assertEqual(1, mock_update.call_count)
+            self.assertEqual('zone2', pool.service['availability_zone'])
+
+            self.host_manager.update_service_capabilities(
+                'volume', 'host1', dict(volume_backend_name='AAA',
+                                        total_capacity_gb=512,
+                                        free_capacity_gb=100,
+                                        reserved_percentage=0))
+            pool = list(self.host_manager.get_all_host_states(context))[0]
+            self.assertEqual(2, mock_update.call_count)
+            self.assertEqual(100, pool.free_capacity_gb)
+
+    @mock.patch('cinder.db.service_get_all_by_topic')
+    @mock.patch('cinder.utils.service_is_up')
+    def test_update_host_state_map_heartbeat(self, _mock_service_is_up,
+                                             _mock_service_get_all_by_topic):
+        context = 'fake_context'
+        _mock_service_is_up.return_value = True
+        _mock_service_get_all_by_topic.return_value = [
+            dict(id=1, host='host1', topic='volume', disabled=False,
+                 availability_zone='zone1', updated_at=timeutils.utcnow()),
+        ]
+        self.host_manager.update_service_capabilities(
+            'volume', 'host1', dict(volume_backend_name='AAA',
+                                    total_capacity_gb=512,
+                                    free_capacity_gb=200,
+                                    reserved_percentage=0),
+            generation=1)
+        pool = list(self.host_manager.get_all_host_states(context))[0]
+        pool.consume_from_volume({'size': 10, 'project_id': 'project1'})
+        self.assertEqual(190, pool.free_capacity_gb)
+
+        # An empty delta re-applies the stored capabilities, replacing the
+        # estimate made when the volume was scheduled.
+        self.host_manager.update_service_capabilities(
+            'volume', 'host1', {'changed': {}, 'removed': [], 'pools': {},
+                                'removed_pools': []},
+            generation=2, delta=True)
+        pool = list(self.host_manager.get_all_host_states(context))[0]
+        self.assertEqual(200, pool.free_capacity_gb)
+
+    @mock.patch('cinder.db.service_get_all_by_topic')
+    @mock.patch('cinder.utils.service_is_up')
+    def test_service_cache(self, _mock_service_is_up,
+                           _mock_service_get_all_by_topic):
+        self.flags(scheduler_service_cache_ttl=30)
+        context = 'fake_context'
+        _mock_service_is_up.return_value = True
+        _mock_service_get_all_by_topic.return_value = [
+            dict(id=1, host='host1', topic='volume', disabled=False,
+                 availability_zone='zone1', updated_at=timeutils.utcnow()),
+        ]
+        self.host_manager.update_service_capabilities(
+            'volume', 'host1', dict(volume_backend_name='AAA',
+                                    total_capacity_gb=512,
+                                    free_capacity_gb=200,
+                                    reserved_percentage=0))
+        _mock_service_get_all_by_topic.reset_mock()
+        self.host_manager.service_cache_misses = 0
+
+        for i in range(3):
+            self.assertEqual(1, len(self.host_manager.get_pools(context)))
+        self.assertEqual(1, _mock_service_get_all_by_topic.call_count)
+        self.assertEqual({'hits': 2, 'misses': 1},
+                         self.host_manager.get_service_cache_stats())
+
+        # Reports from known, live services don't refresh the cache.
+        self.host_manager.update_service_capabilities(
+            'volume', 'host1', dict(volume_backend_name='AAA'))
+        self.host_manager.get_pools(context)
+        self.assertEqual(1, _mock_service_get_all_by_topic.call_count)
+
+        # The cache expires.
+        with mock.patch.object(timeutils, 'is_older_than',
+                               return_value=True):
+            self.host_manager.get_pools(context)
+        self.assertEqual(2, _mock_service_get_all_by_topic.call_count)
+        self.assertEqual({'hits': 3, 'misses': 2},
+                         self.host_manager.get_service_cache_stats())
+
+    @mock.patch('cinder.db.service_get_all_by_topic')
+    @mock.patch('cinder.utils.service_is_up')
+    def test_service_cache_new_service(self, _mock_service_is_up,
+                                       _mock_service_get_all_by_topic):
+        self.flags(scheduler_service_cache_ttl=30)
+        context = 'fake_context'
+        _mock_service_is_up.return_value = True
+        services = [
+            dict(id=1, host='host1', topic='volume', disabled=False,
+                 availability_zone='zone1', updated_at=timeutils.utcnow()),
+        ]
+        _mock_service_get_all_by_topic.return_value = services
+        self.host_manager.get_pools(context)
+
+        services.append(
+            dict(id=2, host='host2', topic='volume', disabled=False,
+                 availability_zone='zone1', updated_at=timeutils.utcnow()))
+        for host in ('host1', 'host2'):
+            self.host_manager.update_service_capabilities(
+                'volume', host, dict(volume_backend_name='AAA',
+                                     total_capacity_gb=512,
+                                     free_capacity_gb=200,
+                                     reserved_percentage=0))
+        # host2 was not in the cached list, so it is fetched again.
+        self.assertEqual(2, len(self.host_manager.get_pools(context)))
+
+    @mock.patch('cinder.db.service_get_all_by_topic')
+    def test_service_cache_disabled(self, _mock_service_get_all_by_topic):
+        _mock_service_get_all_by_topic.return_value = []
+        self.host_manager.get_pools('fake_context')
+        self.host_manager.get_pools('fake_context')
+        self.assertEqual(2, _mock_service_get_all_by_topic.call_count)
+        self.assertIsNone(self.host_manager._services)
+
     @mock.patch('cinder.utils.service_is_up')
     @mock.patch('cinder.db.service_get_all_by_topic')
     def test_has_all_capabilities(self, _mock_service_get_all_by_topic,
@@ -153,6 +353,69 @@ class HostManagerTestCase(test.TestCase):
                                                       host3_volume_capabs)
         self.assertTrue(self.host_manager.has_all_capabilities())
 
+    @mock.patch('cinder.db.volume_get_all_ids_by_host')
+    @mock.patch('cinder.db.service_get_all_by_topic')
+    @mock.patch('cinder.utils.service_is_up')
+    def test_volume_index(self, _mock_service_is_up,
+                          _mock_service_get_all_by_topic,
+                          _mock_volume_get_all_ids_by_host):
+        self.flags(scheduler_use_volume_index=True)
+        context = 'fake_context'
+        services = [
+            dict(id=1, host='host1', topic='volume', disabled=False,
+                 availability_zone='zone1', updated_at=timeutils.utcnow()),
+        ]
+        _mock_service_get_all_by_topic.return_value = services
+        _mock_service_is_up.return_value = True
+        _mock_volume_get_all_ids_by_host.return_value = [
+            ('vol1', 'host1#AAA', 'project1'),
+            ('vol2', 'host1#AAA', 'project2'),
+        ]
+        capabilities = dict(volume_backend_name='AAA',
+                            total_capacity_gb=512, free_capacity_gb=200,
+                            reserved_percentage=0)
+
+        # Pools are not indexed until their back end reports capabilities.
+        self.host_manager.service_states['host1'] = dict(
+            capabilities, timestamp=None)
+        pool = list(self.host_manager.get_all_host_states(context))[0]
+        self.assertIsNone(pool.volumes)
+
+        self.host_manager.update_service_capabilities('volume', 'host1',
+                                                      capabilities)
+        _mock_volume_get_all_ids_by_host.assert_called_once_with(
+            mock.ANY, 'host1')
+        pool = list(self.host_manager.get_all_host_states(context))[0]
+        self.assertEqual({'vol1': 'project1', 'vol2': 'project2'},
+                         pool.volumes)
+
+        # Scheduled volumes are added to the index and survive until the
+        # next capability report rebuilds it.
+        pool.consume_from_volume({'size': 1, 'project_id': 'project1'},
+                                 'vol3')
+        pool = list(self.host_manager.get_all_host_states(context))[0]
+        self.assertEqual('project1', pool.volumes['vol3'])
+
+        _mock_volume_get_all_ids_by_host.return_value = [
+            ('vol2', 'host1#AAA', 'project2'),
+        ]
+        self.host_manager.update_service_capabilities('volume', 'host1',
+                                                      capabilities)
+        pool = list(self.host_manager.get_all_host_states(context))[0]
+        self.assertEqual({'vol2': 'project2'}, pool.volumes)
+
+        # A back end that goes away is dropped from the index.
+        _mock_service_is_up.return_value = False
+        self.host_manager.get_all_host_states(context)
+        self.assertEqual({}, self.host_manager._volume_index)
+        self.assertEqual(set(), self.host_manager._indexed_hosts)
+
+    @mock.patch('cinder.db.volume_get_all_ids_by_host')
+    def test_volume_index_disabled(self, _mock_volume_get_all_ids_by_host):
+        self.host_manager.update_service_capabilities(
+            'volume', 'host1', dict(free_capacity_gb=4321))
+        self.assertFalse(_mock_volume_get_all_ids_by_host.called)
+
     @mock.patch('cinder.db.service_get_all_by_topic')
     @mock.patch('cinder.utils.service_is_up')
     @mock.patch('oslo_utils.timeutils.utcnow')
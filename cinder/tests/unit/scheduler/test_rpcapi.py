@@ -84,6 +84,49 @@ class SchedulerRpcAPITestCase(test.TestCase):
                                  fanout=True,
                                  version='1.0')
 
+    @mock.patch('oslo_messaging.RPCClient.can_send_version',
+                return_value=True)
+    def test_update_service_capabilities_generation(self, can_send_version):
+        self._test_scheduler_api('update_service_capabilities',
+                                 rpc_method='cast',
+                                 service_name='fake_name',
+                                 host='fake_host',
+                                 capabilities='fake_capabilities',
+                                 generation=1,
+                                 fanout=True,
+                                 version='1.13')
+        can_send_version.assert_called_once_with('1.13')
+
+    @mock.patch('oslo_messaging.RPCClient.can_send_version',
+                return_value=True)
+    def test_update_service_capabilities_delta(self, can_send_version):
+        ctxt = context.RequestContext('fake_user', 'fake_project')
+        rpcapi = scheduler_rpcapi.SchedulerAPI()
+        with mock.patch.object(rpcapi.client, 'prepare') as mock_prepare:
+            rpcapi.update_service_capabilities(
+                ctxt, 'fake_name', 'fake_host', 'fake_capabilities',
+                generation=2, delta='fake_delta')
+        mock_prepare.assert_called_once_with(fanout=True, version='1.13')
+        mock_prepare.return_value.cast.assert_called_once_with(
+            ctxt, 'update_service_capabilities', service_name='fake_name',
+            host='fake_host', capabilities='fake_delta', generation=2,
+            delta=True)
+
+    @mock.patch('oslo_messaging.RPCClient.can_send_version',
+                return_value=False)
+    def test_update_service_capabilities_old(self, can_send_version):
+        ctxt = context.RequestContext('fake_user', 'fake_project')
+        rpcapi = scheduler_rpcapi.SchedulerAPI()
+        with mock.patch.object(rpcapi.client, 'prepare') as mock_prepare:
+            rpcapi.update_service_capabilities(
+                ctxt, 'fake_name', 'fake_host', 'fake_capabilities',
+                generation=2, delta='fake_delta')
+        # Older schedulers get the full capabilities.
+        mock_prepare.assert_called_once_with(fanout=True, version='1.0')
+        mock_prepare.return_value.cast.assert_called_once_with(
+            ctxt, 'update_service_capabilities', service_name='fake_name',
+            host='fake_host', capabilities='fake_capabilities')
+
     @mock.patch('oslo_messaging.RPCClient.can_send_version',
                 return_value=True)
     def test_create_volume(self, can_send_version):
@@ -114,6 +157,14 @@ class SchedulerRpcAPITestCase(test.TestCase):
                                  version='1.2')
         can_send_version.assert_called_once_with('1.9')
 
+    def test_create_volumes(self):
+        self._test_scheduler_api('create_volumes',
+                                 rpc_method='call',
+                                 topic='topic',
+                                 request_spec_list=['fake_request_spec'],
+                                 filter_properties_list=['filter_properties'],
+                                 version='1.12')
+
     @mock.patch('oslo_messaging.RPCClient.can_send_version',
                 return_value=True)
     def test_migrate_volume_to_host(self, can_send_version):
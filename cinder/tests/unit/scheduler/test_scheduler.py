@@ -95,7 +95,9 @@ class SchedulerManagerTestCase(test.TestCase):
         self.manager.update_service_capabilities(self.context,
                                                  service_name=service,
                                                  host=host)
-        _mock_update_cap.assert_called_once_with(service, host, {})
+        _mock_update_cap.assert_called_once_with(service, host, {},
+                                                 generation=None,
+                                                 delta=False)
 
     @mock.patch('cinder.scheduler.driver.Scheduler.'
                 'update_service_capabilities')
@@ -109,7 +111,25 @@ class SchedulerManagerTestCase(test.TestCase):
                                                  service_name=service,
                                                  host=host,
                                                  capabilities=capabilities)
-        _mock_update_cap.assert_called_once_with(service, host, capabilities)
+        _mock_update_cap.assert_called_once_with(service, host, capabilities,
+                                                 generation=None,
+                                                 delta=False)
+
+    @mock.patch('cinder.scheduler.driver.Scheduler.'
+                'update_service_capabilities')
+    def test_update_service_capabilities_delta(self, _mock_update_cap):
+        service = 'fake_service'
+        host = 'fake_host'
+        delta = {'changed': {'fake_capability': 'fake_value'}}
+
+        self.manager.update_service_capabilities(self.context,
+                                                 service_name=service,
+                                                 host=host,
+                                                 capabilities=delta,
+                                                 generation=2,
+                                                 delta=True)
+        _mock_update_cap.assert_called_once_with(service, host, delta,
+                                                 generation=2, delta=True)
 
     @mock.patch('cinder.scheduler.driver.Scheduler.schedule_create_volume')
     @mock.patch('cinder.db.volume_update')
@@ -132,6 +152,27 @@ class SchedulerManagerTestCase(test.TestCase):
         _mock_sched_create.assert_called_once_with(self.context, request_spec,
                                                    {})
 
+    @mock.patch('cinder.scheduler.driver.Scheduler.schedule_create_volumes')
+    @mock.patch('cinder.db.volume_update')
+    def test_create_volumes(self, _mock_volume_update, _mock_sched_create):
+        request_spec_list = [{'volume_id': 'fake-id1'},
+                             {'volume_id': 'fake-id2'}]
+        _mock_sched_create.return_value = [
+            'host1#pool1', exception.NoValidHost(reason="")]
+
+        placements = self.manager.create_volumes(self.context, self.topic,
+                                                 request_spec_list)
+
+        self.assertEqual([{'volume_id': 'fake-id1', 'host': 'host1#pool1'},
+                          {'volume_id': 'fake-id2', 'host': None}],
+                         placements)
+        _mock_sched_create.assert_called_once_with(self.context,
+                                                   request_spec_list, None)
+        # Only the volume that could not be placed is put in error.
+        _mock_volume_update.assert_called_once_with(self.context,
+                                                    'fake-id2',
+                                                    {'status': 'error'})
+
     @mock.patch('cinder.scheduler.driver.Scheduler.schedule_create_volume')
     @mock.patch('eventlet.sleep')
     def test_create_volume_no_delay(self, _mock_sleep, _mock_sched_create):
@@ -104,3 +104,20 @@ class VolumeNumberWeigherTestCase(test.TestCase):
             self.assertEqual(1.0, weighed_host.weight)
             self.assertEqual('host5',
                              utils.extract_host(weighed_host.obj.host))
+
+    def test_volume_number_weight_volume_index(self):
+        self.flags(volume_number_multiplier=-1.0)
+        hostinfo_list = self._get_all_hosts()
+        for hostinfo in hostinfo_list:
+            count = fake_volume_data_get_for_host(self.context,
+                                                  hostinfo.host)
+            hostinfo.volumes = dict(('vol%d' % i, 'fake_project')
+                                    for i in range(count))
+
+        # The index is used instead of the database, so host1 wins with
+        # the fewest indexed volumes.
+        with mock.patch.object(api, 'volume_data_get_for_host') as mock_get:
+            weighed_host = self._get_weighed_host(hostinfo_list)
+            self.assertFalse(mock_get.called)
+        self.assertEqual(0.0, weighed_host.weight)
+        self.assertEqual('host1', utils.extract_host(weighed_host.obj.host))
@@ -10,11 +10,13 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import eventlet
 import mock
 from oslo_concurrency import processutils as putils
 
 from cinder import context
 from cinder import exception
+from cinder import test
 from cinder.tests.unit.targets import targets_fixture as tf
 from cinder import utils
 from cinder.volume.targets import lio
@@ -335,3 +337,79 @@ class TestLioAdmDriver(tf.TargetDriverFixture):
             (mock.sentinel.user, mock.sentinel.pwd),
             portals_ips=[self.configuration.iscsi_ip_address],
             portals_port=self.configuration.iscsi_port)
+
+    @mock.patch.object(lio.LioAdm, '_execute')
+    def test_persist_configuration(self, mock_execute):
+        self.target._persist_configuration(self.fake_volume_id)
+
+        mock_execute.assert_called_once_with('cinder-rtstool', 'save',
+                                             run_as_root=True)
+
+    @mock.patch.object(lio, 'LOG')
+    @mock.patch.object(lio.LioAdm, '_execute',
+                       side_effect=putils.ProcessExecutionError)
+    def test_persist_configuration_failure(self, mock_execute, mock_log):
+        self.target._persist_configuration(self.fake_volume_id)
+
+        self.assertTrue(mock_log.warning.called)
+
+
+class TestSaveCoalescer(test.TestCase):
+
+    def setUp(self):
+        super(TestSaveCoalescer, self).setUp()
+        self.saved = []
+        self.coalescer = lio.SaveCoalescer(self._save)
+
+    def _save(self):
+        self.saved.append(self.coalescer.changes)
+        # Let the other changes be made while the configuration is saved.
+        eventlet.sleep(0.01)
+
+    def _persist_concurrently(self, count, persist=None):
+        threads = [eventlet.spawn(persist or self.coalescer.persist)
+                   for _i in range(count)]
+        for thread in threads:
+            thread.wait()
+
+    def test_persist(self):
+        self.coalescer.persist()
+        self.coalescer.persist()
+
+        self.assertEqual([1, 2], self.saved)
+        self.assertEqual(0, self.coalescer.coalesced)
+
+    def test_persist_concurrent_changes(self):
+        self._persist_concurrently(5)
+
+        # The first change is saved alone, the changes made during that save
+        # are saved together by the next one.
+        self.assertEqual([1, 5], self.saved)
+        self.assertEqual(2, self.coalescer.saves)
+        self.assertEqual(3, self.coalescer.coalesced)
+
+    def test_persist_window(self):
+        self.coalescer._window = 0.01
+
+        self._persist_concurrently(5)
+
+        self.assertEqual([5], self.saved)
+        self.assertEqual(4, self.coalescer.coalesced)
+
+    def test_persist_failure(self):
+        self.coalescer._save = mock.Mock(
+            side_effect=putils.ProcessExecutionError)
+        self.coalescer._window = 0.01
+        errors = []
+
+        def persist():
+            try:
+                self.coalescer.persist()
+            except putils.ProcessExecutionError as error:
+                errors.append(error)
+
+        self._persist_concurrently(2, persist)
+
+        self.assertEqual(2, len(errors))
+        self.coalescer._save.assert_called_once_with()
+        self.assertIsNone(self.coalescer._pending)
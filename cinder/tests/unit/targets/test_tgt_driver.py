@@ -98,11 +98,42 @@ class TestTgtAdmDriver(tf.TargetDriverFixture):
 
         # Test the failure case
         bad_scan = self.fake_iscsi_scan.replace('LUN: 1', 'LUN: 3')
+        self.target._targets_time = None
 
         with mock.patch('cinder.utils.execute',
                         return_value=(bad_scan, None)):
             self.assertFalse(self.target._verify_backing_lun(iqn, '1'))
 
+    def test_parse_targets(self):
+        other_vol = self.iscsi_target_prefix + 'volume-other'
+        scan = (self.fake_iscsi_scan +
+                self.fake_iscsi_scan.replace('Target 1: ', 'Target 12: ')
+                .replace(self.test_vol, other_vol)
+                .replace('        LUN: 1\n', ''))
+
+        self.assertEqual({self.test_vol: ('1', set([0, 1])),
+                          other_vol: ('12', set([0]))},
+                         self.target._parse_targets(scan))
+
+    @mock.patch('cinder.utils.execute')
+    def test_lookup_target_cached(self, mock_execute):
+        mock_execute.return_value = (self.fake_iscsi_scan, None)
+        iqn = self.test_vol
+
+        self.assertEqual('1', self.target._get_target(iqn))
+        self.assertTrue(self.target._verify_backing_lun(iqn, '1'))
+        mock_execute.assert_called_once_with('tgt-admin', '--show',
+                                             run_as_root=True)
+
+        # Targets which are not cached are looked up again.
+        self.assertIsNone(self.target._get_target(iqn + 'x'))
+        self.assertEqual(2, mock_execute.call_count)
+
+        # And so are all the targets after TARGETS_TTL seconds.
+        self.target._targets_time -= self.target.TARGETS_TTL
+        self.assertEqual('1', self.target._get_target(iqn))
+        self.assertEqual(3, mock_execute.call_count)
+
     @mock.patch.object(time, 'sleep')
     @mock.patch('cinder.utils.execute')
     def test_recreate_backing_lun(self, mock_execute, mock_sleep):
@@ -156,6 +187,33 @@ class TestTgtAdmDriver(tf.TargetDriverFixture):
                     0,
                     self.fake_volumes_dir))
 
+    @mock.patch('cinder.utils.execute')
+    def test_create_iscsi_target_shown(self, mock_execute):
+        other_vol = self.iscsi_target_prefix + 'volume-other'
+        other_scan = (self.fake_iscsi_scan.replace('Target 1: ', 'Target 2: ')
+                      .replace(self.test_vol, other_vol))
+        mock_execute.return_value = (other_scan, None)
+        self.assertEqual('2', self.target._get_target(other_vol))
+        other_target = self.target._targets[other_vol]
+        targets_time = self.target._targets_time
+
+        # Only the new target is parsed, the others are kept.
+        mock_execute.reset_mock()
+        mock_execute.return_value = (other_scan + self.fake_iscsi_scan, None)
+        self.assertEqual('1',
+                         self.target.create_iscsi_target(
+                             self.test_vol, 1, 0, self.fake_volumes_dir))
+        mock_execute.assert_has_calls([
+            mock.call('tgt-admin', '--update', self.test_vol,
+                      run_as_root=True),
+            mock.call('tgt-admin', '--show', run_as_root=True)])
+        self.assertEqual(2, mock_execute.call_count)
+        self.assertEqual({self.test_vol: ('1', set([0, 1])),
+                          other_vol: ('2', set([0, 1]))},
+                         self.target._targets)
+        self.assertIs(other_target, self.target._targets[other_vol])
+        self.assertEqual(targets_time, self.target._targets_time)
+
     def test_create_iscsi_target_content(self):
 
         self.iscsi_target_flags = 'foo'
@@ -295,6 +353,30 @@ class TestTgtAdmDriver(tf.TargetDriverFixture):
                          self.target.initialize_connection(self.testvol,
                                                            connector))
 
+    @mock.patch('cinder.utils.execute')
+    @mock.patch.object(os.path, 'exists', return_value=True)
+    @mock.patch.object(os.path, 'isfile', return_value=True)
+    @mock.patch.object(os, 'unlink')
+    def test_remove_iscsi_target_cached(self, mock_unlink, mock_isfile,
+                                        mock_path_exists, mock_execute):
+        iqn = self.iscsi_target_prefix + self.testvol['name']
+        mock_execute.return_value = (
+            self.fake_iscsi_scan.replace(self.test_vol, iqn), None)
+        self.assertEqual('1', self.target._get_target(iqn))
+        mock_execute.reset_mock()
+        mock_execute.return_value = ('', None)
+
+        self.target.remove_iscsi_target(0, 1, self.testvol['id'],
+                                        self.testvol['name'])
+
+        # The removed target is shown again to check it is gone.
+        mock_execute.assert_has_calls([
+            mock.call('tgt-admin', '--force', '--delete', iqn,
+                      run_as_root=True),
+            mock.call('tgt-admin', '--show', run_as_root=True)])
+        self.assertEqual(2, mock_execute.call_count)
+        self.assertEqual({}, self.target._targets)
+
     @mock.patch('cinder.utils.execute')
     @mock.patch.object(tgt.TgtAdm, '_get_target')
     @mock.patch.object(os.path, 'exists')
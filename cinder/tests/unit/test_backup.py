@@ -669,6 +669,31 @@ class BackupTestCase(BaseBackupTest):
         self.assertEqual(fields.BackupStatus.AVAILABLE, backup['status'])
         self.assertTrue(mock_run_restore.called)
 
+    def test_restore_backup_cancelled(self):
+        """Test that a cancelled restore leaves the backup status alone."""
+        vol_id = self._create_volume_db_entry(status='restoring-backup',
+                                              size=1)
+        backup = self._create_backup_db_entry(
+            status=fields.BackupStatus.RESTORING, volume_id=vol_id)
+
+        def _delete_backup(*args):
+            db.backup_update(self.ctxt, backup.id,
+                             {'status': fields.BackupStatus.DELETING})
+            raise exception.BackupRestoreCancel(back_id=backup.id,
+                                                vol_id=vol_id)
+
+        self.mock_object(self.backup_mgr, '_run_restore',
+                         mock.Mock(side_effect=_delete_backup))
+        self.assertRaises(exception.BackupRestoreCancel,
+                          self.backup_mgr.restore_backup,
+                          self.ctxt,
+                          backup,
+                          vol_id)
+        vol = db.volume_get(self.ctxt, vol_id)
+        self.assertEqual('error_restoring', vol['status'])
+        backup = db.backup_get(self.ctxt, backup.id)
+        self.assertEqual(fields.BackupStatus.DELETING, backup['status'])
+
     @mock.patch('cinder.utils.brick_get_connector_properties')
     def test_restore_backup_with_old_volume_service(self, mock_get_conn):
         """Test error handling when an error occurs during backup restore."""
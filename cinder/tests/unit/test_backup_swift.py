@@ -47,8 +47,11 @@ CONF = cfg.CONF
 ANY = mock.ANY
 
 
-def fake_md5(arg):
+def fake_md5(arg=None):
     class result(object):
+        def update(self, data):
+            pass
+
         def hexdigest(self):
             return 'fake-md5-sum'
 
@@ -791,3 +794,79 @@ class BackupSwiftTestCase(test.TestCase):
 
         self.assertEqual('none', result[0])
         self.assertEqual(already_compressed_data, result[1])
+
+    def test_object_writer(self):
+        conn = mock.Mock()
+        uploaded = []
+
+        def put_object(container, object_name, reader, content_length=None):
+            uploaded.append(reader.read(4).tobytes())
+            uploaded.append(reader.read())
+            return 'fake-md5-sum'
+
+        conn.put_object.side_effect = put_object
+
+        with swift_dr.SwiftBackupDriver.SwiftObjectWriter(
+                'container', 'object', conn) as writer:
+            for data in (b'header', b'', bytearray(b'chunk data')):
+                writer.write(data)
+
+        conn.put_object.assert_called_once_with('container', 'object',
+                                                mock.ANY, content_length=16)
+        self.assertEqual([b'head', b'erchunk data'], uploaded)
+        self.assertEqual([], writer.data)
+
+    def test_object_writer_md5_mismatch(self):
+        conn = mock.Mock()
+        conn.put_object.return_value = 'bad-md5-sum'
+        writer = swift_dr.SwiftBackupDriver.SwiftObjectWriter(
+            'container', 'object', conn)
+        writer.write(b'data')
+
+        self.assertRaises(exception.InvalidBackup, writer.close)
+
+
+class BuffersReaderTestCase(test.TestCase):
+
+    def setUp(self):
+        super(BuffersReaderTestCase, self).setUp()
+        self.buffers = [b'abc', b'', bytearray(b'defgh'), b'ij']
+        self.reader = swift_dr.BuffersReader(self.buffers)
+
+    def _read_all(self, size):
+        chunks = []
+        while True:
+            chunk = self.reader.read(size)
+            if not len(chunk):
+                return chunks
+            chunks.append(chunk.tobytes())
+
+    def test_read(self):
+        self.assertEqual([b'ab', b'c', b'de', b'fg', b'h', b'ij'],
+                         self._read_all(2))
+        self.assertEqual(10, self.reader.tell())
+
+    def test_read_does_not_copy(self):
+        self.reader.seek(3)
+        chunk = self.reader.read(2)
+        self.buffers[2][0] = ord('x')
+
+        self.assertEqual(b'xe', chunk.tobytes())
+
+    def test_read_all(self):
+        self.reader.read(1)
+
+        self.assertEqual(b'bcdefghij', self.reader.read())
+        self.assertEqual(b'', self.reader.read())
+        self.assertEqual(b'', self.reader.read(1))
+
+    def test_seek(self):
+        self._read_all(4)
+
+        self.assertEqual(4, self.reader.seek(4))
+        self.assertEqual(4, self.reader.tell())
+        self.assertEqual([b'efgh', b'ij'], self._read_all(4))
+        self.assertEqual(8, self.reader.seek(-2, os.SEEK_CUR))
+        self.assertEqual(b'ij', self.reader.read())
+        self.assertEqual(3, self.reader.seek(-7, os.SEEK_END))
+        self.assertEqual(b'defghij', self.reader.read())
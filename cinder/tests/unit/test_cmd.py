@@ -11,6 +11,7 @@
 #    under the License.
 
 import datetime
+import json
 import six
 import sys
 
@@ -665,6 +666,61 @@ class TestCinderManageCmd(test.TestCase):
                                                    None, None, None)
             self.assertEqual(expected_out, fake_out.getvalue())
 
+    @mock.patch('cinder.volume.api.API.prewarm_image_cache')
+    @mock.patch('cinder.rpc.initialized', return_value=True)
+    @mock.patch('cinder.context.get_admin_context')
+    def test_image_cache_commands_prewarm(self, get_admin_context,
+                                          rpc_initialized, prewarm):
+        ctxt = context.RequestContext('fake-user', 'fake-project',
+                                      is_admin=True)
+        get_admin_context.return_value = ctxt
+        hosts = ['host1@lvm', 'host2@lvm#pool']
+
+        image_cache_cmds = cinder_manage.ImageCacheCommands()
+        self.assertIsNone(image_cache_cmds.prewarm(['image-1', 'image-2'],
+                                                   hosts))
+
+        prewarm.assert_has_calls([mock.call(ctxt, 'image-1', hosts),
+                                  mock.call(ctxt, 'image-2', hosts)])
+
+    @mock.patch('cinder.volume.api.API.prewarm_image_cache')
+    @mock.patch('cinder.rpc.initialized', return_value=True)
+    @mock.patch('cinder.context.get_admin_context')
+    def test_image_cache_commands_prewarm_failure(self, get_admin_context,
+                                                  rpc_initialized, prewarm):
+        get_admin_context.return_value = context.RequestContext(
+            'fake-user', 'fake-project', is_admin=True)
+        prewarm.side_effect = exception.ServiceNotFound(service_id='host1')
+
+        image_cache_cmds = cinder_manage.ImageCacheCommands()
+        with mock.patch('sys.stdout', new=six.StringIO()):
+            self.assertEqual(2, image_cache_cmds.prewarm(['image-1'],
+                                                         ['host1@lvm']))
+
+    @mock.patch('cinder.db.image_volume_cache_get_all')
+    @mock.patch('cinder.context.get_admin_context')
+    def test_image_cache_commands_list(self, get_admin_context, get_all):
+        ctxt = context.RequestContext('fake-user', 'fake-project')
+        get_admin_context.return_value = ctxt
+        last_used = datetime.datetime(2016, 10, 1, 12, 0, 0)
+        get_all.return_value = [{'host': 'host1@lvm#pool',
+                                 'image_id': 'image-1',
+                                 'volume_id': 'volume-1',
+                                 'size': 1,
+                                 'last_used': last_used}]
+
+        with mock.patch('sys.stdout', new=six.StringIO()) as fake_out:
+            image_cache_cmds = cinder_manage.ImageCacheCommands()
+            image_cache_cmds.list(image='image-1', host='host1')
+
+        get_all.assert_called_once_with(ctxt, image_id='image-1',
+                                        host='host1')
+        header = "%-40s\t%-36s\t%-36s\t%-6s\t%-20s" % (
+            'Host', 'Image ID', 'Volume ID', 'Size', 'Last Used')
+        entry = "%-40s\t%-36s\t%-36s\t%-6d\t%-20s" % (
+            'host1@lvm#pool', 'image-1', 'volume-1', 1, last_used)
+        self.assertEqual(header + '\n' + entry + '\n', fake_out.getvalue())
+
     @mock.patch('cinder.utils.service_is_up')
     @mock.patch('cinder.db.service_get_all')
     @mock.patch('cinder.context.get_admin_context')
@@ -1263,6 +1319,90 @@ class TestCinderRtstoolCmd(test.TestCase):
                           cinder_rtstool.restore_from_file,
                           mock.sentinel.filename)
 
+    @mock.patch.object(cinder_rtstool, 'add_initiator', autospec=True)
+    @mock.patch.object(cinder_rtstool, 'create', autospec=True)
+    def test_bulk(self, create, add_initiator):
+        operations = [
+            {'op': 'create', 'backing_device': '/dev/vg/volume-1',
+             'name': 'target-1', 'userid': 'user', 'password': 'pass',
+             'iser_enabled': 'False'},
+            {'op': 'create', 'backing_device': '/dev/vg/volume-2',
+             'name': 'target-2', 'userid': 'user', 'password': 'pass',
+             'iser_enabled': True, 'portals_ips': '10.0.0.1,10.0.0.2',
+             'portals_port': '3261'},
+            {'op': 'create', 'backing_device': '/dev/vg/volume-3',
+             'name': 'target-3', 'userid': 'user', 'password': 'pass',
+             'iser_enabled': 'False', 'portals_ips': ['10.0.0.1'],
+             'portals_port': 3262},
+            {'op': 'add-initiator', 'target_iqn': 'target-1',
+             'initiator_iqn': 'initiator-1', 'userid': 'user',
+             'password': 'pass'}]
+        stdin = six.StringIO(json.dumps(operations))
+
+        with mock.patch('sys.stdin', new=stdin), \
+                mock.patch('sys.stdout', new=six.StringIO()):
+            cinder_rtstool.bulk(None)
+
+        create.assert_has_calls([
+            mock.call(backing_device='/dev/vg/volume-1', name='target-1',
+                      userid='user', password='pass', iser_enabled='False'),
+            mock.call(backing_device='/dev/vg/volume-2', name='target-2',
+                      userid='user', password='pass', iser_enabled='True',
+                      portals_ips=['10.0.0.1', '10.0.0.2'],
+                      portals_port=3261),
+            mock.call(backing_device='/dev/vg/volume-3', name='target-3',
+                      userid='user', password='pass', iser_enabled='False',
+                      portals_ips=['10.0.0.1'], portals_port=3262)])
+        self.assertEqual(3, create.call_count)
+        add_initiator.assert_called_once_with(target_iqn='target-1',
+                                              initiator_iqn='initiator-1',
+                                              userid='user', password='pass')
+
+    @mock.patch.object(cinder_rtstool, 'create')
+    def test_bulk_with_file(self, create):
+        with mock.patch('six.moves.builtins.open',
+                        mock.mock_open(read_data='[]')) as mock_open, \
+                mock.patch('sys.stdout', new=six.StringIO()):
+            cinder_rtstool.bulk('operations_file')
+
+        mock_open.assert_called_once_with('operations_file')
+        self.assertFalse(create.called)
+
+    def test_bulk_errors(self):
+        create_op = ('{"op": "create", "backing_device": "/dev/vg/volume-1", '
+                     '"name": "target-1", "userid": "user", '
+                     '"password": "pass", "iser_enabled": "False"%s}')
+        for data, regexp in (
+                ('[', 'Could not read operations'),
+                ('{}', 'Operations must be a JSON list'),
+                ('[{"op": "delete", "iqn": "target-1"}]',
+                 'Operation 0: unknown operation delete'),
+                ('[{"op": "create", "name": "target-1"}]',
+                 'Operation 0: invalid arguments'),
+                ('[%s]' % create_op % ', "portal": "10.0.0.1"',
+                 'Operation 0: invalid arguments'),
+                ('[%s]' % create_op % ', "portals_port": "port"',
+                 'Operation 0: invalid arguments: Invalid portals_port')):
+            with mock.patch('sys.stdin', new=six.StringIO(data)):
+                self.assertRaisesRegexp(cinder_rtstool.RtstoolError, regexp,
+                                        cinder_rtstool.bulk, None)
+
+        # Errors of the operations are not taken for invalid arguments.
+        with mock.patch.object(cinder_rtstool, 'create', autospec=True,
+                               side_effect=TypeError), \
+                mock.patch('sys.stdin',
+                           new=six.StringIO('[%s]' % create_op % '')):
+            self.assertRaises(TypeError, cinder_rtstool.bulk, None)
+
+    @mock.patch.object(cinder_rtstool, 'bulk')
+    def test_main_bulk(self, bulk):
+        sys.argv = ['cinder-rtstool', 'bulk', mock.sentinel.filename]
+
+        rc = cinder_rtstool.main()
+
+        bulk.assert_called_once_with(mock.sentinel.filename)
+        self.assertEqual(0, rc)
+
     def test_usage(self):
         with mock.patch('sys.stdout', new=six.StringIO()):
             exit = self.assertRaises(SystemExit, cinder_rtstool.usage)
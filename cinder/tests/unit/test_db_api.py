@@ -357,6 +357,47 @@ class DBAPIVolumeTestCase(BaseTest):
                              db.volume_data_get_for_host(
                                  self.ctxt, 'h%d@lvmdriver-1' % i))
 
+    def test_volume_get_all_ids_by_host(self):
+        volumes = [db.volume_create(self.ctxt,
+                                    {'host': 'h1@lvmdriver-1#pool%d' % i,
+                                     'project_id': 'p%d' % i})
+                   for i in range(THREE)]
+        db.volume_create(self.ctxt, {'host': 'h2@lvmdriver-1#pool0'})
+        db.volume_destroy(self.ctxt, volumes[2].id)
+        expected = [(volume.id, volume.host, volume.project_id)
+                    for volume in volumes[:2]]
+        self.assertEqual(sorted(expected),
+                         sorted(db.volume_get_all_ids_by_host(
+                             self.ctxt, 'h1@lvmdriver-1')))
+
+    def test_volume_data_get_for_host_by_pool(self):
+        hosts = ['h1@lvmdriver-1#pool0', 'h1@lvmdriver-1#pool0',
+                 'h1@lvmdriver-1#pool1', 'h1@lvmdriver-1',
+                 'h2@lvmdriver-1#pool0']
+        for host in hosts:
+            db.volume_create(self.ctxt, {'host': host, 'size': ONE_HUNDREDS,
+                                         'status': 'available'})
+        db.volume_create(self.ctxt, {'host': 'h1@lvmdriver-1#pool1',
+                                     'size': ONE_HUNDREDS,
+                                     'status': 'error'})
+        volume = db.volume_create(self.ctxt,
+                                  {'host': 'h1@lvmdriver-1#pool2',
+                                   'size': ONE_HUNDREDS,
+                                   'status': 'available'})
+        db.volume_destroy(self.ctxt, volume.id)
+
+        expected = [('h1@lvmdriver-1', 1, ONE_HUNDREDS),
+                    ('h1@lvmdriver-1#pool0', 2, 2 * ONE_HUNDREDS),
+                    ('h1@lvmdriver-1#pool1', 1, ONE_HUNDREDS)]
+        self.assertEqual(expected,
+                         sorted(db.volume_data_get_for_host_by_pool(
+                             self.ctxt, 'h1@lvmdriver-1',
+                             statuses=['available', 'in-use'])))
+        expected[2] = ('h1@lvmdriver-1#pool1', 2, 2 * ONE_HUNDREDS)
+        self.assertEqual(expected,
+                         sorted(db.volume_data_get_for_host_by_pool(
+                             self.ctxt, 'h1@lvmdriver-1')))
+
     def test_volume_data_get_for_project(self):
         for i in range(THREE):
             for j in range(THREE):
@@ -2406,6 +2447,28 @@ class DBAPIImageVolumeCacheEntryTestCase(BaseTest):
         for entry in entries:
             db.image_volume_cache_delete(self.ctxt, entry['volume_id'])
 
+    def test_cache_entry_get_all(self):
+        image_updated_at = datetime.datetime.utcnow()
+        for host, image_id, volume_id in (
+                ('abc@123#pool1', 'image-1', 'vol-1'),
+                ('abc@123#pool2', 'image-1', 'vol-2'),
+                ('abc@1234#pool1', 'image-1', 'vol-3'),
+                ('abc@123#pool1', 'image-2', 'vol-4')):
+            db.image_volume_cache_create(self.ctxt, host, image_id,
+                                         image_updated_at, volume_id, 6)
+
+        def volume_ids(**filters):
+            return sorted(entry['volume_id'] for entry in
+                          db.image_volume_cache_get_all(self.ctxt, **filters))
+
+        self.assertEqual(['vol-1', 'vol-2', 'vol-3', 'vol-4'], volume_ids())
+        self.assertEqual(['vol-1', 'vol-2', 'vol-3'],
+                         volume_ids(image_id='image-1'))
+        self.assertEqual(['vol-1', 'vol-2', 'vol-4'],
+                         volume_ids(host='abc@123'))
+        self.assertEqual(['vol-1'],
+                         volume_ids(image_id='image-1', host='abc@123#pool1'))
+
     def test_cache_entry_get_all_for_host_none(self):
         host = 'abc@123#poolz'
         entries = db.image_volume_cache_get_all_for_host(self.ctxt, host)
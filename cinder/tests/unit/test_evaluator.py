@@ -13,6 +13,8 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import mock
+
 from cinder import exception
 from cinder.scheduler.evaluator import evaluator
 from cinder import test
@@ -137,3 +139,34 @@ class EvaluatorTestCase(test.TestCase):
         self.assertRaises(exception.EvaluatorParseException,
                           evaluator.evaluate,
                           "7 / 0")
+
+    def test_cached_expression(self):
+        evaluator._cache.clear()
+        expression = "stats.free_capacity_gb > request.size"
+        self.assertTrue(evaluator.evaluate(
+            expression, stats={'free_capacity_gb': 10},
+            request={'size': 5}))
+        self.assertIn(expression, evaluator._cache)
+
+        # The cached parse is reused with the new variables.
+        with mock.patch.object(evaluator._parser, 'parseString') as mock_p:
+            self.assertFalse(evaluator.evaluate(
+                expression, stats={'free_capacity_gb': 1},
+                request={'size': 5}))
+            self.assertFalse(mock_p.called)
+
+    def test_cache_eviction(self):
+        evaluator._cache.clear()
+        self.mock_object(evaluator, '_CACHE_SIZE', 2)
+        evaluator.evaluate("1 + 1")
+        evaluator.evaluate("1 + 2")
+        # Touch the oldest entry so that "1 + 2" is evicted instead.
+        evaluator.evaluate("1 + 1")
+        evaluator.evaluate("1 + 3")
+        self.assertEqual(["1 + 1", "1 + 3"], list(evaluator._cache))
+
+    def test_bad_expression_not_cached(self):
+        evaluator._cache.clear()
+        self.assertRaises(exception.EvaluatorParseException,
+                          evaluator.evaluate, "1/*1")
+        self.assertEqual({}, dict(evaluator._cache))
@@ -15,7 +15,10 @@
 #    under the License.
 """Unit tests for image utils."""
 
+import hashlib
 import math
+import os
+import tempfile
 
 import mock
 from oslo_concurrency import processutils
@@ -24,9 +27,92 @@ from oslo_utils import units
 from cinder import exception
 from cinder.image import image_utils
 from cinder import test
+from cinder import utils
 from cinder.volume import throttling
 
 
+class TestQemuImgInfoCache(test.TestCase):
+    def setUp(self):
+        super(TestQemuImgInfoCache, self).setUp()
+        self.addCleanup(image_utils._qemu_img_info_cache.clear)
+        self.mock_exec = self.mock_object(utils, 'execute')
+        self.mock_exec.return_value = ('file format: raw\n'
+                                       'virtual size: 1.0K (1024 bytes)\n',
+                                       '')
+        self.path = self._create_file(b'image')
+
+    def _create_file(self, data):
+        fd, path = tempfile.mkstemp()
+        os.write(fd, data)
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_cached(self):
+        info = image_utils.qemu_img_info(self.path)
+        self.assertIs(info, image_utils.qemu_img_info(self.path,
+                                                      run_as_root=False))
+        self.assertEqual(1, self.mock_exec.call_count)
+
+    def test_file_changed(self):
+        image_utils.qemu_img_info(self.path)
+        with open(self.path, 'ab') as f:
+            f.write(b'more data')
+        image_utils.qemu_img_info(self.path)
+        self.assertEqual(2, self.mock_exec.call_count)
+
+    def test_invalidate(self):
+        image_utils.qemu_img_info(self.path)
+        image_utils._invalidate_qemu_img_info(self.path)
+        image_utils.qemu_img_info(self.path)
+        self.assertEqual(2, self.mock_exec.call_count)
+
+    def test_convert_invalidates_dest(self):
+        image_utils.qemu_img_info(self.path)
+        image_utils.convert_image(mock.sentinel.source, self.path, 'raw',
+                                  throttle=throttling.Throttle())
+        image_utils.qemu_img_info(self.path)
+        # qemu-img info of path twice, qemu-img convert and qemu-img info
+        # of the source.
+        self.assertEqual(4, self.mock_exec.call_count)
+
+    def test_not_regular_file(self):
+        image_utils.qemu_img_info('/dev/null')
+        image_utils.qemu_img_info('/dev/null')
+        self.assertEqual(2, self.mock_exec.call_count)
+        self.assertEqual({}, image_utils._qemu_img_info_cache)
+
+    def test_error_not_cached(self):
+        self.mock_exec.side_effect = processutils.ProcessExecutionError
+        self.assertRaises(processutils.ProcessExecutionError,
+                          image_utils.qemu_img_info, self.path)
+        self.assertEqual({}, image_utils._qemu_img_info_cache)
+
+    @mock.patch('cinder.image.image_utils._QEMU_IMG_INFO_CACHE_SIZE', 2)
+    def test_lru(self):
+        other_paths = [self._create_file(b'other'),
+                       self._create_file(b'another')]
+        image_utils.qemu_img_info(self.path)
+        image_utils.qemu_img_info(other_paths[0])
+        # Using the first entry makes the second one the oldest.
+        image_utils.qemu_img_info(self.path)
+        image_utils.qemu_img_info(other_paths[1])
+        self.assertEqual(3, self.mock_exec.call_count)
+
+        image_utils.qemu_img_info(self.path)
+        self.assertEqual(3, self.mock_exec.call_count)
+        image_utils.qemu_img_info(other_paths[0])
+        self.assertEqual(4, self.mock_exec.call_count)
+
+    def test_count_flow(self):
+        with image_utils._count_qemu_img_info('flow') as counts:
+            image_utils.qemu_img_info(self.path)
+            image_utils.qemu_img_info(self.path)
+            image_utils.qemu_img_info('/dev/null')
+        image_utils.qemu_img_info(self.path)
+        self.assertEqual({'calls': 3, 'cached': 1}, counts)
+
+
 class TestQemuImgInfo(test.TestCase):
     @mock.patch('cinder.openstack.common.imageutils.QemuImgInfo')
     @mock.patch('cinder.utils.execute')
@@ -271,6 +357,45 @@ class TestFetch(test.TestCase):
         (mock_fileutils.remove_path_on_error.return_value.__exit__
             .assert_called_once_with(None, None, None))
 
+    @mock.patch('os.stat')
+    @mock.patch('cinder.image.data_cache.get_cache')
+    def test_data_cache(self, mock_get_cache, mock_stat):
+        ctxt = mock.sentinel.context
+        image_service = mock.Mock()
+        image_id = mock.sentinel.image_id
+        path = 'test_path'
+        mock_stat.return_value.st_size = 1048576
+        cache = mock_get_cache.return_value
+        cache.fetch.return_value = True
+
+        output = image_utils.fetch(ctxt, image_service, image_id, path,
+                                   None, None)
+
+        self.assertIsNone(output)
+        cache.fetch.assert_called_once_with(
+            ctxt, image_service, image_id, image_service.show.return_value,
+            path)
+        self.assertFalse(image_service.download.called)
+
+    @mock.patch('os.stat')
+    @mock.patch('cinder.image.data_cache.get_cache')
+    def test_data_cache_not_cacheable(self, mock_get_cache, mock_stat):
+        ctxt = mock.sentinel.context
+        image_service = mock.Mock()
+        image_id = mock.sentinel.image_id
+        path = 'test_path'
+        mock_stat.return_value.st_size = 1048576
+        mock_get_cache.return_value.fetch.return_value = False
+        mock_open = mock.mock_open()
+
+        with mock.patch('cinder.image.image_utils.open',
+                        new=mock_open, create=True):
+            image_utils.fetch(ctxt, image_service, image_id, path, None,
+                              None)
+
+        image_service.download.assert_called_once_with(ctxt, image_id,
+                                                       mock_open.return_value)
+
 
 class TestVerifyImage(test.TestCase):
     @mock.patch('cinder.image.image_utils.qemu_img_info')
@@ -1157,6 +1282,159 @@ class TestFetchToVolumeFormat(test.TestCase):
                                              run_as_root=run_as_root)
 
 
+class TestStreamToVolume(test.TestCase):
+    def setUp(self):
+        super(TestStreamToVolume, self).setUp()
+        self.flags(image_stream_to_volume=True)
+        self.ctxt = mock.Mock(user_id=mock.sentinel.user_id)
+        self.image_service = mock.Mock(temp_images=None)
+        self.image_id = mock.sentinel.image_id
+        self.chunks = [b'a' * 512, b'b' * 512, b'c' * 128]
+        self.data = b''.join(self.chunks)
+        self.image_meta = {'disk_format': 'raw',
+                           'container_format': 'bare',
+                           'size': len(self.data),
+                           'checksum': hashlib.md5(self.data).hexdigest()}
+        self.image_service.show.return_value = self.image_meta
+        self.image_service.download.return_value = iter(self.chunks)
+        fd, self.dest = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, self.dest)
+
+    def _read_dest(self):
+        with open(self.dest, 'rb') as f:
+            return f.read()
+
+    @mock.patch('cinder.image.image_utils.fetch')
+    @mock.patch('cinder.image.image_utils.qemu_img_info')
+    def test_stream(self, mock_info, mock_fetch):
+        mock_info.return_value.file_format = 'raw'
+        mock_info.return_value.backing_file = None
+
+        output = image_utils.fetch_to_volume_format(
+            self.ctxt, self.image_service, self.image_id, self.dest, 'raw',
+            mock.sentinel.blocksize, size=1, run_as_root=False)
+
+        self.assertIsNone(output)
+        self.assertEqual(self.data, self._read_dest())
+        self.image_service.download.assert_called_once_with(self.ctxt,
+                                                            self.image_id)
+        mock_info.assert_called_once_with(self.dest, run_as_root=False)
+        self.assertFalse(mock_fetch.called)
+
+    @mock.patch('cinder.image.image_utils.qemu_img_info',
+                side_effect=processutils.ProcessExecutionError)
+    def test_stream_no_qemu_img(self, mock_info):
+        # The data cannot be checked, it has to go through the staged path.
+        self.assertFalse(image_utils._stream_to_volume(
+            self.ctxt, self.image_service, self.image_id, self.image_meta,
+            self.dest))
+
+    @mock.patch('cinder.image.image_utils.qemu_img_info')
+    def test_stream_not_raw(self, mock_info):
+        for file_format in ('qcow2', None):
+            mock_info.return_value.file_format = file_format
+            mock_info.return_value.backing_file = None
+            self.image_service.download.return_value = iter(self.chunks)
+
+            self.assertFalse(image_utils._stream_to_volume(
+                self.ctxt, self.image_service, self.image_id,
+                self.image_meta, self.dest))
+
+    @mock.patch('cinder.image.image_utils.qemu_img_info')
+    def test_stream_backing_file(self, mock_info):
+        mock_info.return_value.file_format = 'raw'
+        mock_info.return_value.backing_file = '/etc/shadow'
+
+        self.assertFalse(image_utils._stream_to_volume(
+            self.ctxt, self.image_service, self.image_id, self.image_meta,
+            self.dest))
+
+    @mock.patch('cinder.image.image_utils.qemu_img_info')
+    def test_stream_checksum_mismatch(self, mock_info):
+        self.image_meta['checksum'] = 'bad'
+
+        self.assertRaises(exception.ImageUnacceptable,
+                          image_utils._stream_to_volume, self.ctxt,
+                          self.image_service, self.image_id,
+                          self.image_meta, self.dest)
+        self.assertFalse(mock_info.called)
+
+    @mock.patch('cinder.image.image_utils.qemu_img_info')
+    def test_stream_short_download(self, mock_info):
+        self.image_service.download.return_value = iter(self.chunks[:2])
+        self.image_meta['checksum'] = None
+
+        self.assertRaises(exception.ImageUnacceptable,
+                          image_utils._stream_to_volume, self.ctxt,
+                          self.image_service, self.image_id,
+                          self.image_meta, self.dest)
+
+    def test_stream_size_error(self):
+        self.image_meta['size'] = 2 * units.Gi
+
+        self.assertRaises(exception.ImageUnacceptable,
+                          image_utils._stream_to_volume, self.ctxt,
+                          self.image_service, self.image_id,
+                          self.image_meta, self.dest, size=1)
+        self.assertFalse(self.image_service.download.called)
+
+    def test_can_stream(self):
+        self.assertTrue(image_utils._can_stream_to_volume(
+            self.ctxt, self.image_service, self.image_id, self.image_meta,
+            'raw'))
+        self.assertFalse(image_utils._can_stream_to_volume(
+            self.ctxt, self.image_service, self.image_id, self.image_meta,
+            'vpc'))
+        self.assertFalse(image_utils._can_stream_to_volume(
+            self.ctxt, self.image_service, self.image_id,
+            dict(self.image_meta, disk_format='qcow2'), 'raw'))
+        self.assertFalse(image_utils._can_stream_to_volume(
+            self.ctxt, self.image_service, self.image_id,
+            dict(self.image_meta, container_format='ovf'), 'raw'))
+
+    def test_can_stream_disabled(self):
+        self.flags(image_stream_to_volume=False)
+        self.assertFalse(image_utils._can_stream_to_volume(
+            self.ctxt, self.image_service, self.image_id, self.image_meta,
+            'raw'))
+
+    def test_can_stream_temporary_image(self):
+        tmp_images = image_utils.TemporaryImages.for_image_service(
+            self.image_service)
+        tmp_images.temporary_images[self.ctxt.user_id] = {
+            self.image_id: mock.sentinel.tmp}
+        self.assertFalse(image_utils._can_stream_to_volume(
+            self.ctxt, self.image_service, self.image_id, self.image_meta,
+            'raw'))
+
+    @mock.patch('cinder.image.image_utils.convert_image')
+    @mock.patch('cinder.image.image_utils.fetch')
+    @mock.patch('cinder.image.image_utils.qemu_img_info')
+    @mock.patch('cinder.image.image_utils.temporary_file')
+    @mock.patch('cinder.image.image_utils._stream_to_volume',
+                return_value=False)
+    def test_stream_fallback(self, mock_stream, mock_temp, mock_info,
+                             mock_fetch, mock_convert):
+        data = mock_info.return_value
+        data.file_format = 'raw'
+        data.backing_file = None
+        data.virtual_size = 1234
+        tmp = mock_temp.return_value.__enter__.return_value
+
+        image_utils.fetch_to_volume_format(
+            self.ctxt, self.image_service, self.image_id, self.dest, 'raw',
+            mock.sentinel.blocksize)
+
+        mock_stream.assert_called_once_with(
+            self.ctxt, self.image_service, self.image_id, self.image_meta,
+            self.dest, size=None, run_as_root=True)
+        mock_fetch.assert_called_once_with(self.ctxt, self.image_service,
+                                           self.image_id, tmp, None, None)
+        mock_convert.assert_called_once_with(tmp, self.dest, 'raw',
+                                             run_as_root=True)
+
+
 class TestXenserverUtils(test.TestCase):
     @mock.patch('cinder.image.image_utils.is_xenserver_format')
     def test_is_xenserver_image(self, mock_format):
@@ -0,0 +1,121 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Unit Tests for cinder.manager."""
+
+import mock
+
+from cinder import context
+from cinder import manager
+from cinder import test
+
+
+class CapabilitiesDeltaTestCase(test.TestCase):
+
+    def test_backend_fields(self):
+        old = {'driver_version': '1.0', 'vendor_name': 'Open Source',
+               'QoS_support': False}
+        new = {'driver_version': '1.1', 'vendor_name': 'Open Source',
+               'multiattach': True}
+        self.assertEqual({'changed': {'driver_version': '1.1',
+                                      'multiattach': True},
+                          'removed': ['QoS_support'],
+                          'pools': {},
+                          'removed_pools': []},
+                         manager._get_capabilities_delta(old, new))
+
+    def test_pools(self):
+        pool1 = {'pool_name': 'pool1', 'free_capacity_gb': 10}
+        pool2 = {'pool_name': 'pool2', 'free_capacity_gb': 20}
+        new_pool2 = {'pool_name': 'pool2', 'free_capacity_gb': 15}
+        pool3 = {'pool_name': 'pool3', 'free_capacity_gb': 30}
+        old = {'driver_version': '1.0', 'pools': [pool1, pool2]}
+        new = {'driver_version': '1.0', 'pools': [new_pool2, pool3]}
+        self.assertEqual({'changed': {},
+                          'removed': [],
+                          'pools': {'pool2': new_pool2, 'pool3': pool3},
+                          'removed_pools': ['pool1']},
+                         manager._get_capabilities_delta(old, new))
+
+    def test_pools_not_comparable(self):
+        old = {'free_capacity_gb': 10}
+        new = {'pools': [{'pool_name': 'pool1', 'free_capacity_gb': 10}]}
+        self.assertIsNone(manager._get_capabilities_delta(old, new))
+
+
+class SchedulerDependentManagerTestCase(test.TestCase):
+
+    def setUp(self):
+        super(SchedulerDependentManagerTestCase, self).setUp()
+        self.context = context.get_admin_context()
+        self.manager = manager.SchedulerDependentManager(
+            host='fake_host', service_name='volume')
+        self.mock_update = self.mock_object(
+            self.manager.scheduler_rpcapi, 'update_service_capabilities')
+
+    def _publish(self, capabilities, full=False):
+        self.manager.update_service_capabilities(capabilities)
+        self.manager._publish_service_capabilities(self.context, full=full)
+
+    def test_publish_delta(self):
+        self.flags(capabilities_full_report_interval=10)
+        self._publish({'free_capacity_gb': 10, 'driver_version': '1.0'})
+        self.mock_update.assert_called_once_with(
+            self.context, 'volume', 'fake_host',
+            {'free_capacity_gb': 10, 'driver_version': '1.0'},
+            generation=1, delta=None)
+
+        self.mock_update.reset_mock()
+        self._publish({'free_capacity_gb': 5, 'driver_version': '1.0'})
+        self.mock_update.assert_called_once_with(
+            self.context, 'volume', 'fake_host',
+            {'free_capacity_gb': 5, 'driver_version': '1.0'},
+            generation=2,
+            delta={'changed': {'free_capacity_gb': 5}, 'removed': [],
+                   'pools': {}, 'removed_pools': []})
+
+    def test_publish_unchanged_heartbeat(self):
+        stats = {'free_capacity_gb': 10}
+        self._publish(stats)
+        self.mock_update.reset_mock()
+
+        # Drivers may update their stats in place.
+        stats['free_capacity_gb'] = 10
+        self._publish(stats)
+        self.mock_update.assert_called_once_with(
+            self.context, 'volume', 'fake_host', stats, generation=2,
+            delta={'changed': {}, 'removed': [], 'pools': {},
+                   'removed_pools': []})
+        self.mock_update.reset_mock()
+
+        stats['free_capacity_gb'] = 5
+        self._publish(stats)
+        self.mock_update.assert_called_once_with(
+            self.context, 'volume', 'fake_host', stats, generation=3,
+            delta=mock.ANY)
+
+    def test_publish_full_interval(self):
+        self.flags(capabilities_full_report_interval=3)
+        for i in range(7):
+            self._publish({'free_capacity_gb': i})
+        generations_and_deltas = [
+            (call[1]['generation'], call[1]['delta'] is None)
+            for call in self.mock_update.call_args_list]
+        self.assertEqual([(1, True), (2, False), (3, False),
+                          (4, True), (5, False), (6, False),
+                          (7, True)],
+                         generations_and_deltas)
+
+    def test_publish_full_requested(self):
+        self._publish({'free_capacity_gb': 10})
+        self._publish({'free_capacity_gb': 5}, full=True)
+        self.assertIsNone(self.mock_update.call_args[1]['delta'])
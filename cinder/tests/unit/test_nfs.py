@@ -17,8 +17,10 @@
 import ddt
 import errno
 import os
+import time
 
 import mock
+from oslo_concurrency import processutils as putils
 from oslo_utils import units
 
 from cinder import exception
@@ -335,6 +337,7 @@ class NfsDriverTestCase(test.TestCase):
         self.configuration.nfs_mount_options = None
         self.configuration.nfs_mount_attempts = 3
         self.configuration.nfs_qcow2_volumes = False
+        self.configuration.nfs_allocation_scan_interval = 600
         self.configuration.nas_secure_file_permissions = 'false'
         self.configuration.nas_secure_file_operations = 'false'
         self.configuration.nas_ip = None
@@ -421,6 +424,7 @@ class NfsDriverTestCase(test.TestCase):
                 drv, '_get_mount_point_for_share') as mock_get_mount:
             mock_get_mount.return_value = self.TEST_MNT_POINT
             self._execute.side_effect = [(stat_output, None),
+                                         (du_output, None),
                                          (du_output, None)]
 
             self.assertEqual((stat_total_size, stat_avail, du_used),
@@ -450,6 +454,7 @@ class NfsDriverTestCase(test.TestCase):
                 drv, '_get_mount_point_for_share') as mock_get_mount:
             mock_get_mount.return_value = self.TEST_MNT_POINT_SPACES
             self._execute.side_effect = [(stat_output, None),
+                                         (du_output, None),
                                          (du_output, None)]
 
             self.assertEqual((stat_total_size, stat_avail, du_used),
@@ -862,6 +867,130 @@ class NfsDriverTestCase(test.TestCase):
                         resize.assert_called_once_with(path, newSize,
                                                        run_as_root=True)
 
+    def _scan_allocated(self, allocated):
+        drv = self._driver
+        self._execute.return_value = ('%d /mnt' % allocated, None)
+        with mock.patch.object(drv, '_get_mount_point_for_share',
+                               return_value=self.TEST_MNT_POINT):
+            return drv._get_allocated(self.TEST_NFS_EXPORT1)
+
+    def test_get_allocated(self):
+        drv = self._driver
+        self.assertEqual(units.Gi, self._scan_allocated(units.Gi))
+        self.assertEqual(units.Gi, self._scan_allocated(2 * units.Gi))
+
+        self._execute.assert_has_calls([
+            mock.call('du', '-sb', '--apparent-size', '--exclude',
+                      '*snapshot*', self.TEST_MNT_POINT, run_as_root=True),
+            mock.call('du', '-sb', '--apparent-size', self.TEST_MNT_POINT,
+                      run_as_root=True)])
+        self.assertEqual(2, self._execute.call_count)
+        self.assertEqual(units.Gi, drv._provisioned[self.TEST_NFS_EXPORT1])
+        self.assertEqual({}, drv._allocated_changes)
+
+    def test_get_allocated_scan_interval_disabled(self):
+        self.configuration.nfs_allocation_scan_interval = 0
+
+        self.assertEqual(units.Gi, self._scan_allocated(units.Gi))
+        self.assertEqual(2 * units.Gi, self._scan_allocated(2 * units.Gi))
+
+        # Only the space allocated without the snapshots is scanned.
+        self.assertEqual(2, self._execute.call_count)
+        self.assertEqual({}, self._driver._provisioned)
+
+    @mock.patch('eventlet.spawn_n')
+    def test_get_allocated_stale(self, mock_spawn):
+        drv = self._driver
+        self._scan_allocated(units.Gi)
+        drv._allocated_scanned_at[self.TEST_NFS_EXPORT1] -= 600
+
+        self.assertEqual(units.Gi, self._scan_allocated(2 * units.Gi))
+        mock_spawn.assert_called_once_with(drv._scan_allocated_in_background,
+                                           self.TEST_NFS_EXPORT1)
+        # The scan is not started again while it runs.
+        self._scan_allocated(2 * units.Gi)
+        self.assertEqual(1, mock_spawn.call_count)
+
+        with mock.patch.object(drv, '_get_mount_point_for_share',
+                               return_value=self.TEST_MNT_POINT):
+            drv._scan_allocated_in_background(self.TEST_NFS_EXPORT1)
+        self.assertEqual(2 * units.Gi, drv._allocated[self.TEST_NFS_EXPORT1])
+
+    def test_scan_allocated_keeps_changes_during_scan(self):
+        drv = self._driver
+
+        def du(*args, **kwargs):
+            # A volume created while the share is scanned.
+            if '--exclude' in args:
+                drv._update_allocated(self.TEST_NFS_EXPORT1, 1)
+            return ('%d /mnt' % units.Gi, None)
+
+        self._execute.side_effect = du
+        drv._scan_allocated(self.TEST_NFS_EXPORT1, self.TEST_MNT_POINT)
+
+        self.assertEqual(2 * units.Gi, drv._allocated[self.TEST_NFS_EXPORT1])
+        self.assertEqual(2 * units.Gi,
+                         drv._provisioned[self.TEST_NFS_EXPORT1])
+        self.assertEqual({}, drv._allocated_changes)
+
+    @mock.patch.object(nfs, 'LOG')
+    def test_scan_allocated_in_background_failure(self, mock_log):
+        drv = self._driver
+        drv._allocated[self.TEST_NFS_EXPORT1] = units.Gi
+        self._execute.side_effect = putils.ProcessExecutionError
+
+        with mock.patch.object(drv, '_get_mount_point_for_share',
+                               return_value=self.TEST_MNT_POINT):
+            drv._scan_allocated_in_background(self.TEST_NFS_EXPORT1)
+
+        self.assertTrue(mock_log.exception.called)
+        self.assertEqual(units.Gi, drv._allocated[self.TEST_NFS_EXPORT1])
+        self.assertEqual({}, drv._allocated_changes)
+
+    def test_allocated_updated_by_volume_operations(self):
+        drv = self._driver
+        drv._ensure_shares_mounted = mock.Mock()
+        drv._ensure_share_mounted = mock.Mock()
+        drv._do_create_volume = mock.Mock()
+        drv._find_share = mock.Mock(return_value=self.TEST_NFS_EXPORT1)
+        drv._allocated[self.TEST_NFS_EXPORT1] = units.Gi
+        drv._provisioned[self.TEST_NFS_EXPORT1] = 2 * units.Gi
+        volume = {'id': '80ee16b6-75d2-4d54-9539-ffc1b4b0fb10',
+                  'name': 'volume-123', 'size': 2,
+                  'provider_location': None}
+
+        volume.update(drv.create_volume(volume))
+        self.assertEqual(3 * units.Gi, drv._allocated[self.TEST_NFS_EXPORT1])
+
+        with mock.patch.object(image_utils, 'resize_image'), \
+                mock.patch.object(drv, '_is_share_eligible',
+                                  return_value=True), \
+                mock.patch.object(drv, '_is_file_size_equal',
+                                  return_value=True):
+            drv.extend_volume(volume, 4)
+        self.assertEqual(5 * units.Gi, drv._allocated[self.TEST_NFS_EXPORT1])
+
+        volume['size'] = 4
+        drv.delete_volume(volume)
+        self.assertEqual(units.Gi, drv._allocated[self.TEST_NFS_EXPORT1])
+        self.assertEqual(2 * units.Gi,
+                         drv._provisioned[self.TEST_NFS_EXPORT1])
+
+    def test_get_provisioned_capacity(self):
+        drv = self._driver
+        drv.shares = {self.TEST_NFS_EXPORT1: None,
+                      self.TEST_NFS_EXPORT2: None}
+        drv._allocated = {self.TEST_NFS_EXPORT1: units.Gi,
+                          self.TEST_NFS_EXPORT2: 2.5 * units.Gi}
+        # The snapshots are part of the provisioned capacity.
+        drv._provisioned = {self.TEST_NFS_EXPORT1: 1.5 * units.Gi,
+                            self.TEST_NFS_EXPORT2: 2.5 * units.Gi}
+        drv._allocated_scanned_at = dict.fromkeys(drv._allocated,
+                                                  time.time())
+
+        self.assertEqual(4, drv._get_provisioned_capacity())
+        self.assertFalse(self._execute.called)
+
     def test_extend_volume_failure(self):
         """Error during extend operation."""
         drv = self._driver
@@ -146,6 +146,11 @@ class RBDTestCase(test.TestCase):
         self.cfg.rbd_store_chunk_size = 4
         self.cfg.rados_connection_retries = 3
         self.cfg.rados_connection_interval = 5
+        self.cfg.rados_connection_pool_size = 4
+        self.cfg.rados_connection_pool_idle_timeout = 300
+        patcher = mock.patch.dict(driver._connection_pools, clear=True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
 
         mock_exec = mock.Mock()
         mock_exec.return_value = ('', '')
@@ -1030,6 +1035,143 @@ class RBDTestCase(test.TestCase):
         self.assertEqual(
             3, self.mock_rados.Rados.return_value.shutdown.call_count)
 
+    @common_mocks
+    def test_connect_to_rados_reuses_connection(self):
+        self.cfg.rados_connect_timeout = -1
+        client = self.mock_rados.Rados.return_value
+        client.state = 'connected'
+        client.open_ioctx.return_value.state = 'open'
+
+        connection = self.driver._connect_to_rados()
+        self.driver._disconnect_from_rados(*connection)
+
+        self.assertEqual(connection, self.driver._connect_to_rados())
+        self.assertEqual(1, self.mock_rados.Rados.call_count)
+        self.assertFalse(client.shutdown.called)
+        stats = self.driver._get_connection_pool().stats()['rbd']
+        self.assertEqual(1, stats['created'])
+        self.assertEqual(1, stats['reused'])
+        self.assertEqual(1, stats['in_use'])
+
+    @common_mocks
+    def test_connection_pool_shared_with_backup_driver(self):
+        from cinder.backup.drivers import ceph
+        self.flags(backup_ceph_user='cinder', backup_ceph_conf='ceph.conf')
+        self.cfg.rbd_user = 'cinder'
+        self.cfg.rbd_cluster_name = None
+        self.cfg.rbd_ceph_conf = 'ceph.conf'
+
+        backup_driver = ceph.CephBackupDriver(self.context)
+
+        self.assertIs(self.driver._get_connection_pool(),
+                      backup_driver._get_connection_pool())
+
+
+class RADOSConnectionPoolTestCase(test.TestCase):
+
+    def setUp(self):
+        super(RADOSConnectionPoolTestCase, self).setUp()
+        self.pool = driver.RADOSConnectionPool(2, 300)
+        self.connect = mock.Mock(side_effect=self._connect)
+
+    def _connect(self, pool):
+        client = mock.Mock(state='connected')
+        ioctx = mock.Mock(state='open')
+        return client, ioctx
+
+    def test_get_put(self):
+        connection = self.pool.get('rbd', self.connect)
+        self.connect.assert_called_once_with('rbd')
+        self.pool.put(*connection)
+
+        self.assertEqual(connection, self.pool.get('rbd', self.connect))
+        self.assertEqual(1, self.connect.call_count)
+        self.assertNotEqual(connection,
+                            self.pool.get('other', self.connect))
+        self.assertFalse(connection[0].shutdown.called)
+
+    def test_put_pool_full(self):
+        connections = [self.pool.get('rbd', self.connect) for _i in range(3)]
+        for connection in connections:
+            self.pool.put(*connection)
+
+        self.assertFalse(connections[1][0].shutdown.called)
+        connections[2][1].close.assert_called_once_with()
+        connections[2][0].shutdown.assert_called_once_with()
+        stats = self.pool.stats()['rbd']
+        self.assertEqual(2, stats['idle'])
+        self.assertEqual(0, stats['in_use'])
+        self.assertEqual(3, stats['created'])
+        self.assertEqual(1, stats['closed'])
+        self.assertEqual(3, stats['ops'])
+
+    def test_pool_disabled(self):
+        self.pool.max_size = 0
+        client, ioctx = self.pool.get('rbd', self.connect)
+        self.pool.put(client, ioctx)
+
+        client.shutdown.assert_called_once_with()
+        self.pool.get('rbd', self.connect)
+        self.assertEqual(2, self.connect.call_count)
+
+    def test_get_closed_connection(self):
+        client, ioctx = self.pool.get('rbd', self.connect)
+        self.pool.put(client, ioctx)
+        client.state = 'shutdown'
+
+        self.assertNotEqual((client, ioctx),
+                            self.pool.get('rbd', self.connect))
+        client.shutdown.assert_called_once_with()
+
+    def test_put_closed_connection(self):
+        client, ioctx = self.pool.get('rbd', self.connect)
+        ioctx.state = 'closed'
+        self.pool.put(client, ioctx)
+
+        client.shutdown.assert_called_once_with()
+        self.assertEqual(0, self.pool.stats()['rbd']['idle'])
+
+    @mock.patch('time.time')
+    def test_reap(self, mock_time):
+        mock_time.return_value = 1000
+        old = self.pool.get('rbd', self.connect)
+        recent = self.pool.get('rbd', self.connect)
+        self.pool.put(*old)
+        mock_time.return_value = 1200
+        self.pool.put(*recent)
+
+        mock_time.return_value = 1300
+        self.pool.reap()
+
+        old[0].shutdown.assert_called_once_with()
+        self.assertFalse(recent[0].shutdown.called)
+        self.assertEqual(1, self.pool.stats()['rbd']['idle'])
+
+    @mock.patch('time.time')
+    def test_stats(self, mock_time):
+        mock_time.side_effect = [0, 2, 2, 6]
+        connection = self.pool.get('rbd', self.connect)
+        self.pool.put(*connection)
+
+        stats = self.pool.stats()['rbd']
+        self.assertEqual(2, stats['avg_connect_time'])
+        self.assertEqual(4, stats['avg_op_time'])
+        self.assertEqual(4, stats['max_op_time'])
+
+    @mock.patch.dict(driver._connection_pools, clear=True)
+    def test_get_connection_pool(self):
+        connection_pool = driver.get_connection_pool('user', 'ceph', 'conf',
+                                                     4, 300)
+
+        self.assertIs(connection_pool,
+                      driver.get_connection_pool('user', 'ceph', 'conf',
+                                                 2, 60))
+        self.assertEqual(2, connection_pool.max_size)
+        self.assertEqual(60, connection_pool.idle_timeout)
+        self.assertIsNot(connection_pool,
+                         driver.get_connection_pool('other', 'ceph', 'conf',
+                                                    4, 300))
+
 
 class RBDImageIOWrapperTestCase(test.TestCase):
     def setUp(self):
@@ -15,6 +15,7 @@
 #    under the License.
 """Tests for Volume Code."""
 
+import collections
 import datetime
 import ddt
 import os
@@ -45,6 +46,8 @@ from cinder.brick.local_dev import lvm as brick_lvm
 from cinder import context
 from cinder import db
 from cinder import exception
+from cinder.image import cache as image_cache
+from cinder.image import glance
 from cinder.image import image_utils
 from cinder import keymgr
 from cinder import objects
@@ -437,6 +440,34 @@ class VolumeTestCase(BaseVolumeTestCase):
         self.volume.delete_volume(self.context, vol3['id'])
         self.volume.delete_volume(self.context, vol4['id'])
 
+    def test_init_host_ensure_exports_in_parallel(self):
+        self.flags(volume_service_inithost_max_parallel_exports=2)
+        volumes = [tests_utils.create_volume(
+            self.context, status='in-use', size=1,
+            host=volutils.append_host(CONF.host, 'pool0'))
+            for _i in range(3)]
+        exporting = []
+        max_exporting = []
+
+        def ensure_export(ctxt, volume):
+            exporting.append(volume.id)
+            max_exporting.append(len(exporting))
+            eventlet.sleep(0.01)
+            exporting.remove(volume.id)
+            if volume.id == volumes[1].id:
+                raise exception.ExportFailure(reason='fake')
+
+        with mock.patch.object(self.volume.driver, 'ensure_export',
+                               side_effect=ensure_export):
+            self.volume.init_host()
+
+        self.assertEqual(2, max(max_exporting))
+        self.assertEqual(['in-use', 'error', 'in-use'],
+                         [db.volume_get(self.context, volume.id)['status']
+                          for volume in volumes])
+        self.assertEqual(3, self.volume.stats['allocated_capacity_gb'])
+        self.assertTrue(self.volume.driver.initialized)
+
     @mock.patch('cinder.rpc.LAST_RPC_VERSIONS', {'cinder-scheduler': '1.3'})
     @mock.patch('cinder.rpc.LAST_OBJ_VERSIONS', {'cinder-scheduler': '1.5'})
     def test_reset(self):
@@ -7502,10 +7533,19 @@ class ISCSITestCase(DriverTestCase):
         def _fake_get_volumes(obj, lv_name=None):
             return [{'vg': 'fake_vg', 'name': 'fake_vol', 'size': '1000'}]
 
+        def _fake_get_vg_report(obj):
+            return (obj.get_all_volume_groups('sudo')[0],
+                    [{'vg': 'fake_vg', 'name': 'fake_vol', 'size': '1000',
+                      'data_percent': ''}])
+
         self.stubs.Set(brick_lvm.LVM,
                        'get_all_volume_groups',
                        _fake_get_all_volume_groups)
 
+        self.stubs.Set(brick_lvm.LVM,
+                       '_get_vg_report',
+                       _fake_get_vg_report)
+
         self.stubs.Set(brick_lvm.LVM,
                        'get_all_physical_volumes',
                        _fake_get_all_physical_volumes)
@@ -7651,7 +7691,10 @@ class ImageVolumeCacheTestCase(BaseVolumeTestCase):
         opts = {
             'image_volume_cache_enabled': True,
             'image_volume_cache_max_size_gb': 100,
-            'image_volume_cache_max_count': 20
+            'image_volume_cache_max_count': 20,
+            'image_volume_cache_eviction_policy': 'gdsf',
+            'image_volume_cache_index_refresh_interval': 120,
+            'image_volume_cache_coalesce_timeout': 600
         }
 
         def conf_get(option):
@@ -7674,6 +7717,11 @@ class ImageVolumeCacheTestCase(BaseVolumeTestCase):
         self.assertIsNotNone(manager.image_volume_cache)
         self.assertEqual(100, manager.image_volume_cache.max_cache_size_gb)
         self.assertEqual(20, manager.image_volume_cache.max_cache_size_count)
+        self.assertIsInstance(manager.image_volume_cache.eviction_policy,
+                              image_cache.GDSFPolicy)
+        self.assertEqual(
+            120, manager.image_volume_cache.index_refresh_interval)
+        self.assertEqual(600, manager.image_volume_cache.coalesce_timeout)
 
     def test_delete_image_volume(self):
         volume_params = {
@@ -7697,6 +7745,141 @@ class ImageVolumeCacheTestCase(BaseVolumeTestCase):
                                                        volume['id'])
         self.assertIsNone(entry)
 
+    def _setup_prewarm(self, cache_entries):
+        self.volume.image_volume_cache = mock.Mock()
+        self.volume.image_volume_cache.find_entry.side_effect = cache_entries
+        self.volume._prewarm_pool = eventlet.GreenPool(1)
+        self.volume._prewarm_queue = collections.deque()
+        self.mock_object(context, 'get_internal_tenant_context',
+                         mock.Mock(return_value=self.context))
+        image_service = mock.Mock()
+        image_service.show.return_value = {'id': 'image-1',
+                                           'size': 2 * units.Gi + 1,
+                                           'min_disk': 0}
+        self.mock_object(glance, 'get_remote_image_service',
+                         mock.Mock(return_value=(image_service, 'image-1')))
+        self.mock_object(self.volume, 'create_volume')
+        self.mock_object(self.volume, 'delete_volume')
+
+    def _prewarm(self, image_id, pool=None):
+        self.volume.prewarm_image_cache(self.context, image_id, pool=pool)
+        self.volume._prewarm_pool.waitall()
+
+    def test_prewarm_image_cache(self):
+        self._setup_prewarm([None, {'volume_id': 'cached'}])
+
+        self._prewarm('image-1', pool='pool1')
+
+        self.assertEqual(1, self.volume.create_volume.call_count)
+        args, kwargs = self.volume.create_volume.call_args
+        volume = kwargs['volume']
+        self.assertEqual(volutils.append_host(self.volume.host, 'pool1'),
+                         volume.host)
+        self.assertEqual(3, volume.size)
+        self.assertEqual({'image_id': 'image-1'}, kwargs['request_spec'])
+        self.assertFalse(kwargs['allow_reschedule'])
+        self.volume.delete_volume.assert_called_once_with(self.context,
+                                                          volume.id)
+        self.volume.image_volume_cache.find_entry.assert_called_with(
+            self.context, volume.host, 'image-1', mock.ANY)
+
+    def test_prewarm_image_cache_already_cached(self):
+        self._setup_prewarm([{'volume_id': 'cached'}])
+
+        self._prewarm('image-1', pool='pool1')
+
+        self.assertFalse(self.volume.create_volume.called)
+
+    def test_prewarm_image_cache_create_failure(self):
+        self._setup_prewarm([None])
+        self.volume.create_volume.side_effect = (
+            exception.VolumeBackendAPIException(data='failed'))
+
+        self._prewarm('image-1', pool='pool1')
+
+        self.assertEqual(1, self.volume.delete_volume.call_count)
+
+    def test_prewarm_image_cache_queued(self):
+        self._setup_prewarm([None, None] * 5)
+        self.volume._prewarm_pool = eventlet.GreenPool(2)
+        images = ['image-%d' % i for i in range(5)]
+        get_service = glance.get_remote_image_service
+        get_service.side_effect = lambda ctxt, image_id: (
+            get_service.return_value[0], image_id)
+        running = []
+        finish = eventlet.event.Event()
+
+        def _create_volume(*args, **kwargs):
+            running.append(kwargs['request_spec']['image_id'])
+            finish.wait()
+
+        self.volume.create_volume.side_effect = _create_volume
+
+        # The requests return while the images are added in the background,
+        # the ones over the concurrency are queued.
+        for image_id in images:
+            self.volume.prewarm_image_cache(self.context, image_id,
+                                            pool='pool1')
+        for _i in range(100):
+            if len(running) == 2:
+                break
+            eventlet.sleep(0.01)
+        eventlet.sleep(0.01)
+        self.assertEqual(images[:2], running)
+        self.assertEqual(3, len(self.volume._prewarm_queue))
+        finish.send()
+        self.volume._prewarm_pool.waitall()
+
+        self.assertEqual(images, running)
+        self.assertEqual(0, len(self.volume._prewarm_queue))
+
+    def test_prewarm_image_cache_disabled(self):
+        self.volume.image_volume_cache = None
+        mock_get_service = self.mock_object(glance,
+                                            'get_remote_image_service')
+
+        self.volume.prewarm_image_cache(self.context, 'image-1')
+
+        self.assertFalse(mock_get_service.called)
+
+    @mock.patch('cinder.utils.service_is_up', return_value=True)
+    @mock.patch('cinder.volume.rpcapi.VolumeAPI.prewarm_image_cache')
+    def test_prewarm_image_cache_api(self, mock_prewarm, mock_is_up):
+        volume_api = cinder.volume.api.API(image_service=mock.Mock())
+        db.service_create(self.context, {'host': 'host1@lvm',
+                                         'binary': 'cinder-volume',
+                                         'topic': CONF.volume_topic})
+
+        volume_api.prewarm_image_cache(self.context, 'image-1',
+                                       ['host1@lvm', 'host1@lvm#pool2'])
+
+        volume_api.image_service.show.assert_called_once_with(self.context,
+                                                              'image-1')
+        mock_prewarm.assert_has_calls([
+            mock.call(self.context, 'host1@lvm', 'image-1'),
+            mock.call(self.context, 'host1@lvm#pool2', 'image-1')])
+
+    @mock.patch('cinder.utils.service_is_up', return_value=True)
+    @mock.patch('cinder.volume.rpcapi.VolumeAPI.prewarm_image_cache')
+    def test_prewarm_image_cache_api_disabled_service(self, mock_prewarm,
+                                                      mock_is_up):
+        volume_api = cinder.volume.api.API(image_service=mock.Mock())
+        db.service_create(self.context, {'host': 'host1@lvm',
+                                         'binary': 'cinder-volume',
+                                         'topic': CONF.volume_topic})
+        db.service_create(self.context, {'host': 'host2@lvm',
+                                         'binary': 'cinder-volume',
+                                         'topic': CONF.volume_topic,
+                                         'disabled': True})
+
+        self.assertRaises(exception.InvalidInput,
+                          volume_api.prewarm_image_cache, self.context,
+                          'image-1', ['host1@lvm', 'host2@lvm'])
+        self.assertRaises(exception.ServiceNotFound,
+                          volume_api.prewarm_image_cache, self.context,
+                          'image-1', ['host3@lvm'])
+        self.assertFalse(mock_prewarm.called)
+
 
 @ddt.ddt
 class DiscardFlagTestCase(BaseVolumeTestCase):
@@ -0,0 +1,195 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Tests for the in-process volume copy engine."""
+
+import errno
+import os
+import tempfile
+
+import mock
+from oslo_utils import units
+
+from cinder import test
+from cinder.volume import native_copy
+
+
+BLOCK = 64 * units.Ki
+
+
+class NativeCopyTestCase(test.TestCase):
+
+    def setUp(self):
+        super(NativeCopyTestCase, self).setUp()
+        self.tmpdir = tempfile.mkdtemp()
+        self.src = os.path.join(self.tmpdir, 'src')
+        self.dest = os.path.join(self.tmpdir, 'dest')
+        # No kernel copy unless a test asks for it.
+        patcher = mock.patch.object(native_copy, 'KERNEL_COPY_METHODS', [])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _write_src(self, data):
+        with open(self.src, 'wb') as f:
+            f.write(data)
+
+    def _read_dest(self):
+        with open(self.dest, 'rb') as f:
+            return f.read()
+
+    def _data(self, blocks):
+        return b''.join(bytes(bytearray([i % 251 + 1])) * BLOCK
+                        for i in range(blocks))
+
+    def test_copy(self):
+        data = self._data(10)
+        self._write_src(data)
+
+        stats = native_copy.NativeCopy(self.src, self.dest, len(data), BLOCK,
+                                       workers=3).run()
+
+        self.assertEqual(data, self._read_dest())
+        self.assertEqual(len(data), stats['bytes'])
+        self.assertEqual(0, stats['sparse_bytes'])
+        self.assertEqual(3, stats['workers'])
+
+    def test_copy_workers_limited_by_blocks(self):
+        data = self._data(2)
+        self._write_src(data)
+
+        copy = native_copy.NativeCopy(self.src, self.dest, len(data), BLOCK,
+                                      workers=8)
+
+        self.assertEqual(2, copy.workers)
+
+    def test_copy_blocksize_aligned(self):
+        copy = native_copy.NativeCopy(self.src, self.dest, units.Mi, 1000)
+
+        self.assertEqual(native_copy.ALIGNMENT, copy.blocksize)
+
+    def test_copy_short_source(self):
+        data = self._data(3) + b'tail'
+        self._write_src(data)
+
+        stats = native_copy.NativeCopy(self.src, self.dest, 8 * BLOCK, BLOCK,
+                                       workers=4).run()
+
+        self.assertEqual(data, self._read_dest())
+        self.assertEqual(len(data), stats['bytes'])
+
+    def test_copy_truncates_dest(self):
+        data = self._data(2)
+        self._write_src(data)
+        with open(self.dest, 'wb') as f:
+            f.write(b'x' * 4 * BLOCK)
+
+        native_copy.NativeCopy(self.src, self.dest, len(data), BLOCK).run()
+
+        self.assertEqual(data, self._read_dest())
+
+    def test_copy_sparse(self):
+        zeros = b'\0' * BLOCK
+        data = self._data(1) + zeros + self._data(1) + zeros * 2
+        self._write_src(data)
+
+        stats = native_copy.NativeCopy(self.src, self.dest, len(data), BLOCK,
+                                       workers=2, sparse=True).run()
+
+        self.assertEqual(data, self._read_dest())
+        self.assertEqual(len(data), stats['bytes'])
+        self.assertEqual(3 * BLOCK, stats['sparse_bytes'])
+
+    @mock.patch('os.fdatasync')
+    def test_copy_sync(self, mock_sync):
+        data = self._data(1)
+        self._write_src(data)
+
+        native_copy.NativeCopy(self.src, self.dest, len(data), BLOCK,
+                               sync=True).run()
+
+        self.assertEqual(1, mock_sync.call_count)
+
+    def test_copy_direct(self):
+        data = self._data(4) + b'tail'
+        self._write_src(data)
+        try:
+            os.close(os.open(self.src, os.O_RDONLY | os.O_DIRECT))
+        except OSError as e:
+            if e.errno != errno.EINVAL:
+                raise
+            self.skipTest('O_DIRECT is not supported by %s' % self.tmpdir)
+
+        stats = native_copy.NativeCopy(self.src, self.dest, 8 * BLOCK, BLOCK,
+                                       workers=2, direct_read=True,
+                                       direct_write=True).run()
+
+        self.assertEqual(data, self._read_dest())
+        self.assertEqual(len(data), stats['bytes'])
+
+    def test_kernel_copy(self):
+        def fake_kernel_copy(src_fd, dest_fd, offset, count):
+            os.lseek(src_fd, offset, os.SEEK_SET)
+            os.lseek(dest_fd, offset, os.SEEK_SET)
+            return os.write(dest_fd, os.read(src_fd, min(count, 1000)))
+
+        method = mock.Mock(side_effect=fake_kernel_copy)
+        self.mock_object(native_copy, 'KERNEL_COPY_METHODS', [method])
+        data = self._data(3) + b'tail'
+        self._write_src(data)
+
+        stats = native_copy.NativeCopy(self.src, self.dest, 4 * BLOCK, BLOCK,
+                                       workers=2).run()
+
+        self.assertEqual(data, self._read_dest())
+        self.assertEqual(len(data), stats['bytes'])
+        self.assertEqual(0, stats['read'])
+
+    def test_kernel_copy_unsupported(self):
+        unsupported = mock.Mock(side_effect=OSError(errno.EXDEV, 'EXDEV'))
+        self.mock_object(native_copy, 'KERNEL_COPY_METHODS', [unsupported])
+        data = self._data(3)
+        self._write_src(data)
+
+        copy = native_copy.NativeCopy(self.src, self.dest, len(data), BLOCK)
+        copy.run()
+
+        self.assertEqual(data, self._read_dest())
+        self.assertEqual(1, unsupported.call_count)
+        self.assertEqual([], copy.kernel_copy_methods)
+
+    def test_kernel_copy_not_used_for_sparse_copies(self):
+        method = mock.Mock()
+        self.mock_object(native_copy, 'KERNEL_COPY_METHODS', [method])
+        data = self._data(1)
+        self._write_src(data)
+
+        native_copy.NativeCopy(self.src, self.dest, len(data), BLOCK,
+                               sparse=True).run()
+
+        self.assertFalse(method.called)
+        self.assertEqual(data, self._read_dest())
+
+    def test_copy_error(self):
+        self.assertRaises(OSError, native_copy.NativeCopy(
+            self.src, self.dest, BLOCK, BLOCK).run)
+
+    @mock.patch('cinder.utils.temporary_chown')
+    @mock.patch('os.access', return_value=False)
+    def test_copy_chown(self, mock_access, mock_chown):
+        data = self._data(1)
+        self._write_src(data)
+        open(self.dest, 'wb').close()
+
+        native_copy.NativeCopy(self.src, self.dest, len(data), BLOCK).run()
+
+        mock_chown.assert_has_calls([mock.call(self.src),
+                                     mock.call(self.dest)], any_order=True)
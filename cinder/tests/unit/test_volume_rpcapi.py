@@ -642,6 +642,25 @@ class VolumeRpcAPITestCase(test.TestCase):
                           backup=self.fake_backup_obj,
                           volume=self.fake_volume_obj, version='1.38')
 
+    @mock.patch('oslo_messaging.RPCClient.can_send_version', return_value=True)
+    def test_prewarm_image_cache(self, mock_can_send_version):
+        ctxt = context.RequestContext('fake_user', 'fake_project')
+        rpcapi = volume_rpcapi.VolumeAPI()
+        with mock.patch.object(rpcapi.client, 'prepare') as mock_prepare:
+            rpcapi.prewarm_image_cache(ctxt, 'fake_host@lvm#fake_pool',
+                                       'fake_image')
+
+        mock_prepare.assert_called_once_with(server='fake_host@lvm',
+                                             version='1.41')
+        mock_prepare.return_value.cast.assert_called_once_with(
+            ctxt, 'prewarm_image_cache', image_id='fake_image',
+            pool='fake_pool')
+
+        mock_can_send_version.return_value = False
+        self.assertRaises(exception.ServiceTooOld,
+                          rpcapi.prewarm_image_cache, ctxt, 'fake_host',
+                          'fake_image')
+
     @mock.patch('oslo_messaging.RPCClient.can_send_version', return_value=True)
     def test_secure_file_operations_enabled(self, mock_can_send_version):
         self._test_volume_api('secure_file_operations_enabled',
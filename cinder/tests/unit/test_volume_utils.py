@@ -19,10 +19,14 @@
 import datetime
 import io
 import mock
+import os
 import six
+import stat
+import tempfile
 
 from oslo_concurrency import processutils
 from oslo_config import cfg
+from oslo_utils import units
 
 from cinder import context
 from cinder import exception
@@ -396,6 +400,99 @@ class OdirectSupportTestCase(test.TestCase):
                                           run_as_root=True)
 
 
+class OdirectSupportCacheTestCase(test.TestCase):
+    def setUp(self):
+        super(OdirectSupportCacheTestCase, self).setUp()
+        self.flags(volume_odirect_cache_ttl=3600)
+        self.addCleanup(volume_utils.clear_odirect_support_cache)
+        self.src = self._create_tempfile()
+        self.dest = self._create_tempfile()
+        self.mock_exec = self.mock_object(utils, 'execute')
+
+    def _create_tempfile(self):
+        fd, path = tempfile.mkstemp()
+        os.close(fd)
+        self.addCleanup(os.remove, path)
+        return path
+
+    def test_cached_per_filesystem(self):
+        self.assertTrue(volume_utils.check_for_odirect_support(self.src,
+                                                               self.dest))
+        self.assertTrue(volume_utils.check_for_odirect_support(self.src,
+                                                               self.dest))
+        self.assertEqual(1, self.mock_exec.call_count)
+
+        # Another file on the same filesystem reuses the result.
+        other = self._create_tempfile()
+        self.assertTrue(volume_utils.check_for_odirect_support(self.src,
+                                                               other))
+        self.assertEqual(1, self.mock_exec.call_count)
+
+        # The input flag is probed separately.
+        self.assertTrue(volume_utils.check_for_odirect_support(
+            self.src, self.dest, 'iflag=direct'))
+        self.assertEqual(2, self.mock_exec.call_count)
+
+    def test_cached_per_device(self):
+        mock_stat = self.mock_object(os, 'stat')
+        mock_stat.return_value = mock.Mock(st_mode=stat.S_IFBLK | 0o660,
+                                           st_rdev=os.makedev(8, 16))
+        self.mock_exec.side_effect = processutils.ProcessExecutionError
+        self.assertFalse(volume_utils.check_for_odirect_support('/dev/abc',
+                                                                '/dev/sdb'))
+        self.assertFalse(volume_utils.check_for_odirect_support('/dev/abc',
+                                                                '/dev/sdb'))
+        self.assertEqual(1, self.mock_exec.call_count)
+
+        mock_stat.return_value.st_rdev = os.makedev(8, 32)
+        self.assertFalse(volume_utils.check_for_odirect_support('/dev/abc',
+                                                                '/dev/sdc'))
+        self.assertEqual(2, self.mock_exec.call_count)
+
+    def test_not_cached_missing_path(self):
+        volume_utils.check_for_odirect_support('/dev/abc', '/dev/def')
+        volume_utils.check_for_odirect_support('/dev/abc', '/dev/def')
+        self.assertEqual(2, self.mock_exec.call_count)
+
+    def test_cache_disabled(self):
+        self.flags(volume_odirect_cache_ttl=0)
+        volume_utils.check_for_odirect_support(self.src, self.dest)
+        volume_utils.check_for_odirect_support(self.src, self.dest)
+        self.assertEqual(2, self.mock_exec.call_count)
+
+    @mock.patch('time.time')
+    def test_cache_expired(self, mock_time):
+        mock_time.return_value = 1000
+        volume_utils.check_for_odirect_support(self.src, self.dest)
+        mock_time.return_value = 1000 + 3599
+        volume_utils.check_for_odirect_support(self.src, self.dest)
+        self.assertEqual(1, self.mock_exec.call_count)
+        mock_time.return_value = 1000 + 3600
+        volume_utils.check_for_odirect_support(self.src, self.dest)
+        self.assertEqual(2, self.mock_exec.call_count)
+
+    def test_clear_cache(self):
+        volume_utils.check_for_odirect_support(self.src, self.dest)
+        volume_utils.clear_odirect_support_cache(self.dest)
+        volume_utils.check_for_odirect_support(self.src, self.dest)
+        self.assertEqual(2, self.mock_exec.call_count)
+
+        volume_utils.clear_odirect_support_cache()
+        volume_utils.check_for_odirect_support(self.src, self.dest)
+        self.assertEqual(3, self.mock_exec.call_count)
+
+    def test_copy_failure_clears_cache(self):
+        execute = mock.Mock(side_effect=processutils.ProcessExecutionError)
+        self.assertRaises(processutils.ProcessExecutionError,
+                          volume_utils.copy_volume, self.src, self.dest, 1,
+                          '1M', execute=execute)
+        self.assertEqual(2, self.mock_exec.call_count)
+        self.assertEqual({}, volume_utils._odirect_support_cache)
+
+        volume_utils.check_for_odirect_support(self.src, self.dest)
+        self.assertEqual(3, self.mock_exec.call_count)
+
+
 class ClearVolumeTestCase(test.TestCase):
     @mock.patch('cinder.volume.utils.copy_volume', return_value=None)
     @mock.patch('cinder.volume.utils.CONF')
@@ -583,6 +680,67 @@ class CopyVolumeTestCase(test.TestCase):
                                           'iflag=direct', 'oflag=direct',
                                           'conv=sparse', run_as_root=True)
 
+    @mock.patch('cinder.volume.native_copy.NativeCopy')
+    @mock.patch('cinder.volume.utils.check_for_odirect_support',
+                side_effect=[False, True])
+    @mock.patch('cinder.utils.execute')
+    def test_copy_volume_native(self, mock_exec, mock_support, mock_native):
+        self.flags(volume_copy_engine='native',
+                   volume_copy_native_workers=2)
+        mock_native.return_value.run.return_value = {
+            'bytes': units.Gi, 'sparse_bytes': 0, 'open': 0, 'read': 0,
+            'write': 0, 'kernel': 0, 'sync': 0, 'workers': 2}
+        output = volume_utils.copy_volume('/dev/zero', '/dev/null', 1024,
+                                          '1M', sync=True, sparse=True,
+                                          throttle=throttling.Throttle())
+        self.assertIsNone(output)
+        mock_native.assert_called_once_with(
+            '/dev/zero', '/dev/null', units.Gi, units.Mi, workers=2,
+            direct_read=False, direct_write=True, sync=True, sparse=True)
+        self.assertFalse(mock_exec.called)
+
+    @mock.patch('cinder.volume.native_copy.NativeCopy')
+    @mock.patch('cinder.volume.utils.check_for_odirect_support',
+                return_value=False)
+    @mock.patch('cinder.utils.execute')
+    def test_copy_volume_native_fallback(self, mock_exec, mock_support,
+                                         mock_native):
+        self.flags(volume_copy_engine='native')
+        mock_native.return_value.run.side_effect = OSError
+        output = volume_utils.copy_volume('/dev/zero', '/dev/null', 1024,
+                                          '1M', execute=utils.execute,
+                                          throttle=throttling.Throttle())
+        self.assertIsNone(output)
+        mock_exec.assert_called_once_with('dd', 'if=/dev/zero', 'of=/dev/null',
+                                          'count=1024', 'bs=1M',
+                                          run_as_root=True)
+
+    @mock.patch('cinder.volume.native_copy.NativeCopy')
+    @mock.patch('cinder.volume.utils.check_for_odirect_support',
+                return_value=False)
+    @mock.patch('cinder.utils.execute')
+    def test_copy_volume_native_dd_with_ionice(self, mock_exec, mock_support,
+                                               mock_native):
+        self.flags(volume_copy_engine='native')
+        volume_utils.copy_volume('/dev/zero', '/dev/null', 1024, '1M',
+                                 execute=utils.execute, ionice='-c3',
+                                 throttle=throttling.Throttle())
+        self.assertFalse(mock_native.called)
+        self.assertEqual(1, mock_exec.call_count)
+
+    @mock.patch('cinder.volume.native_copy.NativeCopy')
+    @mock.patch('cinder.volume.utils.check_for_odirect_support',
+                return_value=False)
+    @mock.patch('cinder.utils.execute')
+    def test_copy_volume_native_dd_when_throttled(self, mock_exec,
+                                                  mock_support, mock_native):
+        self.flags(volume_copy_engine='native')
+        volume_utils.copy_volume('/dev/zero', '/dev/null', 1024, '1M',
+                                 execute=utils.execute,
+                                 throttle=throttling.Throttle(['cgexec']))
+        self.assertFalse(mock_native.called)
+        self.assertEqual(1, mock_exec.call_count)
+
     @mock.patch('cinder.volume.utils._copy_volume_with_file')
     def test_copy_volume_handles(self, mock_copy):
         handle1 = io.RawIOBase()
@@ -701,6 +701,8 @@ class CreateVolumeFlowManagerImageCacheTestCase(test.TestCase):
         self.mock_db = mock.MagicMock()
         self.mock_driver = mock.MagicMock()
         self.mock_cache = mock.MagicMock()
+        self.mock_cache.find_entry.return_value = None
+        self.mock_cache.coalesce.return_value.__enter__.return_value = True
         self.mock_image_service = mock.MagicMock()
         self.mock_volume_manager = mock.MagicMock()
 
@@ -914,6 +916,16 @@ class CreateVolumeFlowManagerImageCacheTestCase(test.TestCase):
             _create_image_cache_volume_entry.assert_called_once_with(
                 self.ctxt, volume, image_id, image_meta))
 
+        # The download and entry creation are coalesced with the other
+        # misses of the image, which look the entry up again
+        self.mock_cache.coalesce.assert_called_once_with('foo@bar#pool',
+                                                         image_id)
+        coalesce = self.mock_cache.coalesce.return_value
+        self.assertTrue(coalesce.__enter__.called)
+        self.assertTrue(coalesce.__exit__.called)
+        self.mock_cache.find_entry.assert_called_once_with(
+            self.ctxt, 'foo@bar#pool', image_id, image_meta)
+
         mock_handle_bootable.assert_called_once_with(
             self.ctxt,
             volume['id'],
@@ -921,6 +933,78 @@ class CreateVolumeFlowManagerImageCacheTestCase(test.TestCase):
             image_meta=image_meta
         )
 
+    def test_create_from_image_cache_miss_entry_created_while_waiting(
+            self, mock_get_internal_context, mock_create_from_img_dl,
+            mock_create_from_src, mock_handle_bootable, mock_fetch_img):
+        self.mock_driver.clone_image.return_value = (None, False)
+        self.mock_cache.get_entry.return_value = None
+        image_volume_id = '70a599e0-31e7-49b7-b260-868f441e862b'
+        self.mock_cache.find_entry.return_value = {
+            'volume_id': image_volume_id
+        }
+        coalesce = self.mock_cache.coalesce.return_value
+        mock_create_from_src.side_effect = (
+            lambda *args: self.assertTrue(coalesce.__exit__.called))
+        volume = fake_volume.fake_volume_obj(self.ctxt, host='foo@bar#pool')
+        image_id = 'c7a8b8d4-e519-46c7-a0df-ddf1b9b9fff2'
+
+        manager = create_volume_manager.CreateVolumeFromSpecTask(
+            self.mock_volume_manager,
+            self.mock_db,
+            self.mock_driver,
+            image_volume_cache=self.mock_cache
+        )
+
+        manager._create_from_image(self.ctxt,
+                                   volume,
+                                   'someImageLocationStr',
+                                   image_id,
+                                   mock.Mock(),
+                                   self.mock_image_service)
+
+        # The entry is cloned once the lock is released
+        mock_create_from_src.assert_called_once_with(self.ctxt,
+                                                     volume,
+                                                     image_volume_id)
+        self.assertFalse(mock_create_from_img_dl.called)
+
+    def test_create_from_image_cache_miss_not_locked(
+            self, mock_get_internal_context, mock_create_from_img_dl,
+            mock_create_from_src, mock_handle_bootable, mock_fetch_img):
+        mock_get_internal_context.return_value = self.ctxt
+        self.mock_driver.clone_image.return_value = (None, False)
+        self.mock_cache.get_entry.return_value = None
+        coalesce = self.mock_cache.coalesce.return_value
+        coalesce.__enter__.return_value = False
+        volume = fake_volume.fake_volume_obj(self.ctxt, host='foo@bar#pool')
+        image_id = 'c7a8b8d4-e519-46c7-a0df-ddf1b9b9fff2'
+        image_meta = mock.Mock()
+
+        manager = create_volume_manager.CreateVolumeFromSpecTask(
+            self.mock_volume_manager,
+            self.mock_db,
+            self.mock_driver,
+            image_volume_cache=self.mock_cache
+        )
+
+        with mock.patch.object(manager, '_create_from_image_fetch',
+                               side_effect=lambda *args, **kwargs:
+                               self.assertTrue(coalesce.__exit__.called)
+                               ) as mock_fetch:
+            manager._create_from_image(self.ctxt,
+                                       volume,
+                                       'someImageLocationStr',
+                                       image_id,
+                                       image_meta,
+                                       self.mock_image_service)
+
+        # Without the lock, the image is downloaded after releasing it,
+        # in parallel with the other misses
+        mock_fetch.assert_called_once_with(
+            self.ctxt, volume, 'someImageLocationStr', image_id,
+            image_meta, self.mock_image_service, cache_context=self.ctxt)
+        self.assertFalse(mock_create_from_src.called)
+
     @mock.patch('cinder.db.volume_update')
     @mock.patch('cinder.objects.Volume.get_by_id')
     @mock.patch('cinder.image.image_utils.qemu_img_info')
@@ -1658,6 +1658,34 @@ class API(base.Base):
         if not self.volume_rpcapi.thaw_host(ctxt, host):
             return "Backend reported error during thaw_host operation."
 
+    def prewarm_image_cache(self, ctxt, image_id, hosts):
+        """Add an image to the image-volume cache of backends or pools.
+
+        The backends prewarm their cache asynchronously, each running a
+        bounded number of requests at a time.
+        """
+        self.image_service.show(ctxt, image_id)
+
+        admin_ctxt = context.get_admin_context()
+        for host in hosts:
+            svc_host = volume_utils.extract_host(host, 'backend')
+            service = objects.Service.get_by_args(
+                admin_ctxt, svc_host, 'cinder-volume')
+            if service.disabled or not utils.service_is_up(service):
+                msg = _('Volume service %s is down or disabled.') % svc_host
+                raise exception.InvalidInput(reason=msg)
+
+        for host in hosts:
+            self.volume_rpcapi.prewarm_image_cache(ctxt, host, image_id)
+        LOG.info(_LI('Prewarming the image-volume cache of %(hosts)s with '
+                     'image %(image_id)s.'),
+                 {'hosts': ', '.join(hosts), 'image_id': image_id})
+
+    def get_image_cache_entries(self, ctxt, image_id=None, host=None):
+        """Return the image-volume cache entries, by host."""
+        return self.db.image_volume_cache_get_all(ctxt, image_id=image_id,
+                                                  host=host)
+
     def check_volume_filters(self, filters):
         '''Sets the user filter value to accepted format'''
         booleans = self.db.get_booleans_for_table('volume')
@@ -116,6 +116,26 @@ volume_opts = [
                default='1M',
                help='The default block size used when copying/clearing '
                     'volumes'),
+    cfg.IntOpt('volume_odirect_cache_ttl',
+               default=3600,
+               min=0,
+               help='Time in seconds for which the result of probing a '
+                    'device or filesystem for O_DIRECT support is reused '
+                    'when copying/clearing volumes and converting images. '
+                    '0 => probe before every operation'),
+    cfg.StrOpt('volume_copy_engine',
+               default='dd',
+               choices=['dd', 'native'],
+               help='Method used to copy/clear volumes between local '
+                    'paths. "native" copies in-process with several '
+                    'outstanding I/Os, using copy_file_range or sendfile '
+                    'where available. dd is still used when the copy is '
+                    'throttled or run with an I/O priority.'),
+    cfg.IntOpt('volume_copy_native_workers',
+               default=4,
+               min=1,
+               help='Number of concurrent I/O workers used by the native '
+                    'volume copy engine'),
     cfg.StrOpt('volume_copy_blkio_cgroup_name',
                default='cinder-volume-copy',
                help='The blkio cgroup name to be used to limit bandwidth '
@@ -145,6 +165,13 @@ volume_opts = [
                     'order to enable RDMA, this parameter should be set '
                     'with the value "iser". The supported iSCSI protocol '
                     'values are "iscsi" and "iser".'),
+    cfg.FloatOpt('lio_save_batch_window',
+                 default=0.1,
+                 help='Number of seconds the lioadm target helper waits for '
+                      'other target changes before saving the LIO '
+                      'configuration, so that they are saved together. The '
+                      'changes made while the configuration is being saved '
+                      'are always saved together. 0 => do not wait.'),
     cfg.StrOpt('driver_client_cert_key',
                help='The path to the client certificate key for verification, '
                     'if the driver supports it.'),
@@ -244,6 +271,35 @@ volume_opts = [
                default=0,
                help='Max number of entries allowed in the image volume cache. '
                     '0 => unlimited.'),
+    cfg.StrOpt('image_volume_cache_eviction_policy',
+               default='lru',
+               choices=['lru', 'lfu', 'gdsf'],
+               help='Policy used to choose the image volume cache entries '
+                    'evicted to make room for new ones: the least recently '
+                    'used (lru), the least frequently used (lfu), or the '
+                    'ones with the fewest hits per GB, aged by the time they '
+                    'were last used (gdsf).'),
+    cfg.IntOpt('image_volume_cache_index_refresh_interval',
+               default=300,
+               min=0,
+               help='Number of seconds the volume service trusts its '
+                    'in-memory index of the image volume cache entries '
+                    'before reloading it from the database. 0 => reload it '
+                    'each time an entry is created.'),
+    cfg.IntOpt('image_volume_cache_prewarm_concurrency',
+               default=2,
+               min=1,
+               help='Maximum number of images the volume service adds to '
+                    'the image volume cache at the same time when asked to '
+                    'prewarm it. The other requests are queued.'),
+    cfg.IntOpt('image_volume_cache_coalesce_timeout',
+               default=1800,
+               min=0,
+               help='Number of seconds a volume created from an image '
+                    'missing from the image volume cache waits for another '
+                    'request to add this image to the cache, so that it can '
+                    'be cloned from the cache entry instead of downloading '
+                    'the image again. 0 => do not wait.'),
     cfg.BoolOpt('report_discard_supported',
                 default=False,
                 help='Report to clients of Cinder that the backend supports '
@@ -68,7 +68,14 @@ volume_opts = [
                  help='max_over_subscription_ratio setting for the LVM '
                       'driver.  If set, this takes precedence over the '
                       'general max_over_subscription_ratio option.  If '
-                      'None, the general option is used.')
+                      'None, the general option is used.'),
+    cfg.IntOpt('lvm_report_cache_ttl',
+               default=10,
+               min=0,
+               help='Number of seconds the LVs reported by LVM along with '
+                    'the volume group capacity are reused to look up '
+                    'volumes, instead of running lvs again.  Changes made '
+                    'by the driver refresh them.  0 => always query LVM.'),
 ]
 
 CONF = cfg.CONF
@@ -236,7 +243,8 @@ class LVMVolumeDriver(driver.VolumeDriver):
         thin_enabled = self.configuration.lvm_type == 'thin'
 
         # Calculate the total volumes used by the VG group.
-        # This includes volumes and snapshots.
+        # This includes volumes and snapshots, reported along with the VG
+        # info above.
         total_volumes = len(self.vg.get_volumes())
 
         # Skip enabled_pools setting, treat the whole backend as one pool
@@ -280,7 +288,9 @@ class LVMVolumeDriver(driver.VolumeDriver):
                                   root_helper,
                                   lvm_type=self.configuration.lvm_type,
                                   executor=self._execute,
-                                  lvm_conf=lvm_conf_file)
+                                  lvm_conf=lvm_conf_file,
+                                  report_cache_ttl=(
+                                      self.configuration.lvm_report_cache_ttl))
 
             except exception.VolumeGroupNotFound:
                 message = (_("Volume Group %s does not exist") %
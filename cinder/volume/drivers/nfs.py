@@ -17,6 +17,7 @@ import errno
 import os
 import time
 
+import eventlet
 from os_brick.remotefs import remotefs as remotefs_brick
 from oslo_concurrency import processutils as putils
 from oslo_config import cfg
@@ -57,6 +58,15 @@ nfs_opts = [
                      'raising an error.  At least one attempt will be '
                      'made to mount an NFS share, regardless of the '
                      'value specified.')),
+    cfg.IntOpt('nfs_allocation_scan_interval',
+               default=600,
+               min=0,
+               help=('Number of seconds between the scans of the files of '
+                     'an NFS share to compute the space allocated on it. '
+                     'In between, the allocated space is updated by the '
+                     'driver as volumes are created, extended and deleted, '
+                     'and the scans run in the background.  0 => scan the '
+                     'share each time its allocated space is needed.')),
 ]
 
 CONF = cfg.CONF
@@ -105,6 +115,17 @@ class NfsDriver(driver.ExtendVD, remotefs.RemoteFSDriver):
         self.max_over_subscription_ratio = (
             self.configuration.max_over_subscription_ratio)
 
+        # NFS share -> bytes allocated on the share, from the last scan and
+        # the volumes created, extended and deleted since.
+        self._allocated = {}
+        # NFS share -> bytes of all the files of the share, snapshots
+        # included, kept like _allocated when the scans are not disabled.
+        self._provisioned = {}
+        # NFS share -> time of the last scan
+        self._allocated_scanned_at = {}
+        # NFS share -> bytes allocated while the share is being scanned
+        self._allocated_changes = {}
+
     def do_setup(self, context):
         """Any initialization the volume driver does while starting."""
         super(NfsDriver, self).do_setup(context)
@@ -289,12 +310,101 @@ class NfsDriver(driver.ExtendVD, remotefs.RemoteFSDriver):
         total_available = block_size * blocks_avail
         total_size = block_size * blocks_total
 
-        du, _ = self._execute('du', '-sb', '--apparent-size', '--exclude',
-                              '*snapshot*', mount_point,
-                              run_as_root=run_as_root)
-        total_allocated = float(du.split()[0])
+        total_allocated = self._get_allocated(nfs_share, mount_point)
         return total_size, total_available, total_allocated
 
+    @property
+    def _allocation_scan_interval(self):
+        return getattr(self.configuration, 'nfs_allocation_scan_interval',
+                       CONF.nfs_allocation_scan_interval)
+
+    def _get_allocated(self, nfs_share, mount_point=None):
+        """Return the bytes allocated on the NFS share.
+
+        The share is scanned the first time, then again in the background
+        every nfs_allocation_scan_interval seconds.
+        """
+        interval = self._allocation_scan_interval
+        if not interval or nfs_share not in self._allocated:
+            self._scan_allocated(nfs_share, mount_point)
+        elif (time.time() - self._allocated_scanned_at[nfs_share] >=
+                interval):
+            # Do not start another scan until this one is done or expires.
+            self._allocated_scanned_at[nfs_share] = time.time()
+            eventlet.spawn_n(self._scan_allocated_in_background, nfs_share)
+        return self._allocated[nfs_share]
+
+    def _scan_allocated(self, nfs_share, mount_point=None):
+        """Set the bytes allocated on the NFS share from its files.
+
+        The changes recorded while the share is scanned are added to the
+        size of its files.
+        """
+        if mount_point is None:
+            mount_point = self._get_mount_point_for_share(nfs_share)
+        self._allocated_changes[nfs_share] = 0
+        du_all = None
+        try:
+            du, _ = self._execute('du', '-sb', '--apparent-size',
+                                  '--exclude', '*snapshot*', mount_point,
+                                  run_as_root=self._execute_as_root)
+            if self._allocation_scan_interval:
+                du_all, _ = self._execute('du', '-sb', '--apparent-size',
+                                          mount_point,
+                                          run_as_root=self._execute_as_root)
+        finally:
+            changes = self._allocated_changes.pop(nfs_share, 0)
+        self._allocated[nfs_share] = float(du.split()[0]) + changes
+        if du_all is not None:
+            self._provisioned[nfs_share] = float(du_all.split()[0]) + changes
+        self._allocated_scanned_at[nfs_share] = time.time()
+
+    def _scan_allocated_in_background(self, nfs_share):
+        try:
+            self._scan_allocated(nfs_share)
+        except Exception:
+            LOG.exception(_LE('Failed to compute the space allocated on NFS '
+                              'share %s.'), nfs_share)
+
+    def _update_allocated(self, nfs_share, size_in_gib):
+        """Record size_in_gib GB more, or less, allocated on the share."""
+        delta = size_in_gib * units.Gi
+        if nfs_share in self._allocated:
+            self._allocated[nfs_share] += delta
+        if nfs_share in self._provisioned:
+            self._provisioned[nfs_share] += delta
+        if nfs_share in self._allocated_changes:
+            self._allocated_changes[nfs_share] += delta
+
+    def _get_provisioned_capacity(self):
+        """Returns the provisioned capacity.
+
+        Get the sum of the sizes of all the files of the shares, snapshots
+        included.
+        """
+        if not self._allocation_scan_interval:
+            return super(NfsDriver, self)._get_provisioned_capacity()
+        provisioned_size = 0.0
+        for share in self.shares.keys():
+            # Scans the share if needed.
+            self._get_allocated(share)
+            provisioned_size += self._provisioned[share]
+        return round(provisioned_size / units.Gi, 2)
+
+    def create_volume(self, volume):
+        """Creates a volume."""
+        model_update = super(NfsDriver, self).create_volume(volume)
+        self._update_allocated(model_update['provider_location'],
+                               volume['size'])
+        return model_update
+
+    def delete_volume(self, volume):
+        """Deletes a logical volume."""
+        super(NfsDriver, self).delete_volume(volume)
+        if volume['provider_location']:
+            self._update_allocated(volume['provider_location'],
+                                   -volume['size'])
+
     def _get_mount_point_base(self):
         return self.base
 
@@ -314,6 +424,7 @@ class NfsDriver(driver.ExtendVD, remotefs.RemoteFSDriver):
         if not self._is_file_size_equal(path, new_size):
             raise exception.ExtendVolumeError(
                 reason='Resizing image file failed.')
+        self._update_allocated(volume['provider_location'], extend_by)
 
     def _is_file_size_equal(self, path, size):
         """Checks if file size at path is equal to size."""
@@ -14,11 +14,14 @@
 """RADOS Block Device Driver"""
 
 from __future__ import absolute_import
+import collections
 import io
 import json
 import math
 import os
 import tempfile
+import threading
+import time
 
 from eventlet import tpool
 from oslo_config import cfg
@@ -85,13 +88,175 @@ rbd_opts = [
                       'failed.')),
     cfg.IntOpt('rados_connection_interval', default=5,
                help=_('Interval value (in seconds) between connection '
-                      'retries to ceph cluster.'))
+                      'retries to ceph cluster.')),
+    cfg.IntOpt('rados_connection_pool_size', default=4, min=0,
+               help=_('Maximum number of idle connections to the ceph '
+                      'cluster kept for reuse per RADOS pool, instead of '
+                      'connecting to the cluster for every operation. 0 '
+                      'disables the reuse of connections.')),
+    cfg.IntOpt('rados_connection_pool_idle_timeout', default=300, min=1,
+               help=_('Number of seconds an idle connection to the ceph '
+                      'cluster is kept for reuse before it is closed.')),
 ]
 
 CONF = cfg.CONF
 CONF.register_opts(rbd_opts)
 
 
+class RADOSConnectionPool(object):
+    """Connections to a ceph cluster kept for reuse, per RADOS pool.
+
+    Connecting to the cluster takes a round of handshakes with the monitors,
+    so the connections given back with put are kept idle, up to max_size
+    per RADOS pool, and handed out again by get.  Connections idle for more
+    than idle_timeout seconds, and connections which are no longer open,
+    are closed.
+    """
+
+    def __init__(self, max_size, idle_timeout):
+        self.max_size = max_size
+        self.idle_timeout = idle_timeout
+        self._lock = threading.Lock()
+        # RADOS pool -> [(client, ioctx, time given back)], in the order
+        # they were given back.
+        self._idle = collections.defaultdict(list)
+        # id(ioctx) -> (RADOS pool, time handed out)
+        self._in_use = {}
+        self._stats = collections.defaultdict(
+            lambda: {'created': 0, 'reused': 0, 'closed': 0,
+                     'connect_time': 0.0, 'ops': 0, 'op_time': 0.0,
+                     'max_op_time': 0.0})
+
+    @staticmethod
+    def _is_open(client, ioctx):
+        return client.state == 'connected' and ioctx.state == 'open'
+
+    def _close(self, connections):
+        for pool, client, ioctx in connections:
+            # closing an ioctx cannot raise an exception
+            ioctx.close()
+            client.shutdown()
+            if pool is not None:
+                with self._lock:
+                    self._stats[pool]['closed'] += 1
+
+    def _reap(self, now):
+        """Remove the expired idle connections, and return them."""
+        expired = []
+        with self._lock:
+            for pool, idle in self._idle.items():
+                kept = []
+                for client, ioctx, used in idle:
+                    if now - used >= self.idle_timeout:
+                        expired.append((pool, client, ioctx))
+                    else:
+                        kept.append((client, ioctx, used))
+                idle[:] = kept
+        return expired
+
+    def reap(self):
+        """Close the connections idle for more than idle_timeout."""
+        self._close(self._reap(time.time()))
+
+    def get(self, pool, connect):
+        """Return a (client, ioctx) connection to a RADOS pool.
+
+        :param pool: the RADOS pool to open
+        :param connect: called with pool to create a connection when no
+                        idle one can be reused
+        """
+        started = time.time()
+        stale = self._reap(started)
+        connection = None
+        with self._lock:
+            idle = self._idle[pool]
+            while idle and connection is None:
+                client, ioctx, _used = idle.pop()
+                if self._is_open(client, ioctx):
+                    connection = (client, ioctx)
+                else:
+                    stale.append((pool, client, ioctx))
+        self._close(stale)
+
+        if connection is None:
+            connection = connect(pool)
+            with self._lock:
+                self._stats[pool]['created'] += 1
+                self._stats[pool]['connect_time'] += time.time() - started
+        else:
+            with self._lock:
+                self._stats[pool]['reused'] += 1
+        with self._lock:
+            self._in_use[id(connection[1])] = (pool, time.time())
+        return connection
+
+    def put(self, client, ioctx):
+        """Give back a connection returned by get, or close it."""
+        now = time.time()
+        with self._lock:
+            pool, taken = self._in_use.pop(id(ioctx), (None, now))
+            if pool is not None:
+                stats = self._stats[pool]
+                stats['ops'] += 1
+                stats['op_time'] += now - taken
+                stats['max_op_time'] = max(stats['max_op_time'], now - taken)
+                idle = self._idle[pool]
+                if (len(idle) < self.max_size and
+                        self._is_open(client, ioctx)):
+                    idle.append((client, ioctx, now))
+                    return
+        self._close([(pool, client, ioctx)])
+
+    def stats(self):
+        """Return the occupancy and the latencies of the pool.
+
+        :returns: dictionary of RADOS pool -> dictionary of the number of
+                  idle and in use connections, of the connections created,
+                  reused and closed, and of the connection and operation
+                  times in seconds
+        """
+        with self._lock:
+            in_use = collections.Counter(
+                pool for pool, _taken in self._in_use.values())
+            stats = {}
+            for pool, pool_stats in self._stats.items():
+                pool_stats = dict(pool_stats,
+                                  idle=len(self._idle[pool]),
+                                  in_use=in_use[pool])
+                created = pool_stats['created']
+                pool_stats['avg_connect_time'] = (
+                    pool_stats['connect_time'] / created if created else 0.0)
+                ops = pool_stats['ops']
+                pool_stats['avg_op_time'] = (
+                    pool_stats['op_time'] / ops if ops else 0.0)
+                stats[pool] = pool_stats
+        return stats
+
+
+# (rados_id, clustername, conffile) -> RADOSConnectionPool
+_connection_pools = {}
+_connection_pools_lock = threading.Lock()
+
+
+def get_connection_pool(rados_id, clustername, conffile, max_size,
+                        idle_timeout):
+    """Return the connection pool shared by the users of a cluster.
+
+    Connections are shared by all the drivers of the process connecting to
+    the same cluster with the same credentials, the size and timeout of the
+    last one apply.
+    """
+    key = (rados_id, clustername, conffile)
+    with _connection_pools_lock:
+        connection_pool = _connection_pools.get(key)
+        if connection_pool is None:
+            connection_pool = RADOSConnectionPool(max_size, idle_timeout)
+            _connection_pools[key] = connection_pool
+        connection_pool.max_size = max_size
+        connection_pool.idle_timeout = idle_timeout
+    return connection_pool
+
+
 class RBDImageMetadata(object):
     """RBD image metadata to be used with RBDImageIOWrapper."""
     def __init__(self, image, pool, user, conf):
@@ -314,10 +479,25 @@ class RBDDriver(driver.TransferVD, driver.ExtendVD,
             args.extend(['--cluster', self.configuration.rbd_cluster_name])
         return args
 
+    def _get_connection_pool(self):
+        return get_connection_pool(
+            self.configuration.rbd_user,
+            self.configuration.rbd_cluster_name,
+            self.configuration.rbd_ceph_conf,
+            self.configuration.rados_connection_pool_size,
+            self.configuration.rados_connection_pool_idle_timeout)
+
+    def _connect_to_rados(self, pool=None):
+        if pool is not None:
+            pool = utils.convert_str(pool)
+        else:
+            pool = self.configuration.rbd_pool
+        return self._get_connection_pool().get(pool, self._new_connection)
+
     @utils.retry(exception.VolumeBackendAPIException,
                  CONF.rados_connection_interval,
                  CONF.rados_connection_retries)
-    def _connect_to_rados(self, pool=None):
+    def _new_connection(self, pool):
         LOG.debug("opening connection to ceph cluster (timeout=%s).",
                   self.configuration.rados_connect_timeout)
 
@@ -325,10 +505,6 @@ class RBDDriver(driver.TransferVD, driver.ExtendVD,
             rados_id=self.configuration.rbd_user,
             clustername=self.configuration.rbd_cluster_name,
             conffile=self.configuration.rbd_ceph_conf)
-        if pool is not None:
-            pool = utils.convert_str(pool)
-        else:
-            pool = self.configuration.rbd_pool
 
         try:
             if self.configuration.rados_connect_timeout >= 0:
@@ -345,9 +521,7 @@ class RBDDriver(driver.TransferVD, driver.ExtendVD,
             raise exception.VolumeBackendAPIException(data=msg)
 
     def _disconnect_from_rados(self, client, ioctx):
-        # closing an ioctx cannot raise an exception
-        ioctx.close()
-        client.shutdown()
+        self._get_connection_pool().put(client, ioctx)
 
     def _get_backup_snaps(self, rbd_image):
         """Get list of any backup snapshots that exist on this volume.
@@ -412,6 +586,9 @@ class RBDDriver(driver.TransferVD, driver.ExtendVD,
         except self.rados.Error:
             # just log and return unknown capacities
             LOG.exception(_LE('error refreshing volume stats'))
+        connection_pool = self._get_connection_pool()
+        connection_pool.reap()
+        LOG.debug("RADOS connection pool stats: %s", connection_pool.stats())
         self._stats = stats
 
     def get_volume_stats(self, refresh=False):
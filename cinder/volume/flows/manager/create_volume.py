@@ -687,6 +687,47 @@ class CreateVolumeFromSpecTask(flow_utils.CinderTask):
                             '%(exception)s'), {'exception': e})
         return None, False
 
+    def _create_from_image_cache_miss(self, context, internal_context,
+                                      volume_ref, image_location, image_id,
+                                      image_meta, image_service):
+        """Create the volume after a miss of the image-volume cache.
+
+        Concurrent misses of the same image wait for the first one to
+        create the cache entry and then clone it in parallel.  The lock is
+        only held to download the image and create the entry.
+        """
+        cache = self.image_volume_cache
+        with cache.coalesce(volume_ref['host'], image_id) as locked:
+            # Another request may have created the entry while this one
+            # was waiting.
+            cache_entry = None
+            try:
+                cache_entry = cache.find_entry(internal_context,
+                                               volume_ref['host'], image_id,
+                                               image_meta)
+            except exception.CinderException as e:
+                LOG.warning(_LW('Failed to look up the image-volume cache, '
+                                'will fall back to default behavior. Error: '
+                                '%(exception)s'), {'exception': e})
+            if locked and not cache_entry:
+                return self._create_from_image_fetch(
+                    context, volume_ref, image_location, image_id,
+                    image_meta, image_service, cache_context=internal_context)
+
+        if cache_entry:
+            try:
+                LOG.debug('Creating from source image-volume %(volume_id)s',
+                          {'volume_id': cache_entry['volume_id']})
+                return self._create_from_source_volume(
+                    context, volume_ref, cache_entry['volume_id'])
+            except exception.CinderException as e:
+                LOG.warning(_LW('Failed to create volume from image-volume '
+                                'cache, will fall back to default behavior. '
+                                'Error: %(exception)s'), {'exception': e})
+        return self._create_from_image_fetch(
+            context, volume_ref, image_location, image_id, image_meta,
+            image_service, cache_context=internal_context)
+
     def _create_from_image(self, context, volume_ref,
                            image_location, image_id, image_meta,
                            image_service, **kwargs):
@@ -715,7 +756,6 @@ class CreateVolumeFromSpecTask(flow_utils.CinderTask):
                                                             image_location,
                                                             image_meta)
         # Try and use the image cache.
-        should_create_cache_entry = False
         if self.image_volume_cache and not cloned:
             internal_context = cinder_context.get_internal_tenant_context()
             if not internal_context:
@@ -730,43 +770,64 @@ class CreateVolumeFromSpecTask(flow_utils.CinderTask):
                     image_meta
                 )
                 if not cloned:
-                    should_create_cache_entry = True
+                    model_update = self._create_from_image_cache_miss(
+                        context, internal_context, volume_ref,
+                        image_location, image_id, image_meta, image_service)
+                    cloned = True
 
         # Fall back to default behavior of creating volume,
         # download the image data and copy it into the volume.
+        if not cloned:
+            model_update = self._create_from_image_fetch(
+                context, volume_ref, image_location, image_id, image_meta,
+                image_service)
+
+        self._handle_bootable_volume_glance_meta(context, volume_ref.id,
+                                                 image_id=image_id,
+                                                 image_meta=image_meta)
+        return model_update
+
+    def _create_from_image_fetch(self, context, volume_ref, image_location,
+                                 image_id, image_meta, image_service,
+                                 cache_context=None):
+        """Download the image into the volume.
+
+        If cache_context is given, an image-volume cache entry is created
+        from the volume in this context.
+        """
+        should_create_cache_entry = cache_context is not None
         original_size = volume_ref['size']
         try:
-            if not cloned:
-                with image_utils.TemporaryImages.fetch(
-                        image_service, context, image_id) as tmp_image:
-                    # Try to create the volume as the minimal size, then we can
-                    # extend once the image has been downloaded.
-                    if should_create_cache_entry:
-                        data = image_utils.qemu_img_info(tmp_image)
-
-                        virtual_size = int(
-                            math.ceil(float(data.virtual_size) / units.Gi))
-
-                        if virtual_size > volume_ref.size:
-                            params = {'image_size': virtual_size,
-                                      'volume_size': volume_ref.size}
-                            reason = _("Image virtual size is %(image_size)dGB"
-                                       " and doesn't fit in a volume of size"
-                                       " %(volume_size)dGB.") % params
-                            raise exception.ImageUnacceptable(
-                                image_id=image_id, reason=reason)
-
-                        if virtual_size and virtual_size != original_size:
-                            volume_ref.size = virtual_size
-                            volume_ref.save()
-
-                    model_update = self._create_from_image_download(
-                        context,
-                        volume_ref,
-                        image_location,
-                        image_id,
-                        image_service
-                    )
+            with image_utils.TemporaryImages.fetch(
+                    image_service, context, image_id) as tmp_image:
+                # Try to create the volume as the minimal size, then we can
+                # extend once the image has been downloaded.
+                if should_create_cache_entry:
+                    data = image_utils.qemu_img_info(tmp_image)
+
+                    virtual_size = int(
+                        math.ceil(float(data.virtual_size) / units.Gi))
+
+                    if virtual_size > volume_ref.size:
+                        params = {'image_size': virtual_size,
+                                  'volume_size': volume_ref.size}
+                        reason = _("Image virtual size is %(image_size)dGB"
+                                   " and doesn't fit in a volume of size"
+                                   " %(volume_size)dGB.") % params
+                        raise exception.ImageUnacceptable(
+                            image_id=image_id, reason=reason)
+
+                    if virtual_size and virtual_size != original_size:
+                        volume_ref.size = virtual_size
+                        volume_ref.save()
+
+                model_update = self._create_from_image_download(
+                    context,
+                    volume_ref,
+                    image_location,
+                    image_id,
+                    image_service
+                )
 
             if should_create_cache_entry:
                 # Update the newly created volume db entry before we clone it
@@ -774,7 +835,7 @@ class CreateVolumeFromSpecTask(flow_utils.CinderTask):
                 if model_update:
                     volume_ref.update(model_update)
                     volume_ref.save()
-                self.manager._create_image_cache_volume_entry(internal_context,
+                self.manager._create_image_cache_volume_entry(cache_context,
                                                               volume_ref,
                                                               image_id,
                                                               image_meta)
@@ -787,10 +848,6 @@ class CreateVolumeFromSpecTask(flow_utils.CinderTask):
                 self.driver.extend_volume(volume_ref, original_size)
                 volume_ref.size = original_size
                 volume_ref.save()
-
-        self._handle_bootable_volume_glance_meta(context, volume_ref.id,
-                                                 image_id=image_id,
-                                                 image_meta=image_meta)
         return model_update
 
     def _create_raw_volume(self, volume_ref, **kwargs):
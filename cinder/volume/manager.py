@@ -36,9 +36,13 @@ intact.
 
 """
 
+import collections
+import functools
+import math
 import requests
 import time
 
+from eventlet import greenpool
 from oslo_config import cfg
 from oslo_log import log as logging
 import oslo_messaging as messaging
@@ -101,6 +105,12 @@ volume_manager_opts = [
                 default=False,
                 help='Offload pending volume delete during '
                      'volume service startup'),
+    cfg.IntOpt('volume_service_inithost_max_parallel_exports',
+               default=1,
+               min=1,
+               help='Maximum number of volume exports re-created in '
+                    'parallel during volume service startup. 1 => '
+                    're-create the exports one after the other.'),
     cfg.StrOpt('zoning_mode',
                help='FC Zoning mode configured'),
     cfg.StrOpt('extra_capabilities',
@@ -214,7 +224,7 @@ def locked_snapshot_operation(f):
 class VolumeManager(manager.SchedulerDependentManager):
     """Manages attachable block storage devices."""
 
-    RPC_API_VERSION = '1.40'
+    RPC_API_VERSION = '1.41'
 
     target = messaging.Target(version=RPC_API_VERSION)
 
@@ -301,13 +311,27 @@ class VolumeManager(manager.SchedulerDependentManager):
                 'image_volume_cache_max_size_gb')
             max_cache_entries = self.driver.configuration.safe_get(
                 'image_volume_cache_max_count')
+            eviction_policy = self.driver.configuration.safe_get(
+                'image_volume_cache_eviction_policy')
+            index_refresh_interval = self.driver.configuration.safe_get(
+                'image_volume_cache_index_refresh_interval')
+            coalesce_timeout = self.driver.configuration.safe_get(
+                'image_volume_cache_coalesce_timeout')
 
             self.image_volume_cache = image_cache.ImageVolumeCache(
                 self.db,
                 cinder_volume.API(),
                 max_cache_size,
-                max_cache_entries
+                max_cache_entries,
+                eviction_policy,
+                index_refresh_interval,
+                coalesce_timeout
             )
+            prewarm_concurrency = self.driver.configuration.safe_get(
+                'image_volume_cache_prewarm_concurrency')
+            self._prewarm_pool = greenpool.GreenPool(prewarm_concurrency or 1)
+            # Prewarm requests waiting for a worker of the pool.
+            self._prewarm_queue = collections.deque()
             LOG.info(_LI('Image-volume cache enabled for host %(host)s.'),
                      {'host': self.host})
         else:
@@ -358,6 +382,80 @@ class VolumeManager(manager.SchedulerDependentManager):
         self.stats['pools'][pool]['allocated_capacity_gb'] = pool_sum
         self.stats['allocated_capacity_gb'] += volume['size']
 
+    def _count_allocated_capacities(self, ctxt, volumes):
+        """Count the capacity allocated to the volumes of the host.
+
+        The capacity of each pool is summed up by the database, only the
+        volumes created before pools were introduced are counted one by one.
+        """
+        statuses = ['in-use', 'available']
+        for host, _count, size in self.db.volume_data_get_for_host_by_pool(
+                ctxt, self.host, statuses):
+            pool = vol_utils.extract_host(host, 'pool')
+            if pool is None:
+                continue
+            pool_stat = self.stats['pools'].setdefault(
+                pool, dict(allocated_capacity_gb=0))
+            pool_stat['allocated_capacity_gb'] += size
+            self.stats['allocated_capacity_gb'] += size
+
+        for volume in volumes:
+            if (volume['status'] in statuses and
+                    vol_utils.extract_host(volume['host'], 'pool') is None):
+                self._count_allocated_capacity(ctxt, volume)
+
+    def _ensure_export(self, ctxt, volume):
+        start = time.time()
+        try:
+            self.driver.ensure_export(ctxt, volume)
+            failed = False
+        except Exception:
+            LOG.exception(_LE("Failed to re-export volume, "
+                              "setting to ERROR."),
+                          resource=volume)
+            volume.status = 'error'
+            volume.save()
+            failed = True
+        return volume, failed, time.time() - start
+
+    def _ensure_exports(self, ctxt, volumes):
+        """Re-create the exports of the volumes at startup.
+
+        Up to volume_service_inithost_max_parallel_exports exports are
+        re-created at the same time.
+        """
+        if not volumes:
+            return
+        total = len(volumes)
+        parallel = min(CONF.volume_service_inithost_max_parallel_exports,
+                       total)
+        LOG.info(_LI("Re-exporting %(total)d volumes, %(parallel)d at a "
+                     "time."), {'total': total, 'parallel': parallel})
+
+        start = time.time()
+        done = failed = 0
+        slowest_volume, slowest_time = None, 0
+        progress_step = max(1, total // 10)
+        pool = greenpool.GreenPool(parallel)
+        for volume, export_failed, export_time in pool.imap(
+                functools.partial(self._ensure_export, ctxt), volumes):
+            done += 1
+            failed += export_failed
+            LOG.debug("Re-exported volume in %.3f seconds.", export_time,
+                      resource=volume)
+            if export_time >= slowest_time:
+                slowest_volume, slowest_time = volume, export_time
+            if done % progress_step == 0 and done < total:
+                LOG.info(_LI("Re-exported %(done)d of %(total)d volumes."),
+                         {'done': done, 'total': total})
+
+        LOG.info(_LI("Re-exported %(total)d volumes in %(time).1f seconds, "
+                     "%(failed)d failed. Slowest export: volume %(volume)s "
+                     "in %(slowest).1f seconds."),
+                 {'total': total, 'time': time.time() - start,
+                  'failed': failed, 'volume': slowest_volume.id,
+                  'slowest': slowest_time})
+
     def _set_voldb_empty_at_startup_indicator(self, ctxt):
         """Determine if the Cinder volume DB is empty.
 
@@ -442,21 +540,14 @@ class VolumeManager(manager.SchedulerDependentManager):
         try:
             self.stats['pools'] = {}
             self.stats.update({'allocated_capacity_gb': 0})
+            # calculate allocated capacity for driver
+            self._count_allocated_capacities(ctxt, volumes)
+            exported_volumes = []
             for volume in volumes:
                 # available volume should also be counted into allocated
                 if volume['status'] in ['in-use', 'available']:
-                    # calculate allocated capacity for driver
-                    self._count_allocated_capacity(ctxt, volume)
-
-                    try:
-                        if volume['status'] in ['in-use']:
-                            self.driver.ensure_export(ctxt, volume)
-                    except Exception:
-                        LOG.exception(_LE("Failed to re-export volume, "
-                                          "setting to ERROR."),
-                                      resource=volume)
-                        volume.status = 'error'
-                        volume.save()
+                    if volume['status'] in ['in-use']:
+                        exported_volumes.append(volume)
                 elif volume['status'] in ('downloading', 'creating'):
                     LOG.warning(_LW("Detected volume stuck "
                                     "in %(curr_status)s "
@@ -474,6 +565,7 @@ class VolumeManager(manager.SchedulerDependentManager):
                             ctxt, volume.id)
                 else:
                     pass
+            self._ensure_exports(ctxt, exported_volumes)
             snapshots = objects.SnapshotList.get_by_host(
                 ctxt, self.host, {'status': 'creating'})
             for snapshot in snapshots:
@@ -1274,6 +1366,111 @@ class VolumeManager(manager.SchedulerDependentManager):
                                        False)
         return True
 
+    def _get_prewarm_pool(self):
+        """Return the pool to prewarm when none is requested."""
+        pools = self.driver.get_volume_stats().get('pools')
+        if pools:
+            return pools[0]['pool_name']
+        return (self.driver.configuration.safe_get('volume_backend_name') or
+                vol_utils.extract_host(self.host, 'pool', True))
+
+    def prewarm_image_cache(self, ctxt, image_id, pool=None):
+        """Add an image to the image-volume cache of this backend.
+
+        The image is downloaded into a volume created for the purpose, and
+        cached the same way as when users create a volume from an image.
+        The volume is deleted afterwards.  Requests are run concurrently up
+        to image_volume_cache_prewarm_concurrency in the background, the
+        other ones are queued.
+        """
+        if not self.image_volume_cache:
+            LOG.warning(_LW('Image-volume cache disabled for host %(host)s, '
+                            'not prewarming image %(image_id)s.'),
+                        {'host': self.host, 'image_id': image_id})
+            return
+        internal_context = context.get_internal_tenant_context()
+        if not internal_context:
+            LOG.warning(_LW('Unable to get Cinder internal context, not '
+                            'prewarming image %(image_id)s.'),
+                        {'image_id': image_id})
+            return
+
+        self._prewarm_queue.append((ctxt, internal_context, image_id, pool))
+        if self._prewarm_pool.free():
+            self._prewarm_pool.spawn_n(self._run_prewarm_queue)
+        else:
+            LOG.info(_LI('Queued image %(image_id)s to prewarm the '
+                         'image-volume cache of %(host)s, %(queued)d images '
+                         'waiting.'),
+                     {'image_id': image_id, 'host': self.host,
+                      'queued': len(self._prewarm_queue)})
+
+    def _run_prewarm_queue(self):
+        """Prewarm the queued images until the queue is empty."""
+        while self._prewarm_queue:
+            ctxt, internal_context, image_id, pool = (
+                self._prewarm_queue.popleft())
+            try:
+                host = vol_utils.append_host(self.host,
+                                             pool or self._get_prewarm_pool())
+                self._prewarm_image_cache(ctxt, internal_context, image_id,
+                                          host)
+            except Exception:
+                LOG.exception(_LE('Failed to prewarm the image-volume cache '
+                                  'of %(host)s with image %(image_id)s.'),
+                              {'host': self.host, 'image_id': image_id})
+
+    def _prewarm_image_cache(self, ctx, internal_context, image_id, host):
+        image_service, image_id = glance.get_remote_image_service(ctx,
+                                                                  image_id)
+        image_meta = image_service.show(ctx, image_id)
+        if self.image_volume_cache.find_entry(internal_context, host,
+                                              image_id, image_meta):
+            LOG.info(_LI('Image %(image_id)s is already in the image-volume '
+                         'cache of %(host)s.'),
+                     {'image_id': image_id, 'host': host})
+            return
+
+        # The create flow shrinks the volume to the virtual size of the
+        # image, it only has to be large enough to hold it.
+        image_size = image_meta.get('virtual_size') or image_meta.get('size')
+        size = max(int(math.ceil(float(image_size or 0) / units.Gi)),
+                   image_meta.get('min_disk') or 0, 1)
+        # The volume belongs to the internal tenant like the cache entries,
+        # the image is downloaded with the context of the request.
+        reserve_opts = {'volumes': 1, 'gigabytes': size}
+        reservations = QUOTAS.reserve(internal_context, **reserve_opts)
+        try:
+            volume = objects.Volume(
+                context=internal_context, host=host, size=size,
+                status='creating', attach_status='detached',
+                project_id=internal_context.project_id,
+                user_id=internal_context.user_id,
+                availability_zone=CONF.storage_availability_zone,
+                display_name='prewarm-image-%s' % image_id)
+            volume.create()
+        except Exception:
+            with excutils.save_and_reraise_exception():
+                QUOTAS.rollback(internal_context, reservations)
+        QUOTAS.commit(internal_context, reservations)
+
+        try:
+            self.create_volume(ctx, volume.id,
+                               request_spec={'image_id': image_id},
+                               allow_reschedule=False, volume=volume)
+        finally:
+            self.delete_volume(internal_context, volume.id)
+
+        if self.image_volume_cache.find_entry(internal_context, host,
+                                              image_id, image_meta):
+            LOG.info(_LI('Prewarmed the image-volume cache of %(host)s with '
+                         'image %(image_id)s.'),
+                     {'host': host, 'image_id': image_id})
+        else:
+            LOG.warning(_LW('Unable to prewarm the image-volume cache of '
+                            '%(host)s with image %(image_id)s.'),
+                        {'host': host, 'image_id': image_id})
+
     def copy_volume_to_image(self, context, volume_id, image_meta):
         """Uploads the specified volume to Glance.
 
@@ -2042,7 +2239,9 @@ class VolumeManager(manager.SchedulerDependentManager):
     def publish_service_capabilities(self, context):
         """Collect driver status and then publish."""
         self._report_driver_status(context)
-        self._publish_service_capabilities(context)
+        # Schedulers ask for this when they have no state to apply a delta
+        # report to, e.g. on startup.
+        self._publish_service_capabilities(context, full=True)
 
     def _notify_about_volume_usage(self,
                                    context,
@@ -0,0 +1,265 @@
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""In-process volume copy engine.
+
+Copies data between two paths without spawning dd.  The copy is split in
+blocks that are distributed among several workers, each running in a
+native thread with its own file descriptors so that several I/Os are
+outstanding at any time.  Blocks are moved by the kernel with
+copy_file_range or sendfile when the platform provides them, and through
+aligned buffers otherwise, which allows O_DIRECT and skipping zero blocks.
+"""
+
+
+import contextlib
+import ctypes
+import errno
+import fcntl
+import io
+import os
+import stat
+import time
+
+import eventlet
+from eventlet import tpool
+from oslo_log import log as logging
+from oslo_utils import units
+from six.moves import range
+
+from cinder import utils
+
+
+LOG = logging.getLogger(__name__)
+
+# O_DIRECT requires buffers, offsets and lengths aligned to the logical
+# block size of the device, 4 KiB is a multiple of all the common ones.
+ALIGNMENT = 4 * units.Ki
+
+# Errors meaning that a kernel copy method cannot be used for this pair of
+# files, in which case the next method is tried.
+_KERNEL_COPY_UNSUPPORTED = (errno.ENOSYS, errno.EXDEV, errno.EINVAL,
+                            errno.EOPNOTSUPP, errno.EBADF)
+
+
+def _copy_file_range(src_fd, dest_fd, offset, count):
+    return os.copy_file_range(src_fd, dest_fd, count, offset, offset)
+
+
+def _sendfile(src_fd, dest_fd, offset, count):
+    os.lseek(dest_fd, offset, os.SEEK_SET)
+    return os.sendfile(dest_fd, src_fd, offset, count)
+
+
+KERNEL_COPY_METHODS = [method for name, method in
+                       (('copy_file_range', _copy_file_range),
+                        ('sendfile', _sendfile))
+                       if hasattr(os, name)]
+
+
+def _aligned_buffer(size):
+    """Return a writable buffer of size bytes aligned for O_DIRECT."""
+    buf = bytearray(size + ALIGNMENT)
+    address = ctypes.addressof((ctypes.c_char * len(buf)).from_buffer(buf))
+    offset = -address % ALIGNMENT
+    return memoryview(buf)[offset:offset + size]
+
+
+def _clear_direct(fd):
+    flags = fcntl.fcntl(fd, fcntl.F_GETFL)
+    fcntl.fcntl(fd, fcntl.F_SETFL, flags & ~os.O_DIRECT)
+
+
+@contextlib.contextmanager
+def _accessible(path, mode):
+    """Make an existing path accessible to the current user if needed."""
+    if not os.path.exists(path) or os.access(path, mode):
+        yield
+    else:
+        with utils.temporary_chown(path):
+            yield
+
+
+class NativeCopy(object):
+    """Copy length bytes from the src path to the dest path."""
+
+    def __init__(self, src, dest, length, blocksize, workers=1,
+                 direct_read=False, direct_write=False, sync=False,
+                 sparse=False):
+        self.src = src
+        self.dest = dest
+        self.length = length
+        # Round the block size up so that O_DIRECT offsets stay aligned.
+        self.blocksize = -(-blocksize // ALIGNMENT) * ALIGNMENT
+        blocks = -(-length // self.blocksize)
+        self.workers = max(1, min(workers, blocks))
+        self.direct_read = direct_read
+        self.direct_write = direct_write
+        self.sync = sync
+        self.sparse = sparse
+        # Kernel copies bypass our buffers, they are only used when the
+        # data does not have to be inspected and the page cache is used
+        # anyway.
+        if sparse or direct_read or direct_write:
+            self.kernel_copy_methods = []
+        else:
+            self.kernel_copy_methods = list(KERNEL_COPY_METHODS)
+        self._zeros = bytes(bytearray(self.blocksize)) if sparse else None
+
+    def _open(self):
+        src_flags = os.O_RDONLY
+        if self.direct_read:
+            src_flags |= os.O_DIRECT
+        dest_flags = os.O_WRONLY | os.O_CREAT | os.O_TRUNC
+        if self.direct_write:
+            dest_flags |= os.O_DIRECT
+
+        fds = []
+        try:
+            # Permissions are only checked on open, so the paths can be
+            # given back to their owner as soon as all workers have their
+            # descriptors.
+            with _accessible(self.src, os.R_OK), \
+                    _accessible(self.dest, os.W_OK):
+                for _i in range(self.workers):
+                    fds.append(os.open(self.src, src_flags))
+                    fds.append(os.open(self.dest, dest_flags, 0o644))
+        except Exception:
+            for fd in fds:
+                os.close(fd)
+            raise
+        return list(zip(fds[::2], fds[1::2]))
+
+    def _kernel_copy(self, src_fd, dest_fd, offset, count):
+        """Copy a range in the kernel, return None if it is not possible."""
+        while self.kernel_copy_methods:
+            method = self.kernel_copy_methods[0]
+            copied = 0
+            try:
+                while copied < count:
+                    done = method(src_fd, dest_fd, offset + copied,
+                                  count - copied)
+                    if not done:
+                        break
+                    copied += done
+                return copied
+            except OSError as e:
+                if copied or e.errno not in _KERNEL_COPY_UNSUPPORTED:
+                    raise
+                try:
+                    self.kernel_copy_methods.remove(method)
+                except ValueError:
+                    # Another worker got there first.
+                    pass
+        return None
+
+    @staticmethod
+    def _read(src, buf):
+        read = 0
+        while read < len(buf):
+            done = src.readinto(buf[read:])
+            if not done:
+                break
+            read += done
+        return read
+
+    def _write(self, dest_fd, data):
+        if self.direct_write and len(data) % ALIGNMENT:
+            # Short tail of a source smaller than expected.
+            _clear_direct(dest_fd)
+        written = 0
+        while written < len(data):
+            written += os.write(dest_fd, data[written:])
+
+    def _copy_blocks(self, index, src_fd, dest_fd):
+        """Copy every workers-th block, starting with the index-th one."""
+        stats = {'bytes': 0, 'sparse_bytes': 0, 'read': 0.0, 'write': 0.0,
+                 'kernel': 0.0}
+        src = io.FileIO(src_fd, 'rb', closefd=False)
+        buf = None
+        for offset in range(index * self.blocksize, self.length,
+                            self.workers * self.blocksize):
+            count = min(self.blocksize, self.length - offset)
+
+            start = time.time()
+            copied = self._kernel_copy(src_fd, dest_fd, offset, count)
+            if copied is not None:
+                stats['kernel'] += time.time() - start
+                stats['bytes'] += copied
+                if copied < count:
+                    break
+                continue
+
+            if buf is None:
+                buf = _aligned_buffer(self.blocksize)
+            start = time.time()
+            os.lseek(src_fd, offset, os.SEEK_SET)
+            read = self._read(src, buf[:count])
+            stats['read'] += time.time() - start
+            if not read:
+                break
+
+            data = buf[:read]
+            if self.sparse and data == self._zeros[:read]:
+                stats['sparse_bytes'] += read
+            else:
+                start = time.time()
+                os.lseek(dest_fd, offset, os.SEEK_SET)
+                self._write(dest_fd, data)
+                stats['write'] += time.time() - start
+            stats['bytes'] += read
+            if read < count:
+                break
+        return stats
+
+    def _finish(self, dest_fd, length):
+        if self.sparse and stat.S_ISREG(os.fstat(dest_fd).st_mode):
+            # Skipped blocks at the end of a file would not extend it.
+            os.ftruncate(dest_fd, length)
+        if self.sync:
+            os.fdatasync(dest_fd)
+
+    def run(self):
+        """Perform the copy.
+
+        :returns: a dictionary with the number of bytes copied and skipped
+                  because they were zero, and the time in seconds spent
+                  opening the paths, reading, writing, copying in the
+                  kernel and syncing.  Read, write and kernel times add up
+                  the time of all the workers.
+        """
+        stats = {'bytes': 0, 'sparse_bytes': 0, 'read': 0.0, 'write': 0.0,
+                 'kernel': 0.0, 'sync': 0.0, 'workers': self.workers}
+
+        start = time.time()
+        fds = self._open()
+        stats['open'] = time.time() - start
+        try:
+            pool = eventlet.GreenPool(self.workers)
+            results = [pool.spawn(tpool.execute, self._copy_blocks, index,
+                                  src_fd, dest_fd)
+                       for index, (src_fd, dest_fd) in enumerate(fds)]
+            # Let every worker finish with its descriptors before looking
+            # for errors.
+            pool.waitall()
+            for result in results:
+                for key, value in result.wait().items():
+                    stats[key] += value
+
+            start = time.time()
+            self._finish(fds[0][1], stats['bytes'])
+            stats['sync'] = time.time() - start
+        finally:
+            for src_fd, dest_fd in fds:
+                os.close(src_fd)
+                os.close(dest_fd)
+        return stats
@@ -93,9 +93,10 @@ class VolumeAPI(rpc.RPCAPI):
                secure_file_operations_enabled()
         1.39 - Update replication methods to reflect new backend rep strategy
         1.40 - Add cascade option to delete_volume().
+        1.41 - Adds prewarm_image_cache().
     """
 
-    RPC_API_VERSION = '1.40'
+    RPC_API_VERSION = '1.41'
     TOPIC = CONF.volume_topic
     BINARY = 'cinder-volume'
 
@@ -341,6 +342,16 @@ class VolumeAPI(rpc.RPCAPI):
         cctxt = self._get_cctxt(host, '1.29')
         return cctxt.call(ctxt, 'get_capabilities', discover=discover)
 
+    def prewarm_image_cache(self, ctxt, host, image_id):
+        if not self.client.can_send_version('1.41'):
+            msg = _('One of cinder-volume services is too old to accept such '
+                    'request. Are you running mixed Mitaka-Newton '
+                    'cinder-volumes?')
+            raise exception.ServiceTooOld(msg)
+        cctxt = self._get_cctxt(host, '1.41')
+        cctxt.cast(ctxt, 'prewarm_image_cache', image_id=image_id,
+                   pool=utils.extract_host(host, 'pool'))
+
     def get_backup_device(self, ctxt, backup, volume):
         if not self.client.can_send_version('1.38'):
             msg = _('One of cinder-volume services is too old to accept such '
@@ -10,6 +10,9 @@
 #    License for the specific language governing permissions and limitations
 #    under the License.
 
+import eventlet
+from eventlet import event
+from eventlet import semaphore
 from oslo_concurrency import processutils as putils
 from oslo_log import log as logging
 
@@ -22,6 +25,68 @@ from cinder.volume.targets import iscsi
 LOG = logging.getLogger(__name__)
 
 
+class _SaveBatch(object):
+    """Target changes saved by the same save of the LIO configuration."""
+
+    def __init__(self):
+        self.changes = 0
+        self.error = None
+        self.saved = event.Event()
+
+
+class SaveCoalescer(object):
+    """Saves the LIO configuration once for concurrent target changes.
+
+    Callers return once a save started after their change is done, so no
+    change is reported before it is persisted.  The changes made while the
+    configuration is being saved, or within window seconds of the first
+    one, are saved together by the next save.
+    """
+
+    def __init__(self, save, window=0):
+        self._save = save
+        self._window = window
+        self._save_lock = semaphore.Semaphore()
+        self._pending = None
+        self.changes = 0
+        self.saves = 0
+
+    @property
+    def coalesced(self):
+        """Number of saves avoided by saving changes together."""
+        return self.changes - self.saves
+
+    def persist(self):
+        """Save the configuration with the changes made by the caller."""
+        batch = self._pending
+        leader = batch is None
+        if leader:
+            batch = self._pending = _SaveBatch()
+        batch.changes += 1
+        self.changes += 1
+
+        if not leader:
+            batch.saved.wait()
+        else:
+            with self._save_lock:
+                if self._window:
+                    eventlet.sleep(self._window)
+                # Changes made from now on are saved by the next save.
+                self._pending = None
+                try:
+                    self._save()
+                except Exception as error:
+                    batch.error = error
+                self.saves += 1
+                batch.saved.send()
+            LOG.debug("Saved the LIO configuration for %(changes)d target "
+                      "changes, %(coalesced)d saves coalesced so far.",
+                      {'changes': batch.changes,
+                       'coalesced': self.coalesced})
+        if batch.error is not None:
+            raise batch.error
+
+
 class LioAdm(iscsi.ISCSITarget):
     """iSCSI target administration for LIO using python-rtslib."""
     def __init__(self, *args, **kwargs):
@@ -30,6 +95,9 @@ class LioAdm(iscsi.ISCSITarget):
         # FIXME(jdg): modify executor to use the cinder-rtstool
         self.iscsi_target_prefix =\
             self.configuration.safe_get('iscsi_target_prefix')
+        self._save_coalescer = SaveCoalescer(
+            self._save_configuration,
+            self.configuration.safe_get('lio_save_batch_window'))
 
         self._verify_rtstool()
 
@@ -76,9 +144,12 @@ class LioAdm(iscsi.ISCSITarget):
         iscsi_target = 0  # NOTE: Not used by lio.
         return iscsi_target, lun
 
+    def _save_configuration(self):
+        self._execute('cinder-rtstool', 'save', run_as_root=True)
+
     def _persist_configuration(self, vol_id):
         try:
-            self._execute('cinder-rtstool', 'save', run_as_root=True)
+            self._save_coalescer.persist()
 
         # On persistence failure we don't raise an exception, as target has
         # been successfully created.
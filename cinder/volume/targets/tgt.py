@@ -11,6 +11,7 @@
 #    under the License.
 
 import os
+import re
 import textwrap
 import time
 
@@ -45,40 +46,76 @@ class TgtAdm(iscsi.ISCSITarget):
                 </target>
                   """)
 
+    # Seconds during which the targets shown by tgt-admin are reused.
+    TARGETS_TTL = 10
+
+    _TARGET_RE = re.compile(r'^Target (\d+): (\S+)$')
+    _LUN_RE = re.compile(r'^        LUN: (\d+)$')
+
     def __init__(self, *args, **kwargs):
         super(TgtAdm, self).__init__(*args, **kwargs)
-
-    def _get_target(self, iqn):
+        # iqn -> (tid, set of LUNs) of the targets shown by tgt-admin, and
+        # updated by the targets created and removed since.
+        self._targets = {}
+        self._targets_time = None
+
+    @classmethod
+    def _parse_targets(cls, out):
+        """Return the targets and LUNs in the output of tgt-admin --show."""
+        targets = {}
+        luns = None
+        for line in out.split('\n'):
+            match = cls._TARGET_RE.match(line)
+            if match:
+                luns = set()
+                targets[match.group(2)] = (match.group(1), luns)
+                continue
+            match = cls._LUN_RE.match(line)
+            if match and luns is not None:
+                luns.add(int(match.group(1)))
+        return targets
+
+    def _refresh_targets(self):
         (out, err) = utils.execute('tgt-admin', '--show', run_as_root=True)
-        lines = out.split('\n')
-        for line in lines:
-            if iqn in line:
-                parsed = line.split()
-                tid = parsed[1]
-                return tid[:-1]
-
-        return None
+        self._targets = self._parse_targets(out)
+        self._targets_time = time.time()
+        LOG.debug("Found %d iSCSI targets.", len(self._targets))
 
-    def _verify_backing_lun(self, iqn, tid):
-        backing_lun = True
-        capture = False
-        target_info = []
+    def _show_target(self, iqn):
+        """Add a target shown by tgt-admin to the others, if it exists.
 
+        Only the entry of the target is parsed, the other targets are kept
+        and still expire TARGETS_TTL seconds after they were shown.
+        """
         (out, err) = utils.execute('tgt-admin', '--show', run_as_root=True)
-        lines = out.split('\n')
-
-        for line in lines:
-            if iqn in line and "Target %s" % tid in line:
-                capture = True
-            if capture:
-                target_info.append(line)
-            if iqn not in line and 'Target ' in line:
-                capture = False
+        end = out.find(': %s\n' % iqn)
+        if end == -1:
+            return
+        start = out.rfind('\n', 0, end) + 1
+        end = out.find('\nTarget ', end)
+        entry = out[start:end] if end != -1 else out[start:]
+        self._targets.update(self._parse_targets(entry))
+
+    def _lookup_target(self, iqn):
+        """Return the (tid, LUNs) of a target, or None if it doesn't exist.
+
+        The targets shown by tgt-admin are reused for TARGETS_TTL seconds,
+        unless the target isn't one of them.
+        """
+        if (iqn not in self._targets or self._targets_time is None or
+                time.time() - self._targets_time >= self.TARGETS_TTL):
+            self._refresh_targets()
+        return self._targets.get(iqn)
 
-        if '        LUN: 1' not in target_info:
-            backing_lun = False
+    def _get_target(self, iqn):
+        target = self._lookup_target(iqn)
+        if target is None:
+            return None
+        return target[0]
 
-        return backing_lun
+    def _verify_backing_lun(self, iqn, tid):
+        target = self._lookup_target(iqn)
+        return target is not None and target[0] == tid and 1 in target[1]
 
     def _recreate_backing_lun(self, iqn, tid, name, path):
         LOG.warning(_LW('Attempting recreate of backing lun...'))
@@ -103,6 +140,8 @@ class TgtAdm(iscsi.ISCSITarget):
                           "ID:%(vol_id)s: %(e)s"),
                       {'vol_id': name, 'e': e})
         finally:
+            # Show the target again to verify its LUNs.
+            self._targets.pop(iqn, None)
             LOG.debug('StdOut from recreate backing lun: %s', out)
             LOG.debug('StdErr from recreate backing lun: %s', err)
 
@@ -127,21 +166,14 @@ class TgtAdm(iscsi.ISCSITarget):
         # Note(jdg) tid and lun aren't used by TgtAdm but remain for
         # compatibility
 
-        # NOTE(jdg): Remove this when we get to the bottom of bug: #1398078
-        # for now, since we intermittently hit target already exists we're
-        # adding some debug info to try and pinpoint what's going on
-        (out, err) = utils.execute('tgtadm',
-                                   '--lld',
-                                   'iscsi',
-                                   '--op',
-                                   'show',
-                                   '--mode',
-                                   'target',
-                                   run_as_root=True)
-        LOG.debug("Targets prior to update: %s", out)
         fileutils.ensure_tree(self.volumes_dir)
 
         vol_id = name.split(':')[1]
+        iqn = '%s%s' % (self.iscsi_target_prefix, vol_id)
+        # NOTE(jdg): Remove this when we get to the bottom of bug: #1398078
+        # for now, since we intermittently hit target already exists we're
+        # adding some debug info to try and pinpoint what's going on
+        LOG.debug("Target prior to update: %s", self._targets.get(iqn))
         write_cache = self.configuration.get('iscsi_write_cache', 'on')
         driver = self.iscsi_protocol
         chap_str = ''
@@ -202,21 +234,12 @@ class TgtAdm(iscsi.ISCSITarget):
             os.unlink(volume_path)
             raise exception.ISCSITargetCreateFailed(volume_id=vol_id)
 
-        # Grab targets list for debug
-        # Consider adding a check for lun 0 and 1 for tgtadm
-        # before considering this as valid
-        (out, err) = utils.execute('tgtadm',
-                                   '--lld',
-                                   'iscsi',
-                                   '--op',
-                                   'show',
-                                   '--mode',
-                                   'target',
-                                   run_as_root=True)
-        LOG.debug("Targets after update: %s", out)
-
-        iqn = '%s%s' % (self.iscsi_target_prefix, vol_id)
+        if iqn not in self._targets and self._targets_time is not None:
+            # Parsing every target again for each one created would make
+            # re-creating all of them after tgtd restarts quadratic.
+            self._show_target(iqn)
         tid = self._get_target(iqn)
+        LOG.debug("Target after update: %s", self._targets.get(iqn))
         if tid is None:
             LOG.error(_LE("Failed to create iscsi target for Volume "
                           "ID: %(vol_id)s. Please ensure your tgtd config "
@@ -261,6 +284,8 @@ class TgtAdm(iscsi.ISCSITarget):
                             vol_uuid_file)
         else:
             raise exception.ISCSITargetRemoveFailed(volume_id=vol_id)
+        # The target is looked up again below to check it is gone.
+        self._targets.pop(iqn, None)
         try:
             # NOTE(vish): --force is a workaround for bug:
             #             https://bugs.launchpad.net/cinder/+bug/1159948
@@ -299,6 +324,7 @@ class TgtAdm(iscsi.ISCSITarget):
                               '--delete',
                               iqn,
                               run_as_root=True)
+                self._targets.pop(iqn, None)
             except putils.ProcessExecutionError as e:
                 LOG.error(_LE("Failed to remove iscsi target for Volume "
                               "ID: %(vol_id)s: %(e)s"),
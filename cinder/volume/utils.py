@@ -17,7 +17,9 @@
 
 import ast
 import math
+import os
 import re
+import stat
 import time
 import uuid
 
@@ -27,6 +29,7 @@ from eventlet import tpool
 from oslo_concurrency import processutils
 from oslo_config import cfg
 from oslo_log import log as logging
+from oslo_utils import excutils
 from oslo_utils import strutils
 from oslo_utils import timeutils
 from oslo_utils import units
@@ -40,6 +43,7 @@ from cinder import exception
 from cinder.i18n import _, _LI, _LW, _LE
 from cinder import rpc
 from cinder import utils
+from cinder.volume import native_copy
 from cinder.volume import throttling
 
 
@@ -295,21 +299,73 @@ def _calculate_count(size_in_m, blocksize):
     return blocksize, int(count)
 
 
+# Results of the O_DIRECT probes run by check_for_odirect_support, keyed by
+# the dd flag and the device or filesystem of the probed path.  Each value
+# is a (supported, probed_at) tuple.
+_odirect_support_cache = {}
+
+
+def _odirect_cache_key(path):
+    """Return the device or filesystem identifying a path, or None.
+
+    Block and character devices are identified by their major/minor number,
+    any other path by the device of the filesystem it lives on.
+    """
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    if stat.S_ISBLK(st.st_mode) or stat.S_ISCHR(st.st_mode):
+        return ('dev', os.major(st.st_rdev), os.minor(st.st_rdev))
+    return ('fs', st.st_dev)
+
+
+def clear_odirect_support_cache(path=None):
+    """Forget the cached O_DIRECT probe results.
+
+    :param path: only forget the results for the device or filesystem of
+                 this path, by default the whole cache is cleared.
+    """
+    if path is None:
+        _odirect_support_cache.clear()
+        return
+    key = _odirect_cache_key(path)
+    if key is not None:
+        for flag_key in list(_odirect_support_cache):
+            if flag_key[1] == key:
+                del _odirect_support_cache[flag_key]
+
+
 def check_for_odirect_support(src, dest, flag='oflag=direct'):
 
+    # iflag=direct and if=/dev/zero combination does not work
+    # error: dd: failed to open '/dev/zero': Invalid argument
+    if (src == '/dev/zero' and flag == 'iflag=direct'):
+        return False
+
+    ttl = CONF.volume_odirect_cache_ttl
+    cache_key = None
+    if ttl:
+        path = src if flag.startswith('iflag') else dest
+        key = _odirect_cache_key(path)
+        if key is not None:
+            cache_key = (flag, key)
+            cached = _odirect_support_cache.get(cache_key)
+            if cached and time.time() - cached[1] < ttl:
+                return cached[0]
+
     # Check whether O_DIRECT is supported
     try:
-        # iflag=direct and if=/dev/zero combination does not work
-        # error: dd: failed to open '/dev/zero': Invalid argument
-        if (src == '/dev/zero' and flag == 'iflag=direct'):
-            return False
-        else:
-            utils.execute('dd', 'count=0', 'if=%s' % src,
-                          'of=%s' % dest,
-                          flag, run_as_root=True)
-            return True
+        utils.execute('dd', 'count=0', 'if=%s' % src,
+                      'of=%s' % dest,
+                      flag, run_as_root=True)
+        supported = True
     except processutils.ProcessExecutionError:
-        return False
+        supported = False
+
+    if cache_key is not None:
+        _odirect_support_cache[cache_key] = (supported, time.time())
+    return supported
 
 
 def _copy_volume_with_path(prefix, srcstr, deststr, size_in_m, blocksize,
@@ -317,38 +373,61 @@ def _copy_volume_with_path(prefix, srcstr, deststr, size_in_m, blocksize,
                            sparse=False):
     # Use O_DIRECT to avoid thrashing the system buffer cache
     extra_flags = []
+    probe_start = timeutils.utcnow()
     if check_for_odirect_support(srcstr, deststr, 'iflag=direct'):
         extra_flags.append('iflag=direct')
 
     if check_for_odirect_support(srcstr, deststr, 'oflag=direct'):
         extra_flags.append('oflag=direct')
-
-    # If the volume is being unprovisioned then
-    # request the data is persisted before returning,
-    # so that it's not discarded from the cache.
-    conv = []
-    if sync and not extra_flags:
-        conv.append('fdatasync')
-    if sparse:
-        conv.append('sparse')
-    if conv:
-        conv_options = 'conv=' + ",".join(conv)
-        extra_flags.append(conv_options)
+    probe_duration = timeutils.delta_seconds(probe_start, timeutils.utcnow())
+    direct = bool(extra_flags)
 
     blocksize, count = _calculate_count(size_in_m, blocksize)
 
-    cmd = ['dd', 'if=%s' % srcstr, 'of=%s' % deststr,
-           'count=%d' % count, 'bs=%s' % blocksize]
-    cmd.extend(extra_flags)
-
-    if ionice is not None:
-        cmd = ['ionice', ionice] + cmd
-
-    cmd = prefix + cmd
-
-    # Perform the copy
-    start_time = timeutils.utcnow()
-    execute(*cmd, run_as_root=True)
+    # The native engine can neither run under the throttling prefix nor
+    # change its I/O priority, leave those copies to dd.
+    native_stats = None
+    if (CONF.volume_copy_engine == 'native' and not prefix and
+            ionice is None):
+        start_time = timeutils.utcnow()
+        native_stats = _copy_volume_native(
+            srcstr, deststr, size_in_m, blocksize, sync=sync, sparse=sparse,
+            direct_read='iflag=direct' in extra_flags,
+            direct_write='oflag=direct' in extra_flags)
+
+    if native_stats is None:
+        # If the volume is being unprovisioned then
+        # request the data is persisted before returning,
+        # so that it's not discarded from the cache.
+        conv = []
+        if sync and not extra_flags:
+            conv.append('fdatasync')
+        if sparse:
+            conv.append('sparse')
+        if conv:
+            conv_options = 'conv=' + ",".join(conv)
+            extra_flags.append(conv_options)
+
+        cmd = ['dd', 'if=%s' % srcstr, 'of=%s' % deststr,
+               'count=%d' % count, 'bs=%s' % blocksize]
+        cmd.extend(extra_flags)
+
+        if ionice is not None:
+            cmd = ['ionice', ionice] + cmd
+
+        cmd = prefix + cmd
+
+        # Perform the copy
+        start_time = timeutils.utcnow()
+        try:
+            execute(*cmd, run_as_root=True)
+        except processutils.ProcessExecutionError:
+            with excutils.save_and_reraise_exception():
+                # The devices may have changed since they were probed, make
+                # sure the next copy probes them again.
+                if direct:
+                    clear_odirect_support_cache(srcstr)
+                    clear_odirect_support_cache(deststr)
     duration = timeutils.delta_seconds(start_time, timeutils.utcnow())
 
     # NOTE(jdg): use a default of 1, mostly for unit test, but in
@@ -357,13 +436,49 @@ def _copy_volume_with_path(prefix, srcstr, deststr, size_in_m, blocksize,
         duration = 1
     mbps = (size_in_m / duration)
     LOG.debug("Volume copy details: src %(src)s, dest %(dest)s, "
-              "size %(sz).2f MB, duration %(duration).2f sec",
+              "size %(sz).2f MB, duration %(duration).2f sec, "
+              "O_DIRECT probe %(probe).2f sec",
               {"src": srcstr,
                "dest": deststr,
                "sz": size_in_m,
-               "duration": duration})
-    LOG.info(_LI("Volume copy %(size_in_m).2f MB at %(mbps).2f MB/s"),
-             {'size_in_m': size_in_m, 'mbps': mbps})
+               "duration": duration,
+               "probe": probe_duration})
+    LOG.info(_LI("Volume copy %(size_in_m).2f MB at %(mbps).2f MB/s "
+                 "(copy %(duration).2f sec, O_DIRECT probe %(probe).2f sec)"),
+             {'size_in_m': size_in_m, 'mbps': mbps, 'duration': duration,
+              'probe': probe_duration})
+    if native_stats is not None:
+        LOG.debug("Native volume copy phases: open %(open).2f sec, "
+                  "read %(read).2f sec, write %(write).2f sec, "
+                  "kernel copy %(kernel).2f sec, sync %(sync).2f sec; "
+                  "%(sparse_mb).2f MB of zeros skipped by %(workers)d "
+                  "workers",
+                  dict(native_stats,
+                       sparse_mb=native_stats['sparse_bytes'] / units.Mi))
+
+
+def _copy_volume_native(srcstr, deststr, size_in_m, blocksize, sync=False,
+                        sparse=False, direct_read=False, direct_write=False):
+    """Copy a volume with the in-process engine.
+
+    :returns: the statistics of the copy, or None if it failed and has to
+              be done with dd.
+    """
+    try:
+        return native_copy.NativeCopy(
+            srcstr, deststr, size_in_m * units.Mi,
+            strutils.string_to_bytes('%sB' % blocksize),
+            workers=CONF.volume_copy_native_workers,
+            direct_read=direct_read, direct_write=direct_write,
+            sync=sync, sparse=sparse).run()
+    except (OSError, IOError, processutils.ProcessExecutionError) as e:
+        LOG.warning(_LW("Native volume copy from %(src)s to %(dest)s "
+                        "failed, falling back to dd: %(err)s"),
+                    {'src': srcstr, 'dest': deststr, 'err': e})
+        if direct_read or direct_write:
+            clear_odirect_support_cache(srcstr)
+            clear_odirect_support_cache(deststr)
+        return None
 
 
 def _open_volume_with_path(path, mode):
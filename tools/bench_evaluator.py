@@ -0,0 +1,92 @@
+#! /usr/bin/env python
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Micro-benchmark of the scheduler evaluator with and without its cache.
+
+Evaluates the filter and goodness functions of a host map the way
+DriverFilter and GoodnessWeigher do for a single scheduling request.
+"""
+
+from __future__ import print_function
+
+import argparse
+import random
+import timeit
+
+from cinder.scheduler.evaluator import evaluator
+
+FILTER_FUNCTIONS = [
+    "stats.free_capacity_gb > request.size",
+    "stats.free_capacity_gb >= request.size * 2 and "
+    "capabilities.total_volumes < 500",
+    "volume.size < 1000 and stats.free_capacity_gb > 10",
+]
+
+GOODNESS_FUNCTIONS = [
+    "100 * stats.free_capacity_gb / stats.total_capacity_gb",
+    "(capabilities.total_volumes < 100) ? 100 : "
+    "max(0, 100 - capabilities.total_volumes / 10)",
+    "stats.free_capacity_gb > 1000 ? 80 : 20",
+]
+
+
+def build_host_map(pools):
+    host_map = []
+    for i in range(pools):
+        total = random.randint(1000, 100000)
+        host_map.append({
+            'stats': {'free_capacity_gb': random.randint(0, total),
+                      'total_capacity_gb': total},
+            'capabilities': {'total_volumes': random.randint(0, 1000)},
+            'filter_function': FILTER_FUNCTIONS[i % len(FILTER_FUNCTIONS)],
+            'goodness_function':
+                GOODNESS_FUNCTIONS[i % len(GOODNESS_FUNCTIONS)],
+        })
+    return host_map
+
+
+def schedule(host_map, cached):
+    request = {'size': 10}
+    volume = {'size': 10}
+    for pool in host_map:
+        for func in (pool['filter_function'], pool['goodness_function']):
+            if not cached:
+                evaluator._cache.clear()
+            evaluator.evaluate(func, stats=pool['stats'],
+                               capabilities=pool['capabilities'],
+                               request=request, volume=volume)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--pools', type=int, default=500,
+                        help='Number of pools in the host map.')
+    parser.add_argument('--requests', type=int, default=20,
+                        help='Number of scheduling requests to time.')
+    args = parser.parse_args()
+
+    host_map = build_host_map(args.pools)
+    results = {}
+    for cached in (False, True):
+        timer = timeit.Timer(lambda: schedule(host_map, cached))
+        results[cached] = min(timer.repeat(repeat=3,
+                                           number=args.requests))
+        print("%-8s %8.2f ms per request" %
+              ('cached' if cached else 'uncached',
+               results[cached] * 1000 / args.requests))
+    print("speedup  %8.1fx" % (results[False] / results[True]))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+#! /usr/bin/env python
+#
+#    Licensed under the Apache License, Version 2.0 (the "License"); you may
+#    not use this file except in compliance with the License. You may obtain
+#    a copy of the License at
+#
+#         http://www.apache.org/licenses/LICENSE-2.0
+#
+#    Unless required by applicable law or agreed to in writing, software
+#    distributed under the License is distributed on an "AS IS" BASIS, WITHOUT
+#    WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied. See the
+#    License for the specific language governing permissions and limitations
+#    under the License.
+
+"""Micro-benchmark of the tgtadm target lookups with and without their cache.
+
+Looks up and verifies the backing LUN of every target of a simulated
+tgt-admin --show output, the way ensure_export does for each volume when
+the volume service starts.  With --create, tgtd starts without any target
+and ensure_export has to create each of them first.  The time spent running
+tgt-admin itself is not included, only the number of times it would have
+run is reported.
+"""
+
+from __future__ import print_function
+
+import argparse
+import timeit
+
+import mock
+
+from cinder.volume import configuration as conf
+from cinder.volume import driver
+from cinder.volume.targets import tgt
+
+TARGET = """Target %(tid)d: %(iqn)s
+    System information:
+        Driver: iscsi
+        State: ready
+    I_T nexus information:
+        I_T nexus: %(tid)d
+            Initiator: iqn.1993-08.org.debian:01:%(tid)d alias: compute
+            Connection: 0
+                IP Address: 10.0.0.%(ip)d
+    LUN information:
+        LUN: 0
+            Type: controller
+            SCSI ID: IET     %(tid)04d0000
+            SCSI SN: beaf%(tid)d0
+            Size: 0 MB, Block size: 1
+            Online: Yes
+            Backing store type: null
+            Backing store path: None
+        LUN: 1
+            Type: disk
+            SCSI ID: IET     %(tid)04d0001
+            SCSI SN: beaf%(tid)d1
+            Size: 1074 MB, Block size: 512
+            Online: Yes
+            Backing store type: rdwr
+            Backing store path: /dev/cinder-volumes/volume-%(tid)08d
+    Account information:
+        user%(tid)d
+    ACL information:
+        ALL
+"""
+
+
+def build_show_output(targets):
+    iqns = ['iqn.2010-10.org.openstack:volume-%08d' % tid
+            for tid in range(1, targets + 1)]
+    out = ''.join(TARGET % {'tid': tid, 'iqn': iqn, 'ip': tid % 250 + 1}
+                  for tid, iqn in enumerate(iqns, 1))
+    return iqns, out
+
+
+def fake_tgtd(out):
+    """Return a fake execute showing the targets created by tgt-admin."""
+    created = [0]
+
+    def execute(*cmd, **kwargs):
+        if '--update' in cmd:
+            # The targets are created in the order of the output.
+            created[0] = out.find('\nTarget ', created[0] + 1) + 1 or len(out)
+            return '', ''
+        return out[:created[0]], ''
+    return execute
+
+
+def lookup_all(target, iqns, cached):
+    for iqn in iqns:
+        # Without the cache, each lookup shows the targets again.
+        if not cached:
+            target._targets_time = None
+        tid = target._get_target(iqn)
+        if not cached:
+            target._targets_time = None
+        target._verify_backing_lun(iqn, tid)
+
+
+def create_all(target, iqns, cached):
+    for iqn in iqns:
+        if not cached:
+            target._targets_time = None
+        target.create_iscsi_target(iqn, 0, 1, '/dev/null')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--targets', type=int, default=1000,
+                        help='Number of targets shown by tgt-admin.')
+    parser.add_argument('--create', action='store_true',
+                        help='Create the targets, tgtd starting without any.')
+    args = parser.parse_args()
+
+    iqns, out = build_show_output(args.targets)
+    results = {}
+    for cached in (False, True):
+        target = tgt.TgtAdm(root_helper='sudo',
+                            configuration=conf.Configuration(
+                                driver.volume_opts))
+        if args.create:
+            execute = mock.Mock(side_effect=fake_tgtd(out))
+            run = create_all
+        else:
+            execute = mock.Mock(return_value=(out, ''))
+            run = lookup_all
+        with mock.patch('cinder.utils.execute', execute), \
+                mock.patch('cinder.utils.robust_file_write'), \
+                mock.patch('oslo_utils.fileutils.ensure_tree'):
+            start = timeit.default_timer()
+            run(target, iqns, cached)
+            results[cached] = timeit.default_timer() - start
+        print("%-8s %8.3f s for %d targets, %d tgt-admin runs" %
+              ('cached' if cached else 'uncached', results[cached],
+               args.targets, execute.call_count))
+    print("speedup  %8.1fx" % (results[False] / results[True]))
+
+
+if __name__ == '__main__':
+    main()